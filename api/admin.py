@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Restaurant, MenuItem, Order, OrderItem
+from .models import Restaurant, MenuItem, Order, OrderItem, ArchivedOrder, ArchivedOrderItem, DailyMenuItemSales
 
 # Register the Restaurant model with the admin interface
 admin.site.register(Restaurant)
@@ -11,4 +11,13 @@ admin.site.register(MenuItem)
 admin.site.register(Order)
 
 # Register the OrderItem model with the admin interface
-admin.site.register(OrderItem)
\ No newline at end of file
+admin.site.register(OrderItem)
+
+# Register the ArchivedOrder model with the admin interface
+admin.site.register(ArchivedOrder)
+
+# Register the ArchivedOrderItem model with the admin interface
+admin.site.register(ArchivedOrderItem)
+
+# Register the DailyMenuItemSales model with the admin interface
+admin.site.register(DailyMenuItemSales)
@@ -0,0 +1,78 @@
+"""
+Hot/cold storage of orders.
+
+Delivered orders older than a retention period are moved, with their items, from the live order tables into the
+archive tables (ArchivedOrder, ArchivedOrderItem), so the indexes used by the kitchen queries only cover the orders
+that are still relevant. A batch is copied with INSERT ... SELECT and deleted in the same transaction, so an order is
+always in exactly one of the two tables, keeps its ID, and no rows are loaded into Python. The transaction also
+locks the sales rollup state, so a rollup batch, which reads the live and the archive tables one after the other,
+never sees a batch half moved.
+"""
+from django.db import connection
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+from .rollups import lock_rollup_state
+from .sqlite import write_transaction
+
+# Only orders in this status are archived; it is the last status, so archived orders never change again
+ARCHIVED_STATUS = 'delivered'
+
+
+def _columns(model):
+    return [field.column for field in model._meta.concrete_fields]
+
+
+def _copy_rows(cursor, source, target, filter_column, ids, archived_at=None):
+    """
+    Copies the rows of the source model whose filter_column is one of the IDs into the target model's table and
+    returns the number of copied rows. The columns of the source are copied by name; archived_at, if given, fills
+    the extra column of the target.
+    """
+    quote = connection.ops.quote_name
+    columns = [quote(column) for column in _columns(source)]
+    selected = list(columns)
+    params = []
+    if archived_at is not None:
+        columns.append(quote('archived_at'))
+        selected.append('%s')
+        params.append(connection.ops.adapt_datetimefield_value(archived_at))
+    placeholders = ', '.join(['%s'] * len(ids))
+    cursor.execute(
+        f'INSERT INTO {quote(target._meta.db_table)} ({", ".join(columns)}) '
+        f'SELECT {", ".join(selected)} FROM {quote(source._meta.db_table)} WHERE {quote(filter_column)} IN ({placeholders})',
+        params + ids,
+    )
+    return cursor.rowcount
+
+
+def _delete_rows(cursor, model, filter_column, ids):
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(ids))
+    cursor.execute(f'DELETE FROM {quote(model._meta.db_table)} WHERE {quote(filter_column)} IN ({placeholders})', ids)
+
+
+def archive_batch(cutoff, after_id=0, batch_size=500):
+    """
+    Moves the next batch of at most batch_size delivered orders created before cutoff, with IDs above after_id,
+    into the archive tables in one transaction.
+    Returns (last_id, orders, items): the highest ID of the batch (None when nothing was left to archive) and the
+    numbers of moved orders and items.
+    """
+    # Stays below the bound parameter limit of every backend
+    batch_size = min(batch_size, 900)
+    with write_transaction(), connection.cursor() as cursor:
+        # Waits for a running rollup batch, which would otherwise count the moved items twice or not at all
+        lock_rollup_state()
+        # Selected inside the transaction, so the batch cannot change before it is moved
+        ids = list(
+            Order.objects.filter(pk__gt=after_id, status=ARCHIVED_STATUS, created_at__lt=cutoff)
+            .order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return None, 0, 0
+        orders = _copy_rows(cursor, Order, ArchivedOrder, 'id', ids, archived_at=timezone.now())
+        items = _copy_rows(cursor, OrderItem, ArchivedOrderItem, OrderItem._meta.get_field('order').column, ids)
+        _delete_rows(cursor, OrderItem, OrderItem._meta.get_field('order').column, ids)
+        _delete_rows(cursor, Order, 'id', ids)
+    return ids[-1], orders, items
@@ -0,0 +1,200 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+
+# Defaults for the TOKEN_AUTH_CACHE setting
+TOKEN_AUTH_CACHE_DEFAULTS = {
+    # Maximum number of tokens kept in the in-process LRU of each worker
+    'MAX_SIZE': 10000,
+    # Seconds a resolved token stays valid in either cache tier
+    'TTL': 60,
+    # Alias of a shared Django cache used as second tier, or None to use the in-process LRU only
+    'CACHE_ALIAS': None,
+}
+
+
+def get_token_cache_setting(name):
+    """
+    Returns a value of the TOKEN_AUTH_CACHE setting, falling back to the defaults.
+    """
+    return getattr(settings, 'TOKEN_AUTH_CACHE', {}).get(name, TOKEN_AUTH_CACHE_DEFAULTS[name])
+
+
+class LRUCache:
+    """
+    A small thread-safe least-recently-used cache with per-entry expiry.
+    """
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the value stored under the key, or None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl, max_size):
+        """
+        Stores the value for `ttl` seconds, evicting the least recently used entries beyond `max_size`.
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# The in-process tier, shared by all threads of a worker
+local_token_cache = LRUCache()
+
+
+def _shared_cache():
+    alias = get_token_cache_setting('CACHE_ALIAS')
+    return caches[alias] if alias else None
+
+
+def _shared_key(key):
+    # Hash the token so raw credentials never appear as keys in the shared cache
+    return 'api:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def _to_shared_entry(user, token):
+    """
+    Returns the plain field values of the user and token stored in the shared tier.
+    The password hash is left out, so it never leaves the database for a cache shared between services.
+    """
+    return {
+        'user': {
+            field.attname: getattr(user, field.attname)
+            for field in user._meta.concrete_fields if field.attname != 'password'
+        },
+        'token': {field.attname: getattr(token, field.attname) for field in token._meta.concrete_fields},
+    }
+
+
+def _from_shared_entry(entry, token_model):
+    """
+    Rebuilds the (user, token) pair from a shared tier entry.
+    The password is a deferred field of the rebuilt user: it is loaded from the database when accessed,
+    and saving the user only writes the loaded fields.
+    """
+    user_model = token_model._meta.get_field('user').related_model
+    user = user_model.from_db(router.db_for_read(user_model), list(entry['user']), list(entry['user'].values()))
+    token = token_model.from_db(router.db_for_read(token_model), list(entry['token']), list(entry['token'].values()))
+    token.user = user
+    return (user, token)
+
+
+def invalidate_token(key):
+    """
+    Removes a token from both cache tiers.
+    Only the in-process tier of the current worker can be cleared; other workers drop it when the TTL expires.
+    """
+    local_token_cache.delete(key)
+    shared_cache = _shared_cache()
+    if shared_cache is not None:
+        shared_cache.delete(_shared_key(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that caches resolved tokens instead of joining Token and User on every request.
+    Tokens are looked up in a bounded in-process LRU first, then in an optional shared Django cache (which holds
+    the user's fields without the password hash), and only then in the database. Entries expire after a TTL and are invalidated when the token is deleted
+    or its user is saved (e.g. deactivated); see the receivers in signals.py.
+    Configured through the TOKEN_AUTH_CACHE setting.
+    """
+    def authenticate_credentials(self, key):
+        """
+        Resolves the token key to a (user, token) pair, using the cache tiers before the database.
+        Invalid tokens and inactive users are rejected by the parent implementation and never cached.
+        """
+        entry = local_token_cache.get(key)
+        if entry is None:
+            shared_cache = _shared_cache()
+            if shared_cache is not None:
+                shared_entry = shared_cache.get(_shared_key(key))
+                if shared_entry is not None:
+                    entry = _from_shared_entry(shared_entry, self.get_model())
+            if entry is None:
+                entry = super().authenticate_credentials(key)
+                if shared_cache is not None:
+                    shared_cache.set(_shared_key(key), _to_shared_entry(*entry), get_token_cache_setting('TTL'))
+            local_token_cache.set(key, entry, get_token_cache_setting('TTL'), get_token_cache_setting('MAX_SIZE'))
+
+        user, token = entry
+        # Hand out a copy so request code cannot mutate the cached user instance shared between requests
+        return (copy.copy(user), token)
+
+    async def aauthenticate(self, request):
+        """
+        Asynchronous counterpart of authenticate() for plain Django async views.
+        Parses the Authorization header like TokenAuthentication and resolves the key with aauthenticate_credentials().
+        """
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) == 1:
+            raise exceptions.AuthenticationFailed('Invalid token header. No credentials provided.')
+        if len(auth) > 2:
+            raise exceptions.AuthenticationFailed('Invalid token header. Token string should not contain spaces.')
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed('Invalid token header. Token string should not contain invalid characters.')
+        return await self.aauthenticate_credentials(key)
+
+    async def aauthenticate_credentials(self, key):
+        """
+        Asynchronous counterpart of authenticate_credentials() using the async cache and ORM interfaces.
+        """
+        entry = local_token_cache.get(key)
+        if entry is None:
+            shared_cache = _shared_cache()
+            if shared_cache is not None:
+                shared_entry = await shared_cache.aget(_shared_key(key))
+                if shared_entry is not None:
+                    entry = _from_shared_entry(shared_entry, self.get_model())
+            if entry is None:
+                try:
+                    token = await self.get_model().objects.select_related('user').aget(key=key)
+                except self.get_model().DoesNotExist:
+                    raise exceptions.AuthenticationFailed('Invalid token.')
+                if not token.user.is_active:
+                    raise exceptions.AuthenticationFailed('User inactive or deleted.')
+                entry = (token.user, token)
+                if shared_cache is not None:
+                    await shared_cache.aset(_shared_key(key), _to_shared_entry(*entry), get_token_cache_setting('TTL'))
+            local_token_cache.set(key, entry, get_token_cache_setting('TTL'), get_token_cache_setting('MAX_SIZE'))
+
+        user, token = entry
+        return (copy.copy(user), token)
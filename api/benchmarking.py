@@ -0,0 +1,42 @@
+"""
+Helpers shared by the benchmark management commands.
+"""
+import math
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+
+@contextmanager
+def scratch_database(verbosity=0):
+    """
+    Runs the enclosed block against a freshly migrated test database in the same environment as the test suite
+    (DEBUG off, 'testserver' allowed). The database is destroyed afterwards, so benchmarks never touch real data.
+    """
+    setup_test_environment(debug=False)
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity)
+        teardown_test_environment()
+
+
+def percentile(values, fraction):
+    """
+    Returns the given percentile (0 < fraction <= 1) of the values using the nearest-rank method.
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def format_latencies(latencies):
+    """
+    Formats the p50/p95/p99 of a list of latencies given in seconds as milliseconds.
+    """
+    return '  '.join(
+        f'p{int(fraction * 100)} {percentile(latencies, fraction) * 1000:7.2f} ms' for fraction in (0.5, 0.95, 0.99)
+    )
@@ -0,0 +1,135 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .routers import primary_reads
+
+# Number of seconds a rendered payload is kept in the cache. Payloads never go stale because every
+# change bumps the version they are keyed on; the timeout only bounds the memory used by old versions.
+CACHE_TIMEOUT = getattr(settings, 'API_CACHE_TIMEOUT', 60 * 60)
+
+# Number of seconds a scope version and its modification time are kept. Changes made through another process
+# (management commands, other workers with a per-process cache) or by queries that skip the signals never bump the
+# keys of this process; once the keys expire the modification time is read from the database again and a new
+# version is started, so stale validators and payloads are served for at most this long.
+VERSION_TIMEOUT = getattr(settings, 'API_CACHE_VERSION_TIMEOUT', 60)
+
+
+# Cache scope of the restaurant list, bumped whenever any restaurant changes
+RESTAURANT_LIST_SCOPE = 'restaurants'
+
+
+def restaurant_scope(restaurant_id):
+    """
+    Returns the cache scope shared by every payload derived from a restaurant and its menu.
+    """
+    return f'restaurant:{restaurant_id}'
+
+
+def _version_key(scope):
+    return f'api:version:{scope}'
+
+
+def _payload_key(scope, name):
+    return f'api:payload:{scope}:{name}'
+
+
+def _modified_key(scope):
+    return f'api:modified:{scope}'
+
+
+def get_version(scope):
+    """
+    Returns the current version number of a cache scope, initializing it if necessary.
+    Versions start from a time-based value, so a version that was evicted from the cache is never
+    reused for payloads that might still be stored under it.
+    """
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, timeout=VERSION_TIMEOUT):
+            version = cache.get(key, version)
+    return version
+
+
+def _increment_version(scope):
+    key = _version_key(scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=VERSION_TIMEOUT)
+    # Last-Modified has a resolution of one second: every change gets a later second than the previous one, so a
+    # client validating with If-Modified-Since alone never gets a 304 for a change made in the same second
+    modified_key = _modified_key(scope)
+    previous = cache.get(modified_key)
+    modified = math.ceil(time.time())
+    if previous is not None and modified <= previous:
+        modified = math.floor(previous) + 1
+    cache.set(modified_key, modified, timeout=VERSION_TIMEOUT)
+
+
+def bump_version(scope, using=None):
+    """
+    Invalidates every payload of a cache scope by moving it to a new version.
+    When called inside a transaction the version is bumped again once the transaction commits,
+    so a payload rebuilt from uncommitted data by a concurrent request is not served afterwards.
+    """
+    _increment_version(scope)
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(lambda: _increment_version(scope), using=using)
+
+
+def get_or_build(scope, name, builder):
+    """
+    Returns the cached payload called `name` for the current version of `scope`.
+    On a miss the payload is built by calling `builder`, with reads routed to the primary, and stored for the current version.
+    Exceptions raised by the builder (e.g. for a missing object) propagate and nothing is cached.
+    """
+    version = cache.get(_version_key(scope))
+    if version is None:
+        # First use of the scope: the payload is returned without caching it and the version is only created
+        # once the builder succeeded, so requests for missing objects leave no keys behind
+        with primary_reads():
+            payload = builder()
+        get_version(scope)
+        return payload
+    key = _payload_key(scope, name)
+    payload = cache.get(key, version=version)
+    if payload is None:
+        # Built from the primary: a lagging replica could store an outdated payload under the current version
+        with primary_reads():
+            payload = builder()
+        cache.set(key, payload, CACHE_TIMEOUT, version=version)
+    return payload
+
+
+def get_validators(scope, get_last_modified, exists=None):
+    """
+    Returns the current version and the last modification time (whole POSIX seconds or None) of a cache scope,
+    reading both with a single cache round trip.
+    The modification time is recorded whenever the scope is bumped. If it is not in the cache it is computed
+    by calling `get_last_modified`, which returns a datetime or None, rounded up and stored for later requests.
+    If the scope has no version yet and `exists` returns False, (None, None) is returned without creating one,
+    so requests for missing objects do not fill the cache with versions.
+    """
+    version_key, modified_key = _version_key(scope), _modified_key(scope)
+    values = cache.get_many([version_key, modified_key])
+    version = values.get(version_key)
+    if version is None:
+        if exists is not None:
+            with primary_reads():
+                if not exists():
+                    return None, None
+        version = get_version(scope)
+    last_modified = values.get(modified_key)
+    if last_modified is None:
+        with primary_reads():
+            modified_at = get_last_modified()
+        if modified_at is not None:
+            last_modified = math.ceil(modified_at.timestamp())
+            cache.add(modified_key, last_modified, timeout=VERSION_TIMEOUT)
+    return version, last_modified
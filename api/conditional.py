@@ -0,0 +1,64 @@
+import hashlib
+import math
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .cache import get_validators
+
+
+class ConditionalGetMixin:
+    """
+    Adds conditional GET support (ETag / If-None-Match and Last-Modified / If-Modified-Since) to a read-only view.
+    The validators are derived from the version of the view's cache scope, so they are computed without
+    serializing the response body and, as long as the cache holds them, without querying the database.
+    Unchanged resources are answered with 304 Not Modified and no body.
+    """
+    def get_cache_scope(self):
+        """
+        Returns the cache scope whose version identifies the current state of the resource.
+        """
+        raise NotImplementedError
+
+    def get_last_modified(self):
+        """
+        Returns the last modification time of the resource computed from the database.
+        Only used when the modification time recorded in the cache is missing.
+        """
+        return None
+
+    def resource_exists(self):
+        """
+        Returns whether the resource exists. Only called when its cache scope has no version yet;
+        a missing resource is rendered as usual (typically a 404) without validators.
+        """
+        return True
+
+    def get_etag(self, request, version):
+        """
+        Builds a strong ETag from the scope version, the view, the negotiated renderer and the full request path,
+        so different representations and pages of the same resource never share a validator.
+        """
+        source = f'{self.__class__.__name__}:{version}:{request.accepted_renderer.format}:{request.get_full_path()}'
+        return '"%s"' % hashlib.md5(source.encode(), usedforsecurity=False).hexdigest()
+
+    def get(self, request, *args, **kwargs):
+        """
+        Answers with 304 Not Modified when the client's validators still match, otherwise renders the resource
+        as usual. Successful and 304 responses carry the ETag and Last-Modified headers.
+        """
+        version, last_modified = get_validators(self.get_cache_scope(), self.get_last_modified, self.resource_exists)
+        if version is None:
+            return super().get(request, *args, **kwargs)
+        etag = self.get_etag(request, version)
+        # Whole seconds, rounded up like the recorded modification times
+        last_modified = math.ceil(last_modified) if last_modified is not None else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response.headers['ETag'] = etag
+            if last_modified is not None:
+                response.headers['Last-Modified'] = http_date(last_modified)
+        return response
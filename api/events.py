@@ -0,0 +1,94 @@
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+# Dotted path of the broker class used when the ORDER_EVENT_BROKER setting is not defined
+DEFAULT_ORDER_EVENT_BROKER = 'api.events.InProcessOrderEventBroker'
+
+
+class InProcessOrderEventBroker:
+    """
+    Publish/subscribe of order events between the views running in the current process.
+    Subscribers are asyncio queues owned by the event loop of the ASGI application. Publishing is thread-safe,
+    so synchronous views running in worker threads can notify subscribers waiting on the event loop.
+    Events only reach subscribers connected to the same process; deployments with several workers need
+    a broker backed by a shared channel, configured through the ORDER_EVENT_BROKER setting.
+    """
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, order_id):
+        """
+        Registers a new subscriber for the events of an order and returns the queue the events are delivered to.
+        Must be called from a running event loop.
+        """
+        queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers.setdefault(order_id, {})[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, order_id, queue):
+        """
+        Removes a subscriber registered with subscribe().
+        """
+        with self._lock:
+            subscribers = self._subscribers.get(order_id, {})
+            subscribers.pop(queue, None)
+            if not subscribers:
+                self._subscribers.pop(order_id, None)
+
+    def publish(self, order_id, event):
+        """
+        Delivers an event to every current subscriber of the order. Can be called from any thread.
+        """
+        with self._lock:
+            subscribers = list(self._subscribers.get(order_id, {}).items())
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # The subscriber's event loop has been closed; it will never read the event
+                self.unsubscribe(order_id, queue)
+
+
+_broker = None
+
+
+def get_order_event_broker():
+    """
+    Returns the process-wide order event broker configured by the ORDER_EVENT_BROKER setting.
+    """
+    global _broker
+    if _broker is None:
+        _broker = import_string(getattr(settings, 'ORDER_EVENT_BROKER', DEFAULT_ORDER_EVENT_BROKER))()
+    return _broker
+
+
+@receiver(setting_changed)
+def reset_order_event_broker(setting, **kwargs):
+    """
+    Drops the current broker when the ORDER_EVENT_BROKER setting changes (e.g. in tests).
+    """
+    global _broker
+    if setting == 'ORDER_EVENT_BROKER':
+        _broker = None
+
+
+def publish_order_status(order_id, status):
+    """
+    Notifies the subscribers of an order that its status changed.
+    """
+    get_order_event_broker().publish(order_id, {'id': order_id, 'status': status})
+
+
+def format_event(event, event_id):
+    """
+    Formats an order event as a server-sent event message.
+    """
+    return f'id: {event_id}\nevent: status\ndata: {json.dumps(event)}\n\n'
@@ -0,0 +1,181 @@
+"""
+Fast, opt-in serialization path for the hot read endpoints.
+
+A FlatSerializer is compiled once from a reference ModelSerializer: it reads the fields the serializer declares
+(including nested foreign-key serializers and reverse many relations), maps each of them to a column of a
+`values()` query and to a precompiled converter, and then builds exactly the same JSON shape from `values()` rows
+without any per-field introspection. The ModelSerializers remain the reference implementation; fields the
+compiler does not know fall back to the DRF field's own to_representation().
+"""
+import decimal
+import threading
+
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+
+def _compile_decimal(field):
+    """
+    Returns a converter equivalent to DecimalField.to_representation() for the default output options,
+    or None if the field uses options the fast path does not reproduce.
+    """
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+        return None
+    quantum = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return '{:f}'.format(value.quantize(quantum, rounding=rounding, context=context))
+    return convert
+
+
+def _compile_datetime(field):
+    """
+    Returns a converter equivalent to DateTimeField.to_representation() for ISO 8601 output of aware datetimes,
+    or None if the field uses another output format or time zone handling.
+    """
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601 or hasattr(field, 'timezone') or field.default_timezone() is None:
+        return None
+
+    def convert(value):
+        if not timezone.is_aware(value):
+            return field.to_representation(value)
+        value = value.astimezone(timezone.get_current_timezone()).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+
+def _identity(value):
+    return value
+
+
+def compile_converter(field):
+    """
+    Returns the converter applied to non-null column values of a DRF field.
+    Strings and integers come back from the database in their JSON form and are passed through unchanged.
+    """
+    converter = None
+    if isinstance(field, serializers.DecimalField):
+        converter = _compile_decimal(field)
+    elif isinstance(field, serializers.DateTimeField):
+        converter = _compile_datetime(field)
+    elif isinstance(field, (serializers.CharField, serializers.IntegerField)):
+        converter = _identity
+    return converter or field.to_representation
+
+
+class FlatSerializer:
+    """
+    Builds the representation of a ModelSerializer from `values()` rows with precompiled converters.
+    Nested serializers of non-nullable foreign keys are read from joined columns of the same query;
+    nested `many=True` serializers of reverse foreign keys are loaded with one extra query per page of rows.
+    """
+    def __init__(self, serializer_class):
+        self.model = serializer_class.Meta.model
+        self.pk_column = self.model._meta.pk.attname
+        self.steps = self._compile(self.model, serializer_class(), prefix='')
+        self.columns = list(dict.fromkeys([self.pk_column] + self._columns(self.steps)))
+        self.many_relations = []
+        for key, step in self.steps:
+            if step[0] == 'many':
+                self.many_relations.append((key, step[1], step[2]))
+
+    def _compile(self, model, serializer, prefix):
+        """
+        Compiles the readable fields of a serializer into (key, step) pairs, where a step is
+        ('value', column, converter), ('nested', steps) or ('many', child FlatSerializer, relation column).
+        """
+        steps = []
+        for key, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                if prefix:
+                    raise ValueError(f'Nested many relations are only supported at the top level ({prefix}{key}).')
+                relation = model._meta.get_field(field.source)
+                steps.append((key, ('many', FlatSerializer(type(field.child)), relation.field.attname)))
+            elif isinstance(field, serializers.BaseSerializer):
+                relation = model._meta.get_field(field.source)
+                if relation.null:
+                    raise ValueError(f'Nullable relations are not supported ({prefix}{key}).')
+                steps.append((key, ('nested', self._compile(relation.related_model, field, prefix + field.source + '__'))))
+            elif field.source == '*' or '.' in field.source:
+                raise ValueError(f'Only fields backed by a model column are supported ({prefix}{key}).')
+            else:
+                steps.append((key, ('value', prefix + field.source, compile_converter(field))))
+        return steps
+
+    def _columns(self, steps):
+        columns = []
+        for key, step in steps:
+            if step[0] == 'value':
+                columns.append(step[1])
+            elif step[0] == 'nested':
+                columns.extend(self._columns(step[1]))
+        return columns
+
+    def _build(self, steps, row):
+        data = {}
+        for key, step in steps:
+            kind = step[0]
+            if kind == 'value':
+                value = row[step[1]]
+                data[key] = None if value is None else step[2](value)
+            elif kind == 'nested':
+                data[key] = self._build(step[1], row)
+            else:
+                data[key] = []
+        return data
+
+    def values(self, queryset):
+        """
+        Returns the `values()` queryset producing the rows this serializer reads.
+        """
+        return queryset.values(*self.columns)
+
+    def serialize(self, rows):
+        """
+        Builds the representation of every row, loading the reverse many relations of all rows at once.
+        """
+        rows = list(rows)
+        data = [self._build(self.steps, row) for row in rows]
+        if self.many_relations and rows:
+            by_pk = {row[self.pk_column]: item for row, item in zip(rows, data)}
+            for key, child, relation_column in self.many_relations:
+                child_rows = child.model.objects.filter(**{relation_column + '__in': list(by_pk)}).order_by(child.pk_column).values(
+                    *child.columns, relation_column,
+                )
+                for child_row in child_rows:
+                    by_pk[child_row[relation_column]][key].append(child._build(child.steps, child_row))
+        return data
+
+    def serialize_queryset(self, queryset):
+        """
+        Fetches and serializes a queryset in one step.
+        """
+        return self.serialize(self.values(queryset))
+
+
+_flat_serializers = {}
+_flat_serializers_lock = threading.Lock()
+
+
+def get_flat_serializer(serializer_class):
+    """
+    Returns the FlatSerializer compiled from a ModelSerializer class, compiling it on first use.
+    """
+    flat_serializer = _flat_serializers.get(serializer_class)
+    if flat_serializer is None:
+        with _flat_serializers_lock:
+            flat_serializer = _flat_serializers.setdefault(serializer_class, FlatSerializer(serializer_class))
+    return flat_serializer
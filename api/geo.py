@@ -0,0 +1,179 @@
+"""
+Geographic lookup of nearby restaurants without a spatial database extension.
+
+Every located restaurant stores a geocell: its latitude and longitude quantized to GEOCELL_BITS bits each and
+interleaved into one integer, longitude bit first (the binary form of a geohash). All points of a grid cell at a
+coarser level share the high bits of their geocells, so a cell is one contiguous integer range and the restaurants
+in it are found with a range scan of the geocell index. A search covers the bounding box of its circle with cells
+of at least half the radius, scans their ranges, and only then computes the exact distances of the candidates.
+"""
+import math
+
+from django.db import connections, router
+
+from .models import Restaurant
+
+# Bits per axis; 26 bits give cells of about 0.6 m, and the 52-bit geocell fits a BigIntegerField
+GEOCELL_BITS = 26
+
+# Mean radius of the Earth
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Radius of the first, narrowest search of nearby_restaurants()
+INITIAL_SEARCH_RADIUS_KM = 0.5
+
+
+def _quantize(value, low, high, bits=GEOCELL_BITS):
+    cells = 1 << bits
+    return min(int((value - low) / (high - low) * cells), cells - 1)
+
+
+def _spread(value):
+    """
+    Spreads the bits of a value below 2**32 to the even bit positions of the result.
+    """
+    value = (value | (value << 16)) & 0x0000FFFF0000FFFF
+    value = (value | (value << 8)) & 0x00FF00FF00FF00FF
+    value = (value | (value << 4)) & 0x0F0F0F0F0F0F0F0F
+    value = (value | (value << 2)) & 0x3333333333333333
+    return (value | (value << 1)) & 0x5555555555555555
+
+
+def _interleave(x, y):
+    return (_spread(x) << 1) | _spread(y)
+
+
+def encode_geocell(latitude, longitude):
+    """
+    Returns the geocell of a point, or None if either coordinate is missing.
+    """
+    if latitude is None or longitude is None:
+        return None
+    return _interleave(_quantize(longitude, -180.0, 180.0), _quantize(latitude, -90.0, 90.0))
+
+
+def distance_km(latitude1, longitude1, latitude2, longitude2):
+    """
+    Returns the great-circle distance between two points in kilometres (haversine formula).
+    """
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    half_dphi = (phi2 - phi1) / 2
+    half_dlambda = math.radians(longitude2 - longitude1) / 2
+    a = math.sin(half_dphi) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(half_dlambda) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def search_level(latitude, cell_km):
+    """
+    Returns the finest grid level (bits per axis) whose cells are at least cell_km high and, at the latitude, wide.
+    """
+    width_factor = math.cos(math.radians(min(89.9, abs(latitude))))
+    for level in range(GEOCELL_BITS, 0, -1):
+        height_km = 180.0 / (1 << level) * KM_PER_DEGREE
+        if height_km >= cell_km and 2 * height_km * width_factor >= cell_km:
+            return level
+    return 0
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    Returns the (south, north, west, east) bounds in degrees of a box containing the circle around a point.
+    West is greater than east when the box crosses the antimeridian; near the poles it spans all longitudes.
+    """
+    delta_latitude = radius_km / KM_PER_DEGREE
+    south, north = max(-90.0, latitude - delta_latitude), min(90.0, latitude + delta_latitude)
+    widest = max(abs(south), abs(north))
+    if widest >= 89.9:
+        return south, north, -180.0, 180.0
+    delta_longitude = delta_latitude / math.cos(math.radians(widest))
+    if delta_longitude >= 180.0:
+        return south, north, -180.0, 180.0
+    west = (longitude - delta_longitude + 180.0) % 360.0 - 180.0
+    east = (longitude + delta_longitude + 180.0) % 360.0 - 180.0
+    return south, north, west, east
+
+
+def geocell_ranges(latitude, longitude, radius_km):
+    """
+    Returns the sorted, merged [low, high) geocell ranges of the grid cells overlapping the bounding box of the
+    circle around a point. The cells are at least half the radius in size, so at most 5 x 5 of them are needed.
+    """
+    level = search_level(latitude, radius_km / 2)
+    if level == 0:
+        return [(0, 1 << (2 * GEOCELL_BITS))]
+    south, north, west, east = bounding_box(latitude, longitude, radius_km)
+    cells = 1 << level
+    rows = range(_quantize(south, -90.0, 90.0, level), _quantize(north, -90.0, 90.0, level) + 1)
+    first_column, last_column = _quantize(west, -180.0, 180.0, level), _quantize(east, -180.0, 180.0, level)
+    if west > east:
+        # Crosses the antimeridian: wrap around the last column
+        last_column += cells
+    columns = [column % cells for column in range(first_column, last_column + 1)]
+
+    shift = 2 * (GEOCELL_BITS - level)
+    ranges = []
+    for prefix in sorted({_interleave(column, row) for column in columns for row in rows}):
+        low, high = prefix << shift, (prefix + 1) << shift
+        if ranges and ranges[-1][1] == low:
+            ranges[-1] = (ranges[-1][0], high)
+        else:
+            ranges.append((low, high))
+    return ranges
+
+
+def nearby_candidates(latitude, longitude, radius_km):
+    """
+    Returns the (id, latitude, longitude) rows of the restaurants in the bounding box of the circle around a point:
+    a superset of the restaurants within the radius. The geocell ranges are range scans of the (geocell, latitude,
+    longitude) index, which also holds the coordinates checked against the box, so the table itself is not read.
+    The query is written in SQL: compiling the same filter of up to 25 OR-ed ranges with the ORM took several
+    times longer than running it.
+    """
+    ranges = geocell_ranges(latitude, longitude, radius_km)
+    south, north, west, east = bounding_box(latitude, longitude, radius_km)
+    connection = connections[router.db_for_read(Restaurant)]
+    quote = connection.ops.quote_name
+    geocell, latitude_column, longitude_column = quote('geocell'), quote('latitude'), quote('longitude')
+    cells = ' OR '.join([f'({geocell} >= %s AND {geocell} < %s)'] * len(ranges))
+    if west <= east:
+        longitude_condition = f'{longitude_column} BETWEEN %s AND %s'
+    else:
+        longitude_condition = f'({longitude_column} >= %s OR {longitude_column} <= %s)'
+    sql = (
+        f'SELECT {quote("id")}, {latitude_column}, {longitude_column} FROM {quote(Restaurant._meta.db_table)} '
+        f'WHERE ({cells}) AND {latitude_column} BETWEEN %s AND %s AND {longitude_condition}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [bound for cell_range in ranges for bound in cell_range] + [south, north, west, east])
+        return cursor.fetchall()
+
+
+def nearby_restaurants(latitude, longitude, radius_km, limit):
+    """
+    Returns up to `limit` restaurants within radius_km of a point, nearest first (ties by ID).
+    Each restaurant gets its distance from the point as a `distance_km` attribute.
+
+    The search starts with a radius of INITIAL_SEARCH_RADIUS_KM and widens it fourfold until it has found `limit`
+    restaurants or reached radius_km, so dense areas only scan a small neighbourhood. Only the IDs and coordinates of
+    the candidates are read; the nearest restaurants are then loaded by primary key.
+    """
+    search_radius = min(radius_km, INITIAL_SEARCH_RADIUS_KM)
+    while True:
+        nearest = []
+        for pk, candidate_latitude, candidate_longitude in nearby_candidates(latitude, longitude, search_radius):
+            distance = distance_km(latitude, longitude, candidate_latitude, candidate_longitude)
+            if distance <= search_radius:
+                nearest.append((distance, pk))
+        if len(nearest) >= limit or search_radius >= radius_km:
+            break
+        search_radius = min(radius_km, search_radius * 4)
+
+    nearest = sorted(nearest)[:limit]
+    restaurants = Restaurant.objects.in_bulk([pk for _, pk in nearest])
+    results = []
+    for distance, pk in nearest:
+        restaurant = restaurants[pk]
+        restaurant.distance_km = distance
+        results.append(restaurant)
+    return results
@@ -0,0 +1,48 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from api.archive import archive_batch
+
+class Command(BaseCommand):
+    help = 'Moves delivered orders older than the given number of days, with their items, into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help='Archive delivered orders created more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of orders moved per transaction (at most 900)')
+        parser.add_argument(
+            '--pause', type=float, default=0.0,
+            help='Seconds to sleep between batches, leaving the database to other writers on a busy server',
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] < 0:
+            raise CommandError('--days must not be negative.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be a positive number.')
+
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        # Walk the orders in primary key order, one batch per transaction, so the command can be interrupted and resumed
+        last_id = 0
+        total_orders = total_items = 0
+        # Time spent moving rows, without the pauses between batches
+        elapsed = 0.0
+        while True:
+            batch_started = time.perf_counter()
+            last_id, orders, items = archive_batch(cutoff, last_id, options['batch_size'])
+            batch_elapsed = time.perf_counter() - batch_started
+            elapsed += batch_elapsed
+            if last_id is None:
+                break
+            total_orders += orders
+            total_items += items
+            batch_rate = (orders + items) / batch_elapsed if batch_elapsed else 0.0
+            self.stdout.write(f'Archived {total_orders} orders and {total_items} items ({batch_rate:.0f} rows/s in the last batch)...')
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        rate = (total_orders + total_items) / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {total_orders} orders and {total_items} order items in {elapsed:.2f} s ({rate:.0f} rows/s)!'
+        ))
@@ -0,0 +1,50 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from api.models import MenuItem, Order, OrderItem
+
+class Command(BaseCommand):
+    help = 'Recomputes the denormalized total_amount and item_count of existing orders from their items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of orders updated per transaction')
+        parser.add_argument(
+            '--snapshot-missing-prices', action='store_true',
+            help='Copy the current menu price into order items whose price was never recorded (0.00) before computing totals',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        if options['snapshot_missing_prices']:
+            # Orders created before prices were snapshotted stored 0.00; the current menu price is the best available value
+            menu_price = MenuItem.objects.filter(pk=OuterRef('menu_item_id')).values('price')[:1]
+            updated = OrderItem.objects.filter(price=0).update(price=Subquery(menu_price))
+            self.stdout.write(self.style.SUCCESS(f'Snapshotted the menu price of {updated} order items.'))
+
+        # Correlated subqueries computing both totals from the items of each order
+        items = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+        total_amount = items.annotate(
+            total=Sum(F('price') * F('quantity'), output_field=DecimalField(max_digits=10, decimal_places=2)),
+        ).values('total')
+        item_count = items.annotate(count=Sum('quantity')).values('count')
+
+        # Walk the orders in primary key order, one batch per transaction, so the command can be interrupted and resumed
+        last_id = 0
+        total_updated = 0
+        while True:
+            batch_ids = list(Order.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not batch_ids:
+                break
+            with transaction.atomic():
+                total_updated += Order.objects.filter(pk__in=batch_ids).update(
+                    total_amount=Coalesce(Subquery(total_amount), Value(Decimal('0.00')), output_field=DecimalField(max_digits=10, decimal_places=2)),
+                    item_count=Coalesce(Subquery(item_count), Value(0)),
+                )
+            last_id = batch_ids[-1]
+            self.stdout.write(f'Updated {total_updated} orders...')
+
+        self.stdout.write(self.style.SUCCESS(f'Order totals successfully backfilled for {total_updated} orders!'))
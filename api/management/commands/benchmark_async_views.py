@@ -0,0 +1,110 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from itertools import cycle, islice
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from api.benchmarking import format_latencies, scratch_database
+from api.models import MenuItem, Order, OrderItem, Restaurant
+
+class Command(BaseCommand):
+    help = 'Compares the concurrent-request throughput of the read endpoints under the WSGI and ASGI handlers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Number of requests per run')
+        parser.add_argument('--concurrency', type=int, default=32, help='Number of requests in flight at once')
+        parser.add_argument('--restaurants', type=int, default=100, help='Number of restaurants in the scratch database')
+        parser.add_argument('--items-per-restaurant', type=int, default=20, help='Number of menu items per restaurant')
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            token = self.create_data(options['restaurants'], options['items_per_restaurant'])
+            self.headers = {'Authorization': 'Token ' + token}
+            restaurant_id = Restaurant.objects.order_by('id').values_list('id', flat=True).first()
+            order_id = Order.objects.values_list('id', flat=True).first()
+
+            sync_paths = [
+                reverse('restaurant-list'),
+                reverse('restaurant-detail', args=[restaurant_id]),
+                reverse('restaurant-menu', args=[restaurant_id]),
+                reverse('customer-order-detail', args=[order_id]),
+            ]
+            async_paths = [
+                reverse('async-restaurant-list'),
+                reverse('async-restaurant-detail', args=[restaurant_id]),
+                reverse('async-restaurant-menu', args=[restaurant_id]),
+                reverse('async-customer-order-detail', args=[order_id]),
+            ]
+
+            self.stdout.write(
+                f"{options['requests']} requests, concurrency {options['concurrency']}, "
+                f"{options['restaurants']} restaurants x {options['items_per_restaurant']} menu items"
+            )
+            runs = [
+                ('WSGI, sync views', self.run_wsgi, sync_paths),
+                ('ASGI, sync views', self.run_asgi, sync_paths),
+                ('ASGI, async views', self.run_asgi, async_paths),
+            ]
+            for label, runner, paths in runs:
+                requests = list(islice(cycle(paths), options['requests']))
+                started = time.perf_counter()
+                latencies = runner(requests, options['concurrency'])
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'{label:<20} {len(requests) / elapsed:9.1f} req/s  {format_latencies(latencies)}')
+
+        self.stdout.write(self.style.SUCCESS('Benchmark finished!'))
+
+    def create_data(self, restaurant_count, items_per_restaurant):
+        """
+        Fills the scratch database with restaurants, menu items and an order of the benchmark user,
+        and returns the user's token.
+        """
+        restaurants = Restaurant.objects.bulk_create(
+            Restaurant(name=f'Benchmark Étterem {index}', address=f'Benchmark Cím {index}') for index in range(restaurant_count)
+        )
+        MenuItem.objects.bulk_create(
+            MenuItem(restaurant=restaurant, name=f'Étel {index}', description='Benchmark étel', price=Decimal('9.90') + index)
+            for restaurant in restaurants for index in range(items_per_restaurant)
+        )
+        user = User.objects.create_user(username='benchmark', password='benchmarkpassword')
+        menu_items = list(restaurants[0].menu.all()[:5])
+        order = Order.objects.create(customer=user, restaurant=restaurants[0], item_count=len(menu_items),
+                                     total_amount=sum(menu_item.price for menu_item in menu_items))
+        OrderItem.objects.bulk_create(OrderItem(order=order, menu_item=menu_item, price=menu_item.price) for menu_item in menu_items)
+        return Token.objects.get_or_create(user=user)[0].key
+
+    def run_wsgi(self, paths, concurrency):
+        """
+        Issues the requests through the WSGI handler from a pool of threads and returns their latencies.
+        """
+        def request(path):
+            started = time.perf_counter()
+            response = Client(headers=self.headers).get(path)
+            assert response.status_code == 200, (path, response.status_code)
+            return time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(request, paths))
+
+    def run_asgi(self, paths, concurrency):
+        """
+        Issues the requests through the ASGI handler from a single event loop and returns their latencies.
+        """
+        async def run():
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def request(path):
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await AsyncClient().get(path, headers=self.headers)
+                    assert response.status_code == 200, (path, response.status_code)
+                    return time.perf_counter() - started
+
+            return await asyncio.gather(*(request(path) for path in paths))
+
+        return asyncio.run(run())
@@ -0,0 +1,81 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from api.benchmarking import format_latencies, scratch_database
+from api.geo import distance_km, encode_geocell, nearby_candidates, nearby_restaurants
+from api.management.commands.populate_db import random_location
+from api.models import Restaurant
+
+class Command(BaseCommand):
+    help = 'Measures the nearby restaurant search at scale: indexed candidate selection, nearest restaurants, and a full scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurants', type=int, default=100000, help='Number of restaurants in the scratch database')
+        parser.add_argument('--queries', type=int, default=1000, help='Number of searched points')
+        parser.add_argument(
+            '--radii', type=float, nargs='+', default=[0.5, 1.0, 2.0],
+            help='Radii in kilometres the candidate selection is measured with',
+        )
+        parser.add_argument('--radius', type=float, default=5.0, help='Radius of the nearest-restaurant search in kilometres')
+        parser.add_argument('--limit', type=int, default=20, help='Number of restaurants returned by the nearest-restaurant search')
+        parser.add_argument('--seed', type=int, default=1, help='Seed of the random locations')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with scratch_database():
+            self.create_restaurants(rng, options['restaurants'])
+            # Searches start where the users are, around the same town centres as the restaurants
+            points = [random_location(rng) for _ in range(options['queries'])]
+            radius, limit = options['radius'], options['limit']
+            self.stdout.write(f"{options['restaurants']} restaurants, {len(points)} searched points")
+
+            for candidate_radius in options['radii']:
+                latencies, counts = [], []
+                for latitude, longitude in points:
+                    started = time.perf_counter()
+                    rows = nearby_candidates(latitude, longitude, candidate_radius)
+                    latencies.append(time.perf_counter() - started)
+                    counts.append(len(rows))
+                counts.sort()
+                self.stdout.write(
+                    f'candidates within {candidate_radius:g} km  {format_latencies(latencies)}  '
+                    f'candidates: median {counts[len(counts) // 2]}, max {counts[-1]}'
+                )
+
+            def full_scan(latitude, longitude):
+                # What a client does with the full restaurant list: compute every distance and sort
+                rows = Restaurant.objects.filter(latitude__isnull=False).values_list('pk', 'latitude', 'longitude')
+                distances = sorted((distance_km(latitude, longitude, lat, lng), pk) for pk, lat, lng in rows)
+                return [pk for distance, pk in distances if distance <= radius][:limit]
+
+            runs = [
+                (f'nearest {limit} within {radius:g} km', lambda latitude, longitude: nearby_restaurants(latitude, longitude, radius, limit), points),
+                # Reading every restaurant is far slower, so it is measured on fewer points
+                ('full scan', full_scan, points[:max(1, len(points) // 50)]),
+            ]
+            for label, function, run_points in runs:
+                latencies = []
+                for latitude, longitude in run_points:
+                    started = time.perf_counter()
+                    function(latitude, longitude)
+                    latencies.append(time.perf_counter() - started)
+                self.stdout.write(f'{label:<27} {format_latencies(latencies)}')
+        self.stdout.write(self.style.SUCCESS('Benchmark finished!'))
+
+    def create_restaurants(self, rng, count):
+        """
+        Fills the scratch database with restaurants clustered around the town centres used by populate_db.
+        """
+        restaurants = []
+        for number in range(count):
+            latitude, longitude = random_location(rng)
+            restaurants.append(Restaurant(
+                name=f'Benchmark Étterem {number}', address=f'Benchmark Cím {number}',
+                latitude=latitude, longitude=longitude, geocell=encode_geocell(latitude, longitude),
+            ))
+        Restaurant.objects.bulk_create(restaurants, batch_size=5000)
+        with connection.cursor() as cursor:
+            # Lets the query planner know how selective the geocell index is
+            cursor.execute('ANALYZE')
@@ -0,0 +1,69 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from api.benchmarking import scratch_database
+from api.fast_serializers import get_flat_serializer
+from api.models import MenuItem, Order, OrderItem, Restaurant
+from api.serializers import MenuItemSerializer, OrderSerializer, RestaurantSerializer
+
+class Command(BaseCommand):
+    help = 'Compares the ModelSerializers with the fast flat serializers, reported per 1,000 rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Number of restaurants, menu items and orders to serialize')
+        parser.add_argument('--items-per-order', type=int, default=3, help='Number of items in each order')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs; the best one is reported')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        with scratch_database():
+            self.create_data(rows, options['items_per_order'])
+            cases = [
+                ('RestaurantSerializer', RestaurantSerializer, Restaurant.objects.order_by('id')),
+                ('MenuItemSerializer', MenuItemSerializer, MenuItem.objects.order_by('id')),
+                ('OrderSerializer', OrderSerializer, OrderSerializer.setup_eager_loading(Order.objects.order_by('id'))),
+            ]
+            self.stdout.write(f"{rows} rows per case, {options['items_per_order']} items per order, best of {options['repeat']} runs (query + serialization)")
+            for label, serializer_class, queryset in cases:
+                flat_serializer = get_flat_serializer(serializer_class)
+                reference = self.best_time(lambda: serializer_class(queryset.all(), many=True).data, options['repeat'])
+                fast = self.best_time(lambda: flat_serializer.serialize_queryset(queryset.all()), options['repeat'])
+                self.stdout.write(
+                    f'{label:<22} ModelSerializer {reference * 1000 / rows * 1000:8.2f} ms / 1,000 rows  '
+                    f'flat {fast * 1000 / rows * 1000:8.2f} ms / 1,000 rows  speedup {reference / fast:5.1f}x'
+                )
+        self.stdout.write(self.style.SUCCESS('Benchmark finished!'))
+
+    def best_time(self, function, repeat):
+        """
+        Returns the shortest wall-clock time of several calls of the function, in seconds.
+        """
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    def create_data(self, rows, items_per_order):
+        """
+        Fills the scratch database with the given number of restaurants, menu items and orders.
+        """
+        user = User.objects.create_user(username='benchmark', password='benchmarkpassword', email='benchmark@example.com')
+        restaurants = Restaurant.objects.bulk_create(
+            Restaurant(name=f'Benchmark Étterem {index}', address=f'Benchmark Cím {index}') for index in range(rows)
+        )
+        menu_items = MenuItem.objects.bulk_create(
+            MenuItem(restaurant=restaurants[index], name=f'Étel {index}', description='Benchmark étel', price=Decimal('9.90'))
+            for index in range(rows)
+        )
+        orders = Order.objects.bulk_create(
+            Order(customer=user, restaurant=restaurants[index], total_amount=Decimal('9.90') * items_per_order, item_count=items_per_order)
+            for index in range(rows)
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, menu_item=menu_items[(index + offset) % rows], price=Decimal('9.90'))
+            for index, order in enumerate(orders) for offset in range(items_per_order)
+        )
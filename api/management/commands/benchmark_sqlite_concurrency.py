@@ -0,0 +1,161 @@
+import logging
+import multiprocessing
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from api.benchmarking import format_latencies, scratch_database
+from api.models import MenuItem, Order, Restaurant
+
+# What the backend does without the high-concurrency profile: rollback journal, a new connection per request,
+# deferred transactions, and the driver's default 5 second busy timeout
+DEFAULT_PROFILE = {
+    'init_command': 'PRAGMA journal_mode = delete',
+    'SQLITE_IMMEDIATE_WRITES': False,
+    'CONN_MAX_AGE': 0,
+}
+
+class Command(BaseCommand):
+    help = 'Measures write and read throughput and the "database is locked" error rate of SQLite with several processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help='Number of processes creating orders and changing their status')
+        parser.add_argument('--readers', type=int, default=4, help='Number of processes reading orders')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each run')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark only applies to the SQLite backend.')
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError('This benchmark starts its worker processes with fork, which this platform does not support.')
+
+        configured = {
+            'init_command': connection.settings_dict['OPTIONS'].get('init_command', ''),
+            'SQLITE_IMMEDIATE_WRITES': getattr(settings, 'SQLITE_IMMEDIATE_WRITES', False),
+            'CONN_MAX_AGE': connection.settings_dict['CONN_MAX_AGE'],
+        }
+        # Failed requests are counted instead of logged
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            with scratch_database():
+                tokens, restaurant_id, menu_item_ids = self.create_data(options['writers'] + options['readers'])
+                self.stdout.write(
+                    f"{options['writers']} writer and {options['readers']} reader processes, {options['seconds']:g} s per run"
+                )
+                for label, profile in [('SQLite defaults', DEFAULT_PROFILE), ('configured profile', configured)]:
+                    self.run(label, profile, tokens, restaurant_id, menu_item_ids, options)
+        finally:
+            request_logger.setLevel(level)
+        self.stdout.write(self.style.SUCCESS('Benchmark finished!'))
+
+    def create_data(self, user_count):
+        """
+        Fills the scratch database with a restaurant, its menu and one user per worker process with an order,
+        and returns the users' tokens, the restaurant's ID and the menu item IDs.
+        """
+        restaurant = Restaurant.objects.create(name='Benchmark Étterem', address='Benchmark Cím')
+        menu_items = MenuItem.objects.bulk_create(
+            MenuItem(restaurant=restaurant, name=f'Étel {index}', price=Decimal('9.90') + index) for index in range(10)
+        )
+        tokens = []
+        for index in range(user_count):
+            user = User.objects.create_user(username=f'benchmark{index}', password='benchmarkpassword')
+            Order.objects.create(customer=user, restaurant=restaurant)
+            tokens.append(Token.objects.get_or_create(user=user)[0].key)
+        return tokens, restaurant.id, [menu_item.id for menu_item in menu_items]
+
+    def run(self, label, profile, tokens, restaurant_id, menu_item_ids, options):
+        """
+        Runs the writer and reader processes for the given duration under a profile and reports
+        per role the completed requests per second, the share of requests failing with "database is locked"
+        (other failures are listed separately) and the latency percentiles.
+        """
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        with override_settings(SQLITE_IMMEDIATE_WRITES=profile['SQLITE_IMMEDIATE_WRITES']):
+            connection.settings_dict['OPTIONS']['init_command'] = profile['init_command']
+            connection.settings_dict['CONN_MAX_AGE'] = profile['CONN_MAX_AGE']
+            # Switches the journal mode, which is stored in the database file, before the workers connect
+            connections.close_all()
+            connection.ensure_connection()
+            connections.close_all()
+
+            start_at = time.monotonic() + 0.5
+            roles = ['write'] * options['writers'] + ['read'] * options['readers']
+            processes = [
+                context.Process(
+                    target=self.work,
+                    args=(role, token, start_at, start_at + options['seconds'], restaurant_id, menu_item_ids, results),
+                )
+                for role, token in zip(roles, tokens)
+            ]
+            for process in processes:
+                process.start()
+            stats = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+
+        self.stdout.write(f'{label}:')
+        for role in ('write', 'read'):
+            rows = [row for row_role, row in stats if row_role == role]
+            latencies = [latency for row in rows for latency in row['latencies']]
+            attempts = len(latencies) + sum(row['locked'] + row['errors'] for row in rows)
+            locked = sum(row['locked'] for row in rows)
+            errors = sum(row['errors'] for row in rows)
+            self.stdout.write(
+                f"  {role + 's':<7} {len(latencies) / options['seconds']:8.1f} req/s  "
+                f"locked {locked / attempts * 100 if attempts else 0:5.1f}%  other errors {errors:4}  "
+                f"{format_latencies(latencies)}"
+            )
+
+    def work(self, role, token, start_at, end_at, restaurant_id, menu_item_ids, results):
+        """
+        Body of a worker process. Writers create an order and move it to 'preparing' through the bulk status
+        endpoint (which reads before it writes); readers fetch their order and the restaurant's order list.
+        """
+        client = Client(headers={'Authorization': 'Token ' + token})
+        stats = {'latencies': [], 'locked': 0, 'errors': 0}
+        order_id = Order.objects.filter(customer__auth_token__key=token).values_list('id', flat=True).first()
+        connections.close_all()
+        read_paths = [
+            reverse('customer-order-detail', args=[order_id]),
+            reverse('restaurant-order-list') + f'?restaurant={restaurant_id}&page_size=20',
+        ]
+        step = 0
+        time.sleep(max(0.0, start_at - time.monotonic()))
+        try:
+            while time.monotonic() < end_at:
+                started = time.perf_counter()
+                try:
+                    if role == 'read':
+                        response = client.get(read_paths[step % len(read_paths)])
+                    elif step % 2 == 0:
+                        response = client.post(reverse('create-order'), {
+                            'restaurantId': restaurant_id,
+                            'items': [{'menuItemId': menu_item_ids[step % len(menu_item_ids)], 'quantity': 1}],
+                        }, content_type='application/json')
+                        if response.status_code == 201:
+                            order_id = response.json()['id']
+                    else:
+                        response = client.patch(reverse('bulk-update-order-status'), {
+                            'orders': [{'id': order_id, 'status': 'preparing'}],
+                        }, content_type='application/json')
+                except OperationalError as exc:
+                    stats['locked' if 'locked' in str(exc) else 'errors'] += 1
+                else:
+                    if response.status_code < 400:
+                        stats['latencies'].append(time.perf_counter() - started)
+                    else:
+                        stats['errors'] += 1
+                step += 1
+        finally:
+            connections.close_all()
+            results.put((role, stats))
@@ -0,0 +1,82 @@
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from api.benchmarking import scratch_database
+from api.models import MenuItem, Order, OrderItem, Restaurant
+from api.serializers import OrderSerializer
+
+class Command(BaseCommand):
+    help = 'Compares the peak memory of rendering the full order list at once with the streaming list modes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=20000, help='Number of orders in the scratch database')
+        parser.add_argument('--items-per-order', type=int, default=3, help='Number of items in each order')
+        parser.add_argument('--fast', action='store_true', help='Enable API_FAST_SERIALIZATION for all runs')
+
+    def handle(self, *args, **options):
+        with scratch_database(), override_settings(API_FAST_SERIALIZATION=options['fast']):
+            user = self.create_data(options['orders'], options['items_per_order'])
+            client = APIClient()
+            client.force_authenticate(user)
+            url = reverse('restaurant-order-list')
+
+            self.stdout.write(
+                f"{options['orders']} orders x {options['items_per_order']} items, "
+                f"fast serialization {'on' if options['fast'] else 'off'} (timings include tracemalloc overhead)"
+            )
+            runs = [
+                ('materialized list', self.render_materialized),
+                ('stream=json', lambda: self.consume(client.get(url + '?stream=json'))),
+                ('stream=ndjson', lambda: self.consume(client.get(url + '?stream=ndjson'))),
+            ]
+            for label, run in runs:
+                tracemalloc.start()
+                started = time.perf_counter()
+                size = run()
+                elapsed = time.perf_counter() - started
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                self.stdout.write(f'{label:<18} peak {peak / 2 ** 20:8.1f} MiB  {elapsed:7.2f} s  {size / 2 ** 20:8.1f} MiB of JSON')
+
+        self.stdout.write(self.style.SUCCESS('Benchmark finished!'))
+
+    def render_materialized(self):
+        """
+        Renders every order the way an unpaginated list response would: all model objects,
+        then all serialized dicts, then the whole JSON document. Returns the body size.
+        """
+        queryset = OrderSerializer.setup_eager_loading(Order.objects.order_by('created_at', 'id'))
+        return len(JSONRenderer().render(OrderSerializer(queryset, many=True).data))
+
+    def consume(self, response):
+        """
+        Reads a streamed response chunk by chunk, as a client would, and returns the body size.
+        """
+        return sum(len(chunk) for chunk in response.streaming_content)
+
+    def create_data(self, order_count, items_per_order):
+        """
+        Fills the scratch database with a restaurant, its menu and orders of the benchmark user, and returns the user.
+        """
+        user = User.objects.create_user(username='benchmark', password='benchmarkpassword', email='benchmark@example.com')
+        restaurant = Restaurant.objects.create(name='Benchmark Étterem', address='Benchmark Cím')
+        menu_items = MenuItem.objects.bulk_create(
+            MenuItem(restaurant=restaurant, name=f'Étel {index}', description='Benchmark étel', price=Decimal('9.90') + index)
+            for index in range(20)
+        )
+        orders = Order.objects.bulk_create(
+            (Order(customer=user, restaurant=restaurant, item_count=items_per_order, total_amount=Decimal('29.70'))
+             for _ in range(order_count)), batch_size=2000,
+        )
+        OrderItem.objects.bulk_create(
+            (OrderItem(order=order, menu_item=menu_items[(index + offset) % len(menu_items)], price=menu_items[0].price)
+             for index, order in enumerate(orders) for offset in range(items_per_order)), batch_size=2000,
+        )
+        return user
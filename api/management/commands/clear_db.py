@@ -1,11 +1,46 @@
-from django.core.management.base import BaseCommand
-from api.models import Restaurant, MenuItem, Order, OrderItem
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
+from api.authentication import invalidate_token
+from api.cache import RESTAURANT_LIST_SCOPE, bump_version, restaurant_scope
+from api.models import Restaurant, MenuItem, Order, OrderItem, ArchivedOrder, ArchivedOrderItem, DailyMenuItemSales, SalesRollupState
 from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+
+# Tables emptied by the fast mode, children before their parents
+FAST_DELETE_ORDER = [DailyMenuItemSales, SalesRollupState, ArchivedOrderItem, ArchivedOrder, OrderItem, Order, MenuItem, Restaurant]
 
 class Command(BaseCommand):
     help = 'Deletes all test data from the database'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fast', action='store_true',
+            help='Empty the tables with SQL statements instead of loading every object into the deletion collector',
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            help='With --fast, delete this many rows per transaction instead of truncating the tables at once',
+        )
+        parser.add_argument(
+            '--keep-users', action='store_true',
+            help='Keep the users; otherwise the test user (or with --fast, every user that is neither staff nor superuser) is deleted',
+        )
+
     def handle(self, *args, **options):
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be a positive number.')
+        if options['fast']:
+            self.fast_delete(options['batch_size'], options['keep_users'])
+        else:
+            self.collector_delete(options['keep_users'])
+        self.stdout.write(self.style.SUCCESS('Test data successfully deleted!'))
+
+    def collector_delete(self, keep_users):
+        """
+        Deletes the data through the ORM, which loads every object to cascade the deletion and send signals.
+        Only suitable for small datasets.
+        """
         # Delete all restaurants
         Restaurant.objects.all().delete()
         self.stdout.write(self.style.SUCCESS('All restaurants deleted.'))
@@ -22,6 +57,8 @@ class Command(BaseCommand):
         OrderItem.objects.all().delete()
         self.stdout.write(self.style.SUCCESS('All order items deleted.'))
 
+        if keep_users:
+            return
         # Attempt to delete the test user
         try:
             test_user = User.objects.get(username='testuser')
@@ -30,4 +67,89 @@ class Command(BaseCommand):
         except User.DoesNotExist:
             self.stdout.write(self.style.WARNING('Test user does not exist.'))
 
-        self.stdout.write(self.style.SUCCESS('Test data successfully deleted!'))
\ No newline at end of file
+    def fast_delete(self, batch_size, keep_users):
+        """
+        Empties the tables in dependency order without loading any objects. Without a batch size the tables are
+        flushed with the backend's fastest statement (TRUNCATE where supported, an unqualified DELETE on SQLite);
+        with a batch size the rows are deleted in primary key ranges, one transaction per batch, which keeps
+        transactions short on a database that is in use.
+        """
+        # Deleted restaurants must not be served from the API cache, which raw SQL deletes do not invalidate
+        restaurant_ids = list(Restaurant.objects.values_list('id', flat=True).iterator())
+
+        # Children are emptied before their parents, so checking every deleted row against the foreign keys is
+        # wasted work; on SQLite the checks also disable the optimization that empties a table without visiting its rows
+        with connection.constraint_checks_disabled():
+            if batch_size is None:
+                tables = [model._meta.db_table for model in FAST_DELETE_ORDER]
+                connection.ops.execute_sql_flush(connection.ops.sql_flush(no_style(), tables))
+                self.stdout.write(self.style.SUCCESS(f'Emptied {", ".join(tables)}.'))
+            else:
+                for model in FAST_DELETE_ORDER:
+                    self.delete_in_batches(model, batch_size)
+
+        for restaurant_id in restaurant_ids:
+            bump_version(restaurant_scope(restaurant_id))
+        bump_version(RESTAURANT_LIST_SCOPE)
+
+        if not keep_users:
+            self.delete_customers(batch_size or 1000)
+
+    def delete_in_batches(self, model, batch_size):
+        """
+        Deletes every row of a model's table in primary key order, at most batch_size rows per transaction.
+        """
+        table = connection.ops.quote_name(model._meta.db_table)
+        pk_column = connection.ops.quote_name(model._meta.pk.column)
+        deleted = 0
+        while True:
+            # The primary key of the last row of the next batch; the remaining rows if there are fewer than batch_size
+            boundary = list(model.objects.order_by('pk').values_list('pk', flat=True)[batch_size - 1:batch_size])
+            with transaction.atomic(), connection.cursor() as cursor:
+                if boundary:
+                    cursor.execute(f'DELETE FROM {table} WHERE {pk_column} <= %s', boundary)
+                else:
+                    cursor.execute(f'DELETE FROM {table}')
+                deleted += cursor.rowcount
+            self.stdout.write(f'Deleted {deleted} rows from {model._meta.db_table}...')
+            if not boundary:
+                break
+
+    def delete_customers(self, batch_size):
+        """
+        Deletes every user that is neither staff nor superuser, together with the rows of other tables referencing
+        them (tokens, group and permission memberships, admin log entries), in batches and without loading the users.
+        Deleted tokens are evicted from the token authentication cache.
+        """
+        # Every relation pointing at the user table, including the hidden ones of many-to-many through tables
+        relations = []
+        for relation in User._meta.get_fields(include_hidden=True):
+            if not (relation.auto_created and not relation.concrete and (relation.one_to_many or relation.one_to_one)):
+                continue
+            if relation.on_delete not in (models.CASCADE, models.SET_NULL):
+                raise CommandError(f'Cannot delete users referenced by {relation.related_model._meta.label} without the ORM.')
+            relations.append(relation)
+
+        # Stays below the bound parameter limit of every backend
+        batch_size = min(batch_size, 900)
+        customers = User.objects.filter(is_staff=False, is_superuser=False).order_by('pk')
+        deleted = 0
+        while ids := list(customers.values_list('pk', flat=True)[:batch_size]):
+            token_keys = list(Token.objects.filter(user_id__in=ids).values_list('key', flat=True))
+            placeholders = ', '.join(['%s'] * len(ids))
+            with transaction.atomic(), connection.cursor() as cursor:
+                for relation in relations:
+                    table = connection.ops.quote_name(relation.related_model._meta.db_table)
+                    column = connection.ops.quote_name(relation.field.column)
+                    if relation.on_delete is models.CASCADE:
+                        cursor.execute(f'DELETE FROM {table} WHERE {column} IN ({placeholders})', ids)
+                    else:
+                        cursor.execute(f'UPDATE {table} SET {column} = NULL WHERE {column} IN ({placeholders})', ids)
+                cursor.execute(
+                    f'DELETE FROM {connection.ops.quote_name(User._meta.db_table)} WHERE {connection.ops.quote_name(User._meta.pk.column)} '
+                    f'IN ({placeholders})', ids,
+                )
+                deleted += cursor.rowcount
+            for key in token_keys:
+                invalidate_token(key)
+            self.stdout.write(f'Deleted {deleted} users...')
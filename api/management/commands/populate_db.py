@@ -1,13 +1,84 @@
+import itertools
+import math
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
 from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from api.cache import RESTAURANT_LIST_SCOPE, bump_version
+from api.geo import KM_PER_DEGREE, encode_geocell
 from api.models import Restaurant, MenuItem, Order, OrderItem
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
 from django.utils import timezone
 from random import randint
 
+# Relative order volume per hour of the day: quiet nights, a lunch peak and a larger dinner peak
+HOURLY_ORDER_WEIGHTS = [1, 1, 1, 1, 1, 1, 2, 3, 4, 4, 6, 12, 16, 12, 6, 4, 5, 10, 16, 18, 14, 8, 4, 2]
+# Relative frequency of orders with 1, 2, 3, ... distinct menu items
+ITEMS_PER_ORDER_WEIGHTS = [35, 30, 20, 10, 5]
+# Relative frequency of the quantities 1, 2 and 3 of an ordered menu item
+QUANTITY_WEIGHTS = [80, 15, 5]
+DISHES = [
+    'Gulyásleves', 'Pizza Margherita', 'Hamburger', 'Saláta', 'Sushi Válogatás', 'Ramen', 'Lecsó', 'Rántott sajt',
+    'Halászlé', 'Pörkölt', 'Palacsinta', 'Lángos', 'Töltött káposzta', 'Rakott krumpli', 'Somlói galuska', 'Pad Thai',
+]
+# Centres of the towns generated restaurants are placed in: latitude, longitude, relative number of restaurants
+# and the standard deviation of their distance from the centre in kilometres
+CITIES = [
+    (47.4979, 19.0402, 60, 6.0),  # Budapest
+    (47.5316, 21.6273, 8, 3.0),   # Debrecen
+    (46.2530, 20.1414, 8, 3.0),   # Szeged
+    (48.1035, 20.7784, 6, 3.0),   # Miskolc
+    (46.0727, 18.2323, 6, 2.5),   # Pécs
+    (47.6875, 17.6504, 5, 2.5),   # Győr
+    (46.9062, 19.6913, 4, 2.0),   # Kecskemét
+    (47.1860, 18.4221, 3, 2.0),   # Székesfehérvár
+]
+
+def random_location(rng):
+    """
+    Returns a random (latitude, longitude) pair, clustered around the centres of CITIES.
+    """
+    latitude, longitude, _, spread_km = rng.choices(CITIES, weights=[city[2] for city in CITIES])[0]
+    latitude += rng.gauss(0, spread_km) / KM_PER_DEGREE
+    longitude += rng.gauss(0, spread_km) / (KM_PER_DEGREE * math.cos(math.radians(latitude)))
+    return round(latitude, 6), round(longitude, 6)
+
+def zipf_cum_weights(count, exponent):
+    """
+    Returns the cumulative weights of a Zipf-like distribution over `count` ranks, for random.choices().
+    A handful of ranks get most of the weight, like hot restaurants and popular menu items do.
+    """
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
 class Command(BaseCommand):
-    help = 'Creates some test data in the database'
+    help = 'Creates some test data in the database, or a synthetic dataset of the given size'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurants', type=int, help='Number of restaurants to generate (default 100)')
+        parser.add_argument('--items-per-restaurant', type=int, help='Number of menu items per generated restaurant (default 20)')
+        parser.add_argument('--users', type=int, help='Number of customers to generate (default 1000)')
+        parser.add_argument('--orders', type=int, help='Number of orders to generate (default 10000)')
+        parser.add_argument('--days', type=int, default=90, help='Number of days up to now over which the generated orders are spread')
+        parser.add_argument('--seed', type=int, help='Seed of the random generator, for reproducible datasets')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Number of orders inserted per transaction')
 
     def handle(self, *args, **options):
+        scale_options = ['restaurants', 'items_per_restaurant', 'users', 'orders', 'seed']
+        if all(options[name] is None for name in scale_options):
+            self.create_sample_data()
+        else:
+            self.generate(options)
+
+    def create_sample_data(self):
+        """
+        Creates the small fixture used for manual testing: a test user, two restaurants with menus and an order.
+        """
         self.stdout.write(self.style.SUCCESS('Creating test data...'))
 
         # Create a test user if they don't exist
@@ -17,8 +88,8 @@ class Command(BaseCommand):
             test_user.save()
 
         # Create restaurants
-        restaurant1 = Restaurant.objects.create(name='Teszt Étterem 1', address='Teszt Cím 1')
-        restaurant2 = Restaurant.objects.create(name='Teszt Étterem 2', address='Teszt Cím 2')
+        restaurant1 = Restaurant.objects.create(name='Teszt Étterem 1', address='Teszt Cím 1', latitude=47.4979, longitude=19.0402)
+        restaurant2 = Restaurant.objects.create(name='Teszt Étterem 2', address='Teszt Cím 2', latitude=47.5008, longitude=19.0537)
 
         # Create menu items for the first restaurant
         menu_item1_1 = MenuItem.objects.create(restaurant=restaurant1, name='Pizza Margherita', price=12.50)
@@ -29,10 +100,166 @@ class Command(BaseCommand):
         menu_item2_1 = MenuItem.objects.create(restaurant=restaurant2, name='Sushi Válogatás', price=19.99)
         menu_item2_2 = MenuItem.objects.create(restaurant=restaurant2, name='Ramen', price=14.50)
 
-        # Create an order for the test user from the first restaurant
-        order1 = Order.objects.create(customer=test_user, restaurant=restaurant1)
-        OrderItem.objects.create(order=order1, menu_item=menu_item1_1, quantity=1, price=menu_item1_1.price)
-        OrderItem.objects.create(order=order1, menu_item=menu_item1_2, quantity=1, price=menu_item1_2.price)
-        OrderItem.objects.create(order=order1, menu_item=menu_item1_3, quantity=1, price=menu_item1_3.price)
+        # Create an order for the test user from the first restaurant, with its denormalized totals
+        order1_items = [menu_item1_1, menu_item1_2, menu_item1_3]
+        order1 = Order.objects.create(
+            customer=test_user,
+            restaurant=restaurant1,
+            total_amount=sum(Decimal(str(menu_item.price)) for menu_item in order1_items),
+            item_count=len(order1_items),
+        )
+        for menu_item in order1_items:
+            OrderItem.objects.create(order=order1, menu_item=menu_item, quantity=1, price=menu_item.price)
+
+        self.stdout.write(self.style.SUCCESS('Test data successfully created!'))
+
+    def generate(self, options):
+        """
+        Generates a synthetic dataset with skewed distributions: a few hot restaurants receive most orders,
+        a few popular items make up most of each menu's sales, regular customers order more often than others,
+        and orders follow a time-of-day curve with lunch and dinner peaks. Everything is inserted in batches.
+        """
+        restaurant_count = options['restaurants'] if options['restaurants'] is not None else 100
+        items_per_restaurant = options['items_per_restaurant'] if options['items_per_restaurant'] is not None else 20
+        user_count = options['users'] if options['users'] is not None else 1000
+        order_count = options['orders'] if options['orders'] is not None else 10000
+        seed = options['seed'] if options['seed'] is not None else randint(0, 2 ** 32 - 1)
+        rng = random.Random(seed)
+        started = time.perf_counter()
+        self.stdout.write(self.style.SUCCESS(f'Generating synthetic data with seed {seed}...'))
+
+        restaurants, menus = self.generate_restaurants(rng, restaurant_count, items_per_restaurant, options['batch_size'])
+        customer_ids = self.generate_users(user_count, options['batch_size'])
+        if order_count and (not restaurants or not customer_ids or not items_per_restaurant):
+            self.stderr.write('Orders need at least one restaurant, menu item and user.')
+            return
+        self.generate_orders(rng, order_count, restaurants, menus, customer_ids, options['days'], options['batch_size'])
+        bump_version(RESTAURANT_LIST_SCOPE)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(restaurants)} restaurants, {len(restaurants) * items_per_restaurant} menu items, '
+            f'{len(customer_ids)} users and {order_count} orders in {time.perf_counter() - started:.1f} s!'
+        ))
+
+    def generate_restaurants(self, rng, restaurant_count, items_per_restaurant, batch_size):
+        """
+        Creates the restaurants and their menus. Returns the restaurant IDs ordered from the hottest to the coldest
+        restaurant, and for each restaurant its menu as (id, price) pairs ordered from the most to the least popular item.
+        """
+        first_number = (Restaurant.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        restaurants = []
+        for number in range(first_number, first_number + restaurant_count):
+            latitude, longitude = random_location(rng)
+            restaurants.append(Restaurant(
+                name=f'Étterem {number}', address=f'{rng.randint(1, 200)}. utca {number}',
+                # bulk_create() sends no pre_save signal, which would set the geocell
+                latitude=latitude, longitude=longitude, geocell=encode_geocell(latitude, longitude),
+            ))
+        restaurants = Restaurant.objects.bulk_create(restaurants, batch_size=batch_size)
+        menu_items = MenuItem.objects.bulk_create(
+            (MenuItem(
+                restaurant=restaurant,
+                name=f'{rng.choice(DISHES)} {index + 1}',
+                description='',
+                # Log-normal prices around 10 with a long tail of expensive dishes
+                price=Decimal(str(round(min(rng.lognormvariate(2.3, 0.4), 150), 1))).quantize(Decimal('0.01')),
+            ) for restaurant in restaurants for index in range(items_per_restaurant)),
+            batch_size=batch_size,
+        )
+        menus = {}
+        for menu_item in menu_items:
+            menus.setdefault(menu_item.restaurant_id, []).append((menu_item.id, menu_item.price))
+        for menu in menus.values():
+            rng.shuffle(menu)
+        restaurant_ids = [restaurant.id for restaurant in restaurants]
+        rng.shuffle(restaurant_ids)
+        self.stdout.write(f'Created {len(restaurants)} restaurants and {len(menu_items)} menu items...')
+        return restaurant_ids, menus
+
+    def generate_users(self, user_count, batch_size):
+        """
+        Creates the customers, all with the password '$ecret123', and returns their IDs.
+        The password is hashed once and shared, as hashing it per user would dominate the run time.
+        """
+        password = make_password('$ecret123')
+        first_number = (User.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        User.objects.bulk_create(
+            (User(username=f'customer{number}', email=f'customer{number}@example.com', password=password)
+             for number in range(first_number, first_number + user_count)),
+            batch_size=batch_size,
+        )
+        customer_ids = list(User.objects.filter(id__gte=first_number).order_by('id').values_list('id', flat=True))
+        self.stdout.write(f'Created {len(customer_ids)} users...')
+        return customer_ids
+
+    def generate_orders(self, rng, order_count, restaurants, menus, customer_ids, days, batch_size):
+        """
+        Creates the orders and their items in batches, one transaction per batch, with their denormalized totals.
+        Orders older than a day are delivered; more recent ones are spread over all statuses.
+        """
+        restaurant_weights = zipf_cum_weights(len(restaurants), 1.1)
+        customer_weights = zipf_cum_weights(len(customer_ids), 0.7)
+        menu_weights = {len(menu): zipf_cum_weights(len(menu), 1.0) for menu in menus.values()}
+        hour_weights = list(itertools.accumulate(HOURLY_ORDER_WEIGHTS))
+        size_weights = list(itertools.accumulate(ITEMS_PER_ORDER_WEIGHTS))
+        quantity_weights = list(itertools.accumulate(QUANTITY_WEIGHTS))
+        now = timezone.now()
+        first_day = (now - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+        recent = now - timedelta(days=1)
+        statuses = [choice for choice, _ in Order.STATUS_CHOICES]
+        adapt_datetime = connection.ops.adapt_datetimefield_value
+        adapt_decimal = connection.ops.adapt_decimalfield_value
+
+        # The two largest tables are written with plain batched INSERTs and explicit primary keys: building model
+        # instances and compiling them with bulk_create() costs several times more than the database work itself
+        order_insert = self.insert_sql(Order, ['id', 'customer', 'restaurant', 'created_at', 'status', 'total_amount', 'item_count', 'version'])
+        item_insert = self.insert_sql(OrderItem, ['id', 'order', 'menu_item', 'quantity', 'price', 'special_instructions'])
+        next_order_id = (Order.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        next_item_id = (OrderItem.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+        created = 0
+        while created < order_count:
+            size = min(batch_size, order_count - created)
+            order_rows, item_rows = [], []
+            for restaurant_id, customer_id, hour, distinct_items in zip(
+                rng.choices(restaurants, cum_weights=restaurant_weights, k=size),
+                rng.choices(customer_ids, cum_weights=customer_weights, k=size),
+                rng.choices(range(24), cum_weights=hour_weights, k=size),
+                rng.choices(range(1, len(ITEMS_PER_ORDER_WEIGHTS) + 1), cum_weights=size_weights, k=size),
+            ):
+                created_at = first_day + timedelta(days=rng.randrange(days + 1), hours=hour, seconds=rng.randrange(3600))
+                if created_at > now:
+                    created_at = now - timedelta(seconds=rng.randrange(3600))
+                menu = menus[restaurant_id]
+                picks = rng.choices(menu, cum_weights=menu_weights[len(menu)], k=distinct_items)
+                items = list(zip(dict.fromkeys(picks), rng.choices((1, 2, 3), cum_weights=quantity_weights, k=distinct_items)))
+                order_rows.append((
+                    next_order_id, customer_id, restaurant_id, adapt_datetime(created_at),
+                    'delivered' if created_at < recent else rng.choice(statuses),
+                    adapt_decimal(sum(price * quantity for (_, price), quantity in items)),
+                    sum(quantity for _, quantity in items), 0,
+                ))
+                for (menu_item_id, price), quantity in items:
+                    item_rows.append((next_item_id, next_order_id, menu_item_id, quantity, adapt_decimal(price), None))
+                    next_item_id += 1
+                next_order_id += 1
+
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(order_insert, order_rows)
+                cursor.executemany(item_insert, item_rows)
+            created += size
+            self.stdout.write(f'Created {created} orders...')
+
+        # Move the primary key sequences past the explicit IDs (a no-op on SQLite)
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Order, OrderItem]):
+                cursor.execute(sql)
 
-        self.stdout.write(self.style.SUCCESS('Test data successfully created!'))
\ No newline at end of file
+    def insert_sql(self, model, field_names):
+        """
+        Returns a parameterized INSERT statement for the columns of the given model fields.
+        """
+        quote_name = connection.ops.quote_name
+        columns = ', '.join(quote_name(model._meta.get_field(name).column) for name in field_names)
+        placeholders = ', '.join(['%s'] * len(field_names))
+        return f'INSERT INTO {quote_name(model._meta.db_table)} ({columns}) VALUES ({placeholders})'
@@ -0,0 +1,267 @@
+import json
+import logging
+import queue
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Min
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import Resolver404, resolve, reverse
+from rest_framework.authtoken.models import Token
+from api.benchmarking import format_latencies, percentile
+from api.models import MenuItem, Order, Restaurant
+
+# Relative frequency of the endpoints in a generated request mix
+GENERATED_MIX_WEIGHTS = {
+    'restaurant-list': 30,
+    'restaurant-detail': 20,
+    'restaurant-menu': 20,
+    'customer-order-detail': 10,
+    'create-order': 8,
+    'restaurant-order-list': 7,
+    'update-order-status': 5,
+}
+
+class Command(BaseCommand):
+    help = 'Replays a JSONL request mix against the API and reports throughput, latency percentiles and queries per endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('mix', help='JSONL file with one {"method", "path", "body", "user"} object per line')
+        parser.add_argument('--concurrency', type=int, default=1, help='Number of requests in flight at once')
+        parser.add_argument('--repeat', type=int, default=1, help='Number of times the whole mix is replayed')
+        parser.add_argument(
+            '--base-url',
+            help='Send the requests to a running server (e.g. http://localhost:8000) instead of through the test client; '
+                 'database queries are only counted in-process',
+        )
+        parser.add_argument('--json', dest='json_output', help='Also write the results to this JSON file, to compare runs')
+        parser.add_argument(
+            '--generate', type=int, metavar='N',
+            help='Instead of replaying, write a mix of N requests built from the data in the database to the mix file',
+        )
+        parser.add_argument('--seed', type=int, help='Seed of the random generator used by --generate')
+
+    def handle(self, *args, **options):
+        if options['generate'] is not None:
+            self.generate_mix(options['mix'], options['generate'], options['seed'])
+            return
+
+        entries = self.load_mix(options['mix'])
+        tokens = self.get_tokens({entry['user'] for entry in entries if entry.get('user')})
+        requests = [entry for _ in range(options['repeat']) for entry in entries]
+        self.stdout.write(
+            f"Replaying {len(requests)} requests with concurrency {options['concurrency']} "
+            f"against {options['base_url'] or 'the test client'}. Writes in the mix are applied to the configured database."
+        )
+
+        # The test client sends requests for the 'testserver' host; client errors are counted instead of logged
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                started = time.perf_counter()
+                results = self.replay(requests, tokens, options['concurrency'], options['base_url'])
+                elapsed = time.perf_counter() - started
+        finally:
+            request_logger.setLevel(level)
+        self.report(results, elapsed, options['json_output'])
+
+    def load_mix(self, path):
+        """
+        Reads and validates the request mix.
+        """
+        entries = []
+        try:
+            with open(path, encoding='utf-8') as mix:
+                for number, line in enumerate(mix, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError as exc:
+                        raise CommandError(f'{path}:{number}: invalid JSON ({exc}).')
+                    if not isinstance(entry, dict) or not entry.get('method') or not str(entry.get('path', '')).startswith('/'):
+                        raise CommandError(f'{path}:{number}: every line needs a "method" and an absolute "path".')
+                    entries.append(entry)
+        except OSError as exc:
+            raise CommandError(f'Cannot read the request mix: {exc}.')
+        if not entries:
+            raise CommandError(f'{path} contains no requests.')
+        return entries
+
+    def get_tokens(self, usernames):
+        """
+        Returns the authentication token of every user named in the mix, creating missing tokens.
+        """
+        users = {user.username: user for user in User.objects.filter(username__in=usernames)}
+        missing = sorted(usernames - set(users))
+        if missing:
+            raise CommandError(f'Unknown users in the request mix: {", ".join(missing[:10])}.')
+        return {username: Token.objects.get_or_create(user=user)[0].key for username, user in users.items()}
+
+    def get_endpoint(self, entry):
+        """
+        Returns the label results are grouped by: the method and the URL pattern name of the path.
+        """
+        try:
+            name = resolve(entry['path'].split('?', 1)[0]).url_name or entry['path']
+        except Resolver404:
+            name = entry['path']
+        return f"{entry['method'].upper()} {name}"
+
+    def replay(self, requests, tokens, concurrency, base_url):
+        """
+        Sends the requests from `concurrency` worker threads in mix order and returns one
+        (endpoint, latency in seconds, number of queries or None, status code) tuple per request.
+        """
+        pending = queue.Queue()
+        for entry in requests:
+            pending.put(entry)
+        results = []
+        results_lock = threading.Lock()
+        send = self.send_http if base_url else self.send_in_process
+
+        def work():
+            client = None if base_url else Client()
+            try:
+                while True:
+                    try:
+                        entry = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    headers = {'Authorization': 'Token ' + tokens[entry['user']]} if entry.get('user') else {}
+                    body = json.dumps(entry['body']) if entry.get('body') is not None else None
+                    started = time.perf_counter()
+                    status_code, queries = send(client or base_url, entry['method'].upper(), entry['path'], body, headers)
+                    latency = time.perf_counter() - started
+                    with results_lock:
+                        results.append((self.get_endpoint(entry), latency, queries, status_code))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work) for _ in range(max(1, concurrency))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def send_in_process(self, client, method, path, body, headers):
+        """
+        Sends a request through the Django test client and counts the queries it runs.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = client.generic(method, path, data=body or '', content_type='application/json', headers=headers)
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+        return response.status_code, len(queries)
+
+    def send_http(self, base_url, method, path, body, headers):
+        """
+        Sends a request to a running server over HTTP.
+        """
+        request = urllib.request.Request(
+            base_url.rstrip('/') + path, data=body.encode() if body is not None else None, method=method,
+            headers={'Content-Type': 'application/json', **headers},
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status, None
+        except urllib.error.HTTPError as exc:
+            return exc.code, None
+
+    def report(self, results, elapsed, json_output):
+        """
+        Prints the overall throughput and, per endpoint, the request and error counts, latency percentiles
+        and average number of queries. Optionally writes the same figures to a JSON file.
+        """
+        by_endpoint = defaultdict(list)
+        for endpoint, latency, queries, status_code in results:
+            by_endpoint[endpoint].append((latency, queries, status_code))
+
+        summary = {'requests': len(results), 'seconds': elapsed, 'throughput': len(results) / elapsed, 'endpoints': {}}
+        self.stdout.write(f"{len(results)} requests in {elapsed:.2f} s, {summary['throughput']:.1f} req/s")
+        self.stdout.write(f"{'endpoint':<34} {'requests':>8} {'errors':>6}  latency{'':<42} queries")
+        for endpoint in sorted(by_endpoint):
+            rows = by_endpoint[endpoint]
+            latencies = [latency for latency, _, _ in rows]
+            counted = [queries for _, queries, _ in rows if queries is not None]
+            errors = sum(1 for _, _, status_code in rows if status_code >= 400)
+            average_queries = sum(counted) / len(counted) if counted else None
+            summary['endpoints'][endpoint] = {
+                'requests': len(rows),
+                'errors': errors,
+                **{f'p{int(fraction * 100)}_ms': percentile(latencies, fraction) * 1000 for fraction in (0.5, 0.95, 0.99)},
+                'queries': average_queries,
+            }
+            self.stdout.write(
+                f"{endpoint:<34} {len(rows):>8} {errors:>6}  {format_latencies(latencies)}  "
+                f"{'-' if average_queries is None else f'{average_queries:.1f}':>7}"
+            )
+        if json_output:
+            with open(json_output, 'w', encoding='utf-8') as output:
+                json.dump(summary, output, indent=2)
+        self.stdout.write(self.style.SUCCESS('Replay finished!'))
+
+    def generate_mix(self, path, count, seed):
+        """
+        Writes a request mix of `count` requests over the restaurants, menus and orders in the database, weighted by
+        GENERATED_MIX_WEIGHTS. Customer requests are made by the owners of existing orders.
+        """
+        rng = random.Random(seed)
+        restaurant_ids = list(self.sample(Restaurant.objects.all(), rng).values_list('id', flat=True))
+        orders = list(self.sample(Order.objects.all(), rng).values_list('id', 'customer__username', 'restaurant_id'))
+        if not restaurant_ids or not orders:
+            raise CommandError('Generating a request mix needs restaurants and orders in the database; run populate_db first.')
+        menus = defaultdict(list)
+        for menu_item_id, restaurant_id in MenuItem.objects.filter(restaurant_id__in=[order[2] for order in orders]).values_list('id', 'restaurant_id'):
+            menus[restaurant_id].append(menu_item_id)
+        statuses = [choice for choice, _ in Order.STATUS_CHOICES]
+
+        names = list(GENERATED_MIX_WEIGHTS)
+        with open(path, 'w', encoding='utf-8') as mix:
+            for name in rng.choices(names, weights=[GENERATED_MIX_WEIGHTS[name] for name in names], k=count):
+                order_id, username, restaurant_id = rng.choice(orders)
+                entry = {'method': 'GET', 'path': None, 'body': None, 'user': username}
+                if name == 'restaurant-list':
+                    entry['path'] = reverse(name) + f'?page_size={rng.choice([20, 50])}'
+                elif name in ('restaurant-detail', 'restaurant-menu'):
+                    entry['path'] = reverse(name, args=[rng.choice(restaurant_ids)])
+                elif name == 'customer-order-detail':
+                    entry['path'] = reverse(name, args=[order_id])
+                elif name == 'create-order':
+                    menu = menus[restaurant_id]
+                    entry.update(method='POST', path=reverse(name), body={
+                        'restaurantId': restaurant_id,
+                        'items': [{'menuItemId': menu_item_id, 'quantity': rng.randint(1, 3)}
+                                  for menu_item_id in rng.sample(menu, min(len(menu), rng.randint(1, 3)))],
+                    })
+                elif name == 'restaurant-order-list':
+                    entry['path'] = reverse(name) + f'?restaurant={restaurant_id}&status=received,preparing'
+                else:
+                    entry.update(method='PATCH', path=reverse(name, args=[order_id]), body={'status': rng.choice(statuses)})
+                mix.write(json.dumps(entry) + '\n')
+        self.stdout.write(self.style.SUCCESS(f'Wrote {count} requests to {path}.'))
+
+    def sample(self, queryset, rng, size=1000):
+        """
+        Returns up to `size` random rows of a queryset by drawing primary keys from its ID range,
+        which avoids sorting the whole table like order_by('?') does.
+        """
+        bounds = queryset.aggregate(first=Min('pk'), last=Max('pk'))
+        if bounds['first'] is None:
+            return queryset.none()
+        candidates = {rng.randint(bounds['first'], bounds['last']) for _ in range(size)}
+        return queryset.filter(pk__in=candidates).order_by('pk')
@@ -0,0 +1,36 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from api.rollups import DEFAULT_ROLLUP_BATCH_SIZE, roll_up_sales
+
+class Command(BaseCommand):
+    help = 'Adds the order items created since the last run to the daily sales rollup'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_ROLLUP_BATCH_SIZE,
+            help='Number of order items rolled up per transaction',
+        )
+        parser.add_argument(
+            '--settle-seconds', type=float, default=60.0,
+            help='Leave the items of orders created within this many seconds to the next run, '
+                 'so transactions still inserting items cannot commit below the high-water mark',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be a positive number.')
+        if options['settle_seconds'] < 0:
+            raise CommandError('--settle-seconds must not be negative.')
+
+        settled_before = timezone.now() - timedelta(seconds=options['settle_seconds'])
+        total = 0
+        started = time.perf_counter()
+        while rolled_up := roll_up_sales(options['batch_size'], settled_before):
+            total += rolled_up
+            self.stdout.write(f'Rolled up {total} order items...')
+        elapsed = time.perf_counter() - started
+        rate = total / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {total} order items in {elapsed:.2f} s ({rate:.0f} items/s)!'))
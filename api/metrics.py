@@ -0,0 +1,228 @@
+"""
+Per-endpoint request metrics of the current worker process, rendered in the Prometheus text exposition format.
+
+Every thread records into its own shard, so recording a request never takes a lock; the shards are only merged
+when the metrics are scraped, and the shard of a finished thread is folded into one aggregate. Counters are per process: with several worker processes each one has to be scraped
+(or the workers run behind a single-process ASGI server).
+"""
+import bisect
+import threading
+import time
+import weakref
+from contextvars import ContextVar
+
+# Upper bounds in seconds of the request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class EndpointStats:
+    """
+    Aggregated measurements of the requests of one view and HTTP method.
+    """
+    __slots__ = ('statuses', 'buckets', 'duration_sum', 'queries', 'query_duration', 'response_bytes')
+
+    def __init__(self):
+        self.statuses = {}
+        # One counter per bucket plus the +Inf bucket; not cumulative until rendered
+        self.buckets = [0] * (len(DURATION_BUCKETS) + 1)
+        self.duration_sum = 0.0
+        self.queries = 0
+        self.query_duration = 0.0
+        self.response_bytes = 0
+
+    def observe(self, status_code, duration, queries, query_duration, response_bytes):
+        self.statuses[status_code] = self.statuses.get(status_code, 0) + 1
+        self.buckets[bisect.bisect_left(DURATION_BUCKETS, duration)] += 1
+        self.duration_sum += duration
+        self.queries += queries
+        self.query_duration += query_duration
+        self.response_bytes += response_bytes
+
+    def merge(self, other):
+        for status_code, count in list(other.statuses.items()):
+            self.statuses[status_code] = self.statuses.get(status_code, 0) + count
+        self.buckets = [mine + theirs for mine, theirs in zip(self.buckets, other.buckets)]
+        self.duration_sum += other.duration_sum
+        self.queries += other.queries
+        self.query_duration += other.query_duration
+        self.response_bytes += other.response_bytes
+
+
+class _ShardHolder:
+    """
+    Thread-local owner of a shard; collected when its thread ends, which retires the shard.
+    """
+    __slots__ = ('shard', '__weakref__')
+
+    def __init__(self, shard):
+        self.shard = shard
+
+
+class MetricsRegistry:
+    """
+    Collects EndpointStats per (view, method) in per-thread shards.
+    When a thread ends, its shard is folded into a single aggregate of retired shards, so servers starting a thread
+    per connection (like runserver) keep one shard per live thread instead of one per thread ever started.
+    """
+    def __init__(self):
+        self._local = threading.local()
+        # Shards of the live threads by their id()
+        self._shards = {}
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def _get_shard(self):
+        holder = getattr(self._local, 'holder', None)
+        if holder is None:
+            shard = {}
+            holder = self._local.holder = _ShardHolder(shard)
+            # Only taken once per thread
+            with self._lock:
+                self._shards[id(shard)] = shard
+            weakref.finalize(holder, self._retire, shard)
+        return holder.shard
+
+    def _retire(self, shard):
+        """
+        Moves the counters of a finished thread's shard into the retired aggregate.
+        """
+        with self._lock:
+            # Shards discarded by reset() are not retired
+            if self._shards.get(id(shard)) is not shard:
+                return
+            del self._shards[id(shard)]
+            for key, stats in shard.items():
+                self._retired.setdefault(key, EndpointStats()).merge(stats)
+
+    def observe(self, view, method, status_code, duration, queries=0, query_duration=0.0, response_bytes=0):
+        """
+        Records one request.
+        """
+        shard = self._get_shard()
+        stats = shard.get((view, method))
+        if stats is None:
+            stats = shard[(view, method)] = EndpointStats()
+        stats.observe(status_code, duration, queries, query_duration, response_bytes)
+
+    def collect(self):
+        """
+        Returns the measurements of all threads merged into one EndpointStats per (view, method).
+        """
+        merged = {}
+        with self._lock:
+            # Copied under the lock, as a shard retired afterwards would otherwise be counted twice
+            for key, stats in self._retired.items():
+                merged.setdefault(key, EndpointStats()).merge(stats)
+            shards = list(self._shards.values())
+        for shard in shards:
+            for key, stats in list(shard.items()):
+                merged.setdefault(key, EndpointStats()).merge(stats)
+        return merged
+
+    def shard_count(self):
+        """
+        Returns the number of shards of live threads.
+        """
+        with self._lock:
+            return len(self._shards)
+
+    def reset(self):
+        """
+        Discards every measurement; meant for tests.
+        """
+        with self._lock:
+            # Released after the lock, as dropping the current thread's holder runs _retire()
+            discarded = self._local
+            self._shards = {}
+            self._retired = {}
+            self._local = threading.local()
+        del discarded
+
+
+registry = MetricsRegistry()
+
+
+class QueryCounter:
+    """
+    Number of queries run for a request and the time spent in them.
+    """
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+
+
+# Counter of the request being measured. A context variable rather than a per-connection wrapper, because the
+# queries of async views run on the connections of other threads, into which sync_to_async copies the context
+active_query_counter = ContextVar('active_query_counter', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper adding the query to the active QueryCounter, if any.
+    """
+    counter = active_query_counter.get()
+    if counter is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        counter.duration += time.perf_counter() - started
+        counter.queries += 1
+
+
+def install_query_counting(connection):
+    """
+    Adds count_query() to the execute wrappers of a database connection, once.
+    """
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_float(value):
+    return repr(float(value))
+
+
+def render_prometheus(metrics=None):
+    """
+    Renders the collected metrics in the Prometheus text exposition format (version 0.0.4).
+    """
+    metrics = registry.collect() if metrics is None else metrics
+    items = sorted(metrics.items())
+    lines = [
+        '# HELP api_requests_total Number of handled requests.',
+        '# TYPE api_requests_total counter',
+    ]
+    for (view, method), stats in items:
+        for status_code, count in sorted(stats.statuses.items()):
+            lines.append(f'api_requests_total{{view="{_escape(view)}",method="{method}",status="{status_code}"}} {count}')
+
+    lines += [
+        '# HELP api_request_duration_seconds Time spent handling requests, until the response was returned.',
+        '# TYPE api_request_duration_seconds histogram',
+    ]
+    for (view, method), stats in items:
+        labels = f'view="{_escape(view)}",method="{method}"'
+        cumulative = 0
+        for bound, count in zip(DURATION_BUCKETS + ('+Inf',), stats.buckets):
+            cumulative += count
+            le = bound if bound == '+Inf' else _format_float(bound)
+            lines.append(f'api_request_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+        lines.append(f'api_request_duration_seconds_sum{{{labels}}} {_format_float(stats.duration_sum)}')
+        lines.append(f'api_request_duration_seconds_count{{{labels}}} {cumulative}')
+
+    for name, attribute, kind, help_text in [
+        ('api_db_queries_total', 'queries', 'counter', 'Number of database queries run by requests.'),
+        ('api_db_query_duration_seconds_total', 'query_duration', 'counter', 'Time spent in database queries run by requests.'),
+        ('api_response_size_bytes_total', 'response_bytes', 'counter', 'Size of non-streaming response bodies.'),
+    ]:
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        for (view, method), stats in items:
+            value = getattr(stats, attribute)
+            value = _format_float(value) if isinstance(value, float) else value
+            lines.append(f'{name}{{view="{_escape(view)}",method="{method}"}} {value}')
+    return '\n'.join(lines) + '\n'
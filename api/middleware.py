@@ -0,0 +1,232 @@
+import json
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework import exceptions
+from rest_framework.permissions import SAFE_METHODS
+
+from .authentication import CachedTokenAuthentication
+from .metrics import QueryCounter, active_query_counter, registry
+from .routers import (
+    ais_pinned_to_primary, apin_to_primary, choose_read_replica, get_read_replicas, is_pinned_to_primary, pin_to_primary,
+    read_database,
+)
+
+
+class RequestRecordingMiddleware:
+    """
+    Appends every API request to the JSONL file named by the API_REQUEST_RECORD_FILE setting, one object with the
+    method, path (including the query string), JSON body and authenticated username per line, in the format
+    replayed by the replay_requests management command. Requests whose body contains a password are not recorded.
+    Works in the WSGI and the ASGI handler; under ASGI the line is written from a worker thread.
+    Disabled unless the setting is given.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.path = getattr(settings, 'API_REQUEST_RECORD_FILE', None)
+        if not self.path:
+            raise MiddlewareNotUsed()
+        self.lock = threading.Lock()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        body = self.get_json_body(request) if request.path.startswith('/api/') else None
+        response = self.get_response(request)
+        self.record(request, body)
+        return response
+
+    async def __acall__(self, request):
+        body = self.get_json_body(request) if request.path.startswith('/api/') else None
+        response = await self.get_response(request)
+        # Resolving a lazy session user queries the database, and the file is written with blocking I/O
+        await sync_to_async(self.record)(request, body)
+        return response
+
+    def record(self, request, body):
+        """
+        Appends the request to the record file, unless it is not an API request or its body contains a password.
+        """
+        if not request.path.startswith('/api/') or (isinstance(body, dict) and 'password' in body):
+            return
+        user = getattr(request, 'user', None)
+        entry = {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'body': body,
+            'user': user.get_username() if user is not None and user.is_authenticated else None,
+        }
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self.lock, open(self.path, 'a', encoding='utf-8') as log:
+            log.write(line)
+
+    def get_json_body(self, request):
+        """
+        Returns the decoded JSON body of the request, or None if it has no JSON body.
+        """
+        if not request.content_type == 'application/json' or not request.body:
+            return None
+        try:
+            return json.loads(request.body)
+        except ValueError:
+            return None
+
+
+class MetricsMiddleware:
+    """
+    Records the count, duration histogram, database queries and time, and response size of every request
+    in the process-wide metrics registry, labelled with the view name of the matched URL pattern and the method.
+    The duration ends when the response is returned, so the body of a streaming response is not included.
+    Queries are counted on every thread that runs them for the request, including the sync_to_async threads
+    of async views. Works in the WSGI and the ASGI handler. Disabled when the API_METRICS setting is False.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if not getattr(settings, 'API_METRICS', True):
+            raise MiddlewareNotUsed()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        counter = QueryCounter()
+        token = active_query_counter.set(counter)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            active_query_counter.reset(token)
+        self.observe(request, response, time.perf_counter() - started, counter)
+        return response
+
+    async def __acall__(self, request):
+        counter = QueryCounter()
+        token = active_query_counter.set(counter)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            active_query_counter.reset(token)
+        self.observe(request, response, time.perf_counter() - started, counter)
+        return response
+
+    def observe(self, request, response, duration, counter):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unmatched'
+        response_bytes = 0 if response.streaming else len(response.content)
+        registry.observe(view, request.method, response.status_code, duration, counter.queries, counter.duration, response_bytes)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Chooses the database the reads of a request are routed to by ReadReplicaRouter: a random read replica for
+    safe-method requests, the primary for requests that write and for users who wrote within the last
+    API_REPLICA_STICKY_SECONDS (read-your-writes). Every successful write of an authenticated user, such as
+    creating an order or changing its status, pins the user to the primary again.
+    Must come after AuthenticationMiddleware. Works in the WSGI and the ASGI handler; the chosen database is kept in
+    a context variable, which sync_to_async carries into the threads running the queries of async views.
+    Disabled unless API_READ_REPLICAS names at least one replica.
+    The body of a streaming response is produced after the middleware returns and is read from the primary.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if not get_read_replicas():
+            raise MiddlewareNotUsed()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        database = None
+        if request.method in SAFE_METHODS:
+            user_id = self.get_user_id(request)
+            if user_id is None or not is_pinned_to_primary(user_id):
+                database = choose_read_replica()
+
+        token = read_database.set(database)
+        try:
+            response = self.get_response(request)
+        finally:
+            read_database.reset(token)
+
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            user_id = self.get_writer_id(request)
+            if user_id is not None:
+                pin_to_primary(user_id)
+        return response
+
+    async def __acall__(self, request):
+        database = None
+        if request.method in SAFE_METHODS:
+            user_id = await self.aget_user_id(request)
+            if user_id is None or not await ais_pinned_to_primary(user_id):
+                database = choose_read_replica()
+
+        token = read_database.set(database)
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_database.reset(token)
+
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            # A session user the view did not look at is still lazy, and loading it queries the database
+            user_id = await sync_to_async(self.get_writer_id)(request)
+            if user_id is not None:
+                await apin_to_primary(user_id)
+        return response
+
+    def get_user_id(self, request):
+        """
+        Returns the ID of the user the request is authenticated as by token or session, or None.
+        Tokens are resolved through the token cache; invalid credentials are left for the view to reject.
+        """
+        try:
+            authenticated = CachedTokenAuthentication().authenticate(request)
+        except exceptions.AuthenticationFailed:
+            return None
+        if authenticated is not None:
+            return authenticated[0].pk
+        user = getattr(request, 'user', None)
+        return user.pk if user is not None and user.is_authenticated else None
+
+    async def aget_user_id(self, request):
+        """
+        Asynchronous counterpart of get_user_id().
+        """
+        try:
+            authenticated = await CachedTokenAuthentication().aauthenticate(request)
+        except exceptions.AuthenticationFailed:
+            return None
+        if authenticated is not None:
+            return authenticated[0].pk
+        if not hasattr(request, 'auser'):
+            return None
+        user = await request.auser()
+        return user.pk if user.is_authenticated else None
+
+    def get_writer_id(self, request):
+        """
+        Returns the ID of the user who made a write request, or None if it was anonymous.
+        """
+        # DRF stores the user it authenticated (e.g. by token) on the request as well
+        user = getattr(request, 'user', None)
+        return user.pk if user is not None and user.is_authenticated else None
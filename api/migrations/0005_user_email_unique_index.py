@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-16 23:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Adds a unique index on the email of users, so registration can rely on the database
+    to reject duplicate addresses. Users without an email address are not constrained.
+    """
+
+    dependencies = [
+        ('api', '0004_restaurant_menuitem_updated_at'),
+        # Depend on the latest auth migration: on SQLite, altering auth_user rebuilds the table and drops this index
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="CREATE UNIQUE INDEX auth_user_email_uniq ON auth_user (email) WHERE email <> ''",
+            reverse_sql="DROP INDEX auth_user_email_uniq",
+        ),
+    ]
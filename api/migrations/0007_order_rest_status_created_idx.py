@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-16 22:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_order_total_amount_item_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['restaurant', 'status', 'created_at'], name='order_rest_status_created_idx'),
+        ),
+    ]
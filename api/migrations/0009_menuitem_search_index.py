@@ -0,0 +1,92 @@
+from django.db import migrations
+
+# External-content FTS5 index over the name and description of menu items. The unicode61 tokenizer folds case and
+# (with remove_diacritics 2) accents, so 'salata' finds 'Saláta'. Triggers keep it in sync with every write,
+# including bulk inserts and queryset updates that send no signals.
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE api_menuitem_fts USING fts5(
+        name, description, content='api_menuitem', content_rowid='id', tokenize="unicode61 remove_diacritics 2"
+    )
+    """,
+    """
+    CREATE TRIGGER api_menuitem_fts_insert AFTER INSERT ON api_menuitem BEGIN
+        INSERT INTO api_menuitem_fts (rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER api_menuitem_fts_delete AFTER DELETE ON api_menuitem BEGIN
+        INSERT INTO api_menuitem_fts (api_menuitem_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER api_menuitem_fts_update AFTER UPDATE OF name, description ON api_menuitem BEGIN
+        INSERT INTO api_menuitem_fts (api_menuitem_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO api_menuitem_fts (rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    "INSERT INTO api_menuitem_fts (api_menuitem_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    'DROP TRIGGER IF EXISTS api_menuitem_fts_insert',
+    'DROP TRIGGER IF EXISTS api_menuitem_fts_delete',
+    'DROP TRIGGER IF EXISTS api_menuitem_fts_update',
+    'DROP TABLE IF EXISTS api_menuitem_fts',
+]
+
+# Trigram indexes serving the case-insensitive LIKE '%term%' lookups of the fallback search
+POSTGRESQL_FORWARD = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX api_menuitem_name_trgm ON api_menuitem USING gin (UPPER(name::text) gin_trgm_ops)',
+    'CREATE INDEX api_menuitem_description_trgm ON api_menuitem USING gin (UPPER(description::text) gin_trgm_ops)',
+]
+
+POSTGRESQL_REVERSE = [
+    'DROP INDEX IF EXISTS api_menuitem_name_trgm',
+    'DROP INDEX IF EXISTS api_menuitem_description_trgm',
+]
+
+
+def sqlite_has_fts5(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite' and sqlite_has_fts5(schema_editor):
+        statements = SQLITE_FORWARD
+    elif vendor == 'postgresql':
+        statements = POSTGRESQL_FORWARD
+    else:
+        # The search falls back to unindexed LIKE lookups
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    statements = {'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRESQL_REVERSE}.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+    """
+    Adds the full-text index of the menu item search: an FTS5 table kept in sync by triggers on SQLite, and trigram
+    indexes for the LIKE fallback on PostgreSQL.
+    Altering the MenuItem model on SQLite rebuilds its table, which drops the triggers: such migrations must
+    recreate them and rebuild the index (INSERT INTO api_menuitem_fts (api_menuitem_fts) VALUES ('rebuild')).
+    """
+
+    dependencies = [
+        ('api', '0008_order_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -7,6 +7,18 @@ class Restaurant(models.Model):
     """
     name = models.CharField(max_length=255)
     address = models.TextField()
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    # Interleaved latitude and longitude bits (see api.geo), indexed for the nearby search; set from the
+    # coordinates whenever the restaurant is saved, and NULL for restaurants without a location
+    geocell = models.BigIntegerField(null=True, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Covers the candidate selection of the nearby search: geocell ranges filtered by the coordinates
+            models.Index(fields=['geocell', 'latitude', 'longitude'], name='restaurant_geocell_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -19,6 +31,7 @@ class MenuItem(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
     price = models.DecimalField(max_digits=6, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name} ({self.restaurant.name})"
@@ -27,19 +40,42 @@ class Order(models.Model):
     """
     Represents a customer's order.
     """
+    STATUS_CHOICES = [
+        ('received', 'Received'),
+        ('preparing', 'Preparing'),
+        ('ready', 'Ready'),
+        ('delivered', 'Delivered'),
+    ]
+    # Statuses an order may move to from each status; orders only move forward and the kitchen may skip 'preparing'
+    STATUS_TRANSITIONS = {
+        'received': ('preparing', 'ready'),
+        'preparing': ('ready',),
+        'ready': ('delivered',),
+        'delivered': (),
+    }
+
     customer = models.ForeignKey(User, related_name='orders', on_delete=models.CASCADE)
     restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(
         max_length=20,
-        choices=[
-            ('received', 'Received'),
-            ('preparing', 'Preparing'),
-            ('ready', 'Ready'),
-            ('delivered', 'Delivered'),
-        ],
+        choices=STATUS_CHOICES,
         default='received'
     )
+    # Denormalized totals, written together with the order so listings never need to read the items.
+    # total_amount is the sum of price * quantity and item_count the sum of quantities of the order's items.
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
+    # Incremented by every status change; status updates are conditional on it (optimistic concurrency control)
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Backs the keyset pagination of order listings on (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='order_created_at_id_idx'),
+            # Backs the restaurant order queue: equality on restaurant and status, range and ordering on created_at
+            models.Index(fields=['restaurant', 'status', 'created_at'], name='order_rest_status_created_idx'),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} by {self.customer.username} at {self.restaurant.name}"
@@ -55,4 +91,72 @@ class OrderItem(models.Model):
     special_instructions = models.TextField(blank=True, null=True)
 
     def __str__(self):
-        return f"{self.quantity} x {self.menu_item.name} in Order #{self.order.id}"
\ No newline at end of file
+        return f"{self.quantity} x {self.menu_item.name} in Order #{self.order.id}"
+
+class ArchivedOrder(models.Model):
+    """
+    A delivered order moved out of the live order table by the archive_orders command.
+    Keeps the ID and every column of the original order, so archived orders are served like live ones.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey(User, related_name='archived_orders', on_delete=models.CASCADE)
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE)
+    created_at = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
+    version = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Archived order #{self.id} by {self.customer.username} at {self.restaurant.name}"
+
+class ArchivedOrderItem(models.Model):
+    """
+    An item of an archived order, moved together with its order.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, related_name='items', on_delete=models.CASCADE)
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=1)
+    price = models.DecimalField(max_digits=6, decimal_places=2, default=0.00)
+    special_instructions = models.TextField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.menu_item.name} in archived order #{self.order_id}"
+
+class DailyMenuItemSales(models.Model):
+    """
+    Quantity and revenue of a menu item sold by a restaurant on one day (in the TIME_ZONE of the settings).
+    Rolled up incrementally from the order items, live and archived, by api.rollups; the revenue is computed
+    from the price snapshot of each order item.
+    """
+    restaurant = models.ForeignKey(Restaurant, related_name='daily_sales', on_delete=models.CASCADE)
+    menu_item = models.ForeignKey(MenuItem, related_name='daily_sales', on_delete=models.CASCADE)
+    day = models.DateField()
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            # One row per key; also backs the per-restaurant reports: equality on restaurant, range on day
+            models.UniqueConstraint(fields=['restaurant', 'day', 'menu_item'], name='daily_sales_rest_day_item_uniq'),
+        ]
+        indexes = [
+            # Backs the reports over all restaurants: range on day
+            models.Index(fields=['day', 'menu_item'], name='daily_sales_day_item_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.menu_item.name} on {self.day}"
+
+class SalesRollupState(models.Model):
+    """
+    High-water mark of the sales rollup: every order item with an ID up to last_order_item_id is included in
+    DailyMenuItemSales, and no other. A single row, locked by every transaction that advances it.
+    """
+    last_order_item_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Sales rolled up to order item #{self.last_order_item_id}"
@@ -0,0 +1,154 @@
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, LimitOffsetPagination
+from rest_framework.request import Request
+
+
+class OrderCursorPagination(CursorPagination):
+    """
+    Keyset pagination for order listings.
+    Orders are paged on (created_at, id), which is backed by a composite index on the Order table,
+    so every page is an index range scan and no COUNT(*) query is issued.
+    DRF's CursorPagination only keeps the first ordering field in the cursor and skips rows sharing its value
+    with an offset, which degrades to offset scans when many orders have the same creation time (e.g. bulk
+    inserted ones); the cursors of this class hold both fields, so they never need an offset.
+    """
+    ordering = ('created_at', 'id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Returns the page after (or, for a reverse cursor, before) the cursor's (created_at, id) position.
+        The rows may be model instances or `values()` dictionaries.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        cursor = self.decode_cursor(request)
+        reverse = cursor.reverse if cursor else False
+        position = self.decode_position(cursor.position) if cursor and cursor.position is not None else None
+
+        if reverse:
+            queryset = queryset.order_by('-created_at', '-id')
+            if position is not None:
+                # The first condition bounds the index range scan, the second one resolves ties on created_at
+                queryset = queryset.filter(Q(created_at__lte=position[0]), Q(created_at__lt=position[0]) | Q(id__lt=position[1]))
+        else:
+            queryset = queryset.order_by('created_at', 'id')
+            if position is not None:
+                queryset = queryset.filter(Q(created_at__gte=position[0]), Q(created_at__gt=position[0]) | Q(id__gt=position[1]))
+
+        page = list(queryset[:self.page_size + 1])
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+        if reverse:
+            page.reverse()
+
+        # Moving forward there is a next page if more rows were found; moving backward there is one if a cursor was given
+        self.has_next = has_more if not reverse else position is not None
+        self.has_previous = has_more if reverse else position is not None
+        self.next_position = self.get_row_position(page[-1]) if page else cursor.position if cursor else None
+        self.previous_position = self.get_row_position(page[0]) if page else cursor.position if cursor else None
+        self.page = page
+        return page
+
+    def get_next_link(self):
+        if not self.has_next or self.next_position is None:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self.next_position))
+
+    def get_previous_link(self):
+        if not self.has_previous or self.previous_position is None:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self.previous_position))
+
+    @staticmethod
+    def get_row_position(row):
+        """
+        Returns the cursor position of an order or a `values()` row: its creation time and ID.
+        """
+        if isinstance(row, dict):
+            created_at, pk = row['created_at'], row['id']
+        else:
+            created_at, pk = row.created_at, row.pk
+        return f'{created_at.isoformat()}|{pk}'
+
+    def decode_position(self, position):
+        """
+        Returns the (created_at, id) pair of a cursor position, or raises NotFound for a malformed one.
+        """
+        created_at, _, pk = position.rpartition('|')
+        created_at = parse_datetime(created_at)
+        if created_at is None or not pk.isdigit():
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, int(pk)
+
+
+class MenuSearchPagination(LimitOffsetPagination):
+    """
+    Offset pagination for ranked search results, which have no stable key to page on.
+    """
+    default_limit = 20
+    max_limit = 100
+
+
+class RestaurantCursorPagination(CursorPagination):
+    """
+    Keyset pagination for restaurant listings, paged on the primary key.
+    """
+    ordering = 'id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    async def apaginate_queryset(self, queryset, request):
+        """
+        Asynchronous counterpart of paginate_queryset() for plain Django async views, fetching the page through
+        the async ORM interface. Cursors are interchangeable with the synchronous endpoint; because the ordering
+        field is unique they never need an offset. Returns the page as a list.
+        """
+        drf_request = Request(request)
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(drf_request)
+        cursor = self.decode_cursor(drf_request)
+        reverse = cursor.reverse if cursor else False
+        position = cursor.position if cursor else None
+
+        if reverse:
+            queryset = queryset.order_by('-' + self.ordering)
+            if position is not None:
+                queryset = queryset.filter(**{self.ordering + '__lt': position})
+        else:
+            queryset = queryset.order_by(self.ordering)
+            if position is not None:
+                queryset = queryset.filter(**{self.ordering + '__gt': position})
+
+        page = [obj async for obj in queryset[:self.page_size + 1]]
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+        if reverse:
+            page.reverse()
+
+        # Moving forward there is a next page if more rows were found; moving backward there is one if a cursor was given
+        has_next = has_more if not reverse else position is not None
+        has_previous = has_more if reverse else position is not None
+        next_position = getattr(page[-1], self.ordering) if page else position
+        previous_position = getattr(page[0], self.ordering) if page else position
+        self.async_links = (
+            self.encode_cursor(Cursor(offset=0, reverse=False, position=next_position)) if has_next and next_position is not None else None,
+            self.encode_cursor(Cursor(offset=0, reverse=True, position=previous_position)) if has_previous and previous_position is not None else None,
+        )
+        return page
+
+    def get_async_paginated_data(self, data):
+        """
+        Returns the paginated payload for a page fetched with apaginate_queryset(), in the same shape as
+        the response of the synchronous endpoint.
+        """
+        next_link, previous_link = self.async_links
+        return {'next': next_link, 'previous': previous_link, 'results': data}
@@ -0,0 +1,117 @@
+"""
+Incremental daily sales rollups.
+
+DailyMenuItemSales holds the quantity and revenue of every menu item per restaurant and day, so the sales reports
+read a few rows per item and day instead of every order item ever created. The rollup is maintained from a
+high-water mark: order items are never changed after they are created, so each batch adds the items with IDs above
+the mark (live or archived) to the rollup and advances the mark in the same transaction.
+
+Two things can add an item with a lower ID after the mark has passed it. On backends where several transactions
+insert at once (not SQLite, which has a single writer), a transaction can commit after a later one; so the
+roll_up_sales command only rolls up items of orders created some time ago (its --settle-seconds), while order
+creation with API_SALES_ROLLUP_ON_CREATE locks the mark before it inserts. And archive_orders moves items between
+the live and archive tables, which must not happen while a batch reads both: every archive batch locks the rollup
+state in its transaction as well, so it waits for a running rollup batch and the other way round.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from itertools import chain, takewhile
+
+from django.db.models import DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+
+from .models import ArchivedOrderItem, DailyMenuItemSales, OrderItem, SalesRollupState
+from .sqlite import write_transaction
+
+ROLLUP_STATE_ID = 1
+
+CENT = Decimal('0.01')
+
+# Order item tables the rollup reads; an item is in exactly one of them
+ITEM_MODELS = (OrderItem, ArchivedOrderItem)
+
+# Order items rolled up per transaction by default; stays well below the bound parameter limit
+DEFAULT_ROLLUP_BATCH_SIZE = 5000
+
+# Order items rolled up by an order creation with API_SALES_ROLLUP_ON_CREATE; a longer backlog is left to the command
+ON_CREATE_ROLLUP_BATCH_SIZE = 500
+
+# Longest period a sales report may cover, which bounds the rollup rows it reads
+MAX_REPORT_DAYS = 366
+
+
+def lock_rollup_state():
+    """
+    Returns the rollup state, locking its row until the end of the current transaction.
+    """
+    state, _ = SalesRollupState.objects.select_for_update().get_or_create(pk=ROLLUP_STATE_ID)
+    return state
+
+
+def roll_up_batch(state, batch_size=DEFAULT_ROLLUP_BATCH_SIZE, settled_before=None):
+    """
+    Adds the next batch of at most batch_size order items above the high-water mark to the daily sales and
+    advances the mark. Must run in the transaction that locked the state with lock_rollup_state().
+    With settled_before, the batch ends before the first item of an order created at or after that time.
+    Returns the number of order items rolled up; 0 once the rollup has caught up.
+    """
+    low = state.last_order_item_id
+    candidates = sorted(chain.from_iterable(
+        model.objects.filter(pk__gt=low).order_by('pk').values_list('pk', 'order__created_at')[:batch_size]
+        for model in ITEM_MODELS
+    ))[:batch_size]
+    if settled_before is not None:
+        candidates = list(takewhile(lambda candidate: candidate[1] < settled_before, candidates))
+    if not candidates:
+        return 0
+    high = candidates[-1][0]
+
+    totals = defaultdict(lambda: [0, Decimal('0.00')])
+    for model in ITEM_MODELS:
+        rows = model.objects.filter(pk__gt=low, pk__lte=high).annotate(
+            day=TruncDate('order__created_at'),
+        ).values('order__restaurant_id', 'day', 'menu_item_id').annotate(
+            sold=Sum('quantity'),
+            income=Sum(F('price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+        ).order_by()
+        for row in rows:
+            total = totals[row['order__restaurant_id'], row['day'], row['menu_item_id']]
+            total[0] += row['sold']
+            total[1] += row['income']
+
+    # Looked up day by day: IN lists over all three key columns would match every combination of their values
+    keys_by_day = defaultdict(set)
+    for restaurant_id, day, menu_item_id in totals:
+        keys_by_day[day].add(menu_item_id)
+    existing = {}
+    for day, menu_item_ids in keys_by_day.items():
+        rows = DailyMenuItemSales.objects.filter(day=day, menu_item_id__in=menu_item_ids).values_list(
+            'restaurant_id', 'day', 'menu_item_id', 'quantity', 'revenue',
+        )
+        for restaurant_id, day, menu_item_id, quantity, revenue in rows:
+            existing[restaurant_id, day, menu_item_id] = (quantity, revenue)
+
+    rows = []
+    for key, (quantity, revenue) in totals.items():
+        previous_quantity, previous_revenue = existing.get(key, (0, Decimal('0.00')))
+        rows.append(DailyMenuItemSales(
+            restaurant_id=key[0], day=key[1], menu_item_id=key[2],
+            quantity=previous_quantity + quantity, revenue=(previous_revenue + revenue).quantize(CENT),
+        ))
+    # One upsert writes the new and the changed rows; bulk_update() spent seconds building its CASE expressions
+    DailyMenuItemSales.objects.bulk_create(
+        rows, batch_size=500, update_conflicts=True,
+        unique_fields=['restaurant', 'day', 'menu_item'], update_fields=['quantity', 'revenue'],
+    )
+
+    state.last_order_item_id = high
+    state.save(update_fields=['last_order_item_id', 'updated_at'])
+    return len(candidates)
+
+
+def roll_up_sales(batch_size=DEFAULT_ROLLUP_BATCH_SIZE, settled_before=None):
+    """
+    Rolls up the next batch of order items in its own transaction (see roll_up_batch()).
+    """
+    with write_transaction():
+        return roll_up_batch(lock_rollup_state(), batch_size, settled_before)
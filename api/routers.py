@@ -0,0 +1,107 @@
+"""
+Routes the reads of safe-method requests (GET, HEAD, OPTIONS) to the read replicas named by the
+API_READ_REPLICAS setting, and everything else to the default (primary) database.
+
+The database a request reads from is chosen once per request by ReplicaRoutingMiddleware and kept in a context
+variable, so every query of the request sees the same replica. Requests that write, and reads of a user who
+wrote within the last API_REPLICA_STICKY_SECONDS, go to the primary so users see their own changes even while
+the replicas lag behind.
+"""
+import contextlib
+import contextvars
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+# Apps whose rows are always read from the primary: a token or session created by one request must be usable
+# by the next one, whichever replica it is routed to
+PRIMARY_ONLY_APPS = {'auth', 'authtoken', 'sessions'}
+
+# Alias the reads of the current request are routed to; None routes them to the primary
+read_database = contextvars.ContextVar('read_database', default=None)
+
+
+def get_read_replicas():
+    """
+    Returns the aliases of the configured read replicas.
+    """
+    return list(getattr(settings, 'API_READ_REPLICAS', []))
+
+
+def choose_read_replica():
+    """
+    Returns a randomly chosen read replica alias, or None if none is configured.
+    """
+    replicas = get_read_replicas()
+    return random.choice(replicas) if replicas else None
+
+
+@contextlib.contextmanager
+def primary_reads():
+    """
+    Routes the reads made inside the block to the primary.
+    """
+    token = read_database.set(None)
+    try:
+        yield
+    finally:
+        read_database.reset(token)
+
+
+def _pin_key(user_id):
+    return f'api:replica-pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    """
+    Routes the reads of a user to the primary for the next API_REPLICA_STICKY_SECONDS seconds.
+    """
+    cache.set(_pin_key(user_id), True, getattr(settings, 'API_REPLICA_STICKY_SECONDS', 10))
+
+
+def is_pinned_to_primary(user_id):
+    """
+    Returns whether a user wrote recently enough for their reads to be routed to the primary.
+    """
+    return cache.get(_pin_key(user_id), False)
+
+
+async def apin_to_primary(user_id):
+    """
+    Asynchronous counterpart of pin_to_primary().
+    """
+    await cache.aset(_pin_key(user_id), True, getattr(settings, 'API_REPLICA_STICKY_SECONDS', 10))
+
+
+async def ais_pinned_to_primary(user_id):
+    """
+    Asynchronous counterpart of is_pinned_to_primary().
+    """
+    return await cache.aget(_pin_key(user_id), False)
+
+
+class ReadReplicaRouter:
+    """
+    Database router sending reads to the replica chosen for the current request and all writes to the primary.
+    Outside of a routed request (management commands, tests, background threads) everything uses the primary.
+    """
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Related objects are read from the database their instance came from
+            return instance._state.db
+        return read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold copies of the primary's rows, so objects read from any of them may be related
+        pool = {DEFAULT_DB_ALIAS, *get_read_replicas()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
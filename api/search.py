@@ -0,0 +1,68 @@
+"""
+Full-text search over the names and descriptions of menu items.
+
+On SQLite the search uses the FTS5 table created by migration 0009 and ranks the matches with bm25, names weighing
+more than descriptions. Other backends, and SQLite builds without FTS5, fall back to case-insensitive LIKE lookups
+(served by trigram indexes on PostgreSQL) ranked by whether the terms occur in the name or only in the description.
+Every term must match the start of a word in the FTS5 search and any part of the text in the fallback.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+FTS_TABLE = 'api_menuitem_fts'
+
+# Terms beyond this are ignored, which bounds the cost of a query
+MAX_SEARCH_TERMS = 8
+
+# Relative weight of the name and description columns in the bm25 rank
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+# Whether the FTS5 table exists, per database file
+_fts_tables = {}
+
+
+def get_search_terms(query):
+    """
+    Splits a search query into at most MAX_SEARCH_TERMS words. Punctuation and FTS5 operators are dropped,
+    so no user input reaches the query syntax.
+    """
+    return re.findall(r'\w+', query)[:MAX_SEARCH_TERMS]
+
+
+def has_fts_table():
+    """
+    Returns whether the default database has the FTS5 menu item index. Checked once per database file.
+    """
+    if connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _fts_tables:
+        _fts_tables[name] = FTS_TABLE in connection.introspection.table_names()
+    return _fts_tables[name]
+
+
+def search_menu_items(queryset, terms):
+    """
+    Filters a MenuItem queryset to the items matching every term and orders it by relevance (best first),
+    then by ID. The relevance is selected as `rank`, lower being better.
+    """
+    if has_fts_table():
+        expression = ' '.join(f'"{term}"*' for term in terms)
+        # extra() joins the FTS5 table, which has no model, so bm25 is computed once per match by the join
+        # itself; a correlated rank subquery per row was ten times slower
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE} MATCH %s', f'{FTS_TABLE}.rowid = {queryset.model._meta.db_table}.id'],
+            params=[expression],
+            select={'rank': f'bm25({FTS_TABLE}, {NAME_WEIGHT}, {DESCRIPTION_WEIGHT})'},
+        ).order_by('rank', 'id')
+
+    condition = Q()
+    score = Value(0)
+    for term in terms:
+        condition &= Q(name__icontains=term) | Q(description__icontains=term)
+        score = score - Case(When(name__icontains=term, then=Value(2)), default=Value(1), output_field=IntegerField())
+    return queryset.filter(condition).annotate(rank=score).order_by('rank', 'id')
@@ -1,5 +1,15 @@
-from rest_framework import serializers
+from rest_framework import exceptions, serializers, status
+from drf_spectacular.utils import extend_schema_field
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Prefetch
 from .models import Restaurant, MenuItem, Order, OrderItem
+from .cache import get_or_build, restaurant_scope
+from .events import publish_order_status
+from .search import get_search_terms, search_menu_items
+from .sqlite import write_transaction
+from .rollups import MAX_REPORT_DAYS, ON_CREATE_ROLLUP_BATCH_SIZE, lock_rollup_state, roll_up_batch
+from .fast_serializers import get_flat_serializer
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 
@@ -11,6 +21,25 @@ class RestaurantSerializer(serializers.ModelSerializer):
         model = Restaurant
         fields = ['id', 'name', 'address']
 
+class NearbyRestaurantSerializer(RestaurantSerializer):
+    """
+    Serializer for a restaurant found by the nearby search, with its location and its distance from the searched point.
+    """
+    distance_km = serializers.FloatField(read_only=True)
+
+    class Meta(RestaurantSerializer.Meta):
+        fields = RestaurantSerializer.Meta.fields + ['latitude', 'longitude', 'distance_km']
+
+class NearbyRestaurantsQuerySerializer(serializers.Serializer):
+    """
+    Serializer validating the query parameters of the nearby restaurant search.
+    `radius` is in kilometres.
+    """
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lng = serializers.FloatField(min_value=-180, max_value=180)
+    radius = serializers.FloatField(required=False, default=5, min_value=0.01, max_value=50)
+    limit = serializers.IntegerField(required=False, default=20, min_value=1, max_value=100)
+
 class MenuItemSerializer(serializers.ModelSerializer):
     """
     Serializer for the MenuItem model.
@@ -19,22 +48,120 @@ class MenuItemSerializer(serializers.ModelSerializer):
         model = MenuItem
         fields = ['id', 'name', 'description', 'price']
 
+def get_menu_payload(restaurant_id, get_menu_items):
+    """
+    Returns the serialized menu of a restaurant from the versioned menu cache.
+    On a cache miss the menu is rendered from the menu items returned by `get_menu_items`.
+    """
+    def build():
+        if getattr(settings, 'API_FAST_SERIALIZATION', False):
+            return get_flat_serializer(MenuItemSerializer).serialize_queryset(get_menu_items())
+        return list(MenuItemSerializer(get_menu_items(), many=True).data)
+    return get_or_build(restaurant_scope(restaurant_id), 'menu', build)
+
+class MenuItemSearchResultSerializer(MenuItemSerializer):
+    """
+    Serializer for a menu item found by the menu search, including the restaurant serving it.
+    """
+    restaurant = RestaurantSerializer(read_only=True)
+
+    class Meta(MenuItemSerializer.Meta):
+        fields = MenuItemSerializer.Meta.fields + ['restaurant']
+
+class MenuItemSearchQuerySerializer(serializers.Serializer):
+    """
+    Serializer validating the query parameters of the menu search.
+    `q` is split into words; every word must match the name or description of a menu item.
+    """
+    q = serializers.CharField(max_length=200)
+
+    def validate_q(self, value):
+        """
+        Splits the query into search terms and ensures there is at least one.
+        """
+        terms = get_search_terms(value)
+        if not terms:
+            raise serializers.ValidationError("Enter at least one word to search for.")
+        return terms
+
+    def filter_queryset(self, queryset):
+        """
+        Restricts a menu item queryset to the matches of the query, best matches first.
+        """
+        return search_menu_items(queryset, self.validated_data['q'])
+
+class SalesReportQuerySerializer(serializers.Serializer):
+    """
+    Serializer validating the query parameters of the sales reports.
+    `start` and `end` are inclusive days at most MAX_REPORT_DAYS apart; `restaurant` restricts the report to one restaurant.
+    """
+    start = serializers.DateField()
+    end = serializers.DateField()
+    restaurant = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, data):
+        """
+        Ensures the period is not reversed and not longer than MAX_REPORT_DAYS.
+        """
+        if data['end'] < data['start']:
+            raise serializers.ValidationError({'end': "The end must not be before the start."})
+        if (data['end'] - data['start']).days >= MAX_REPORT_DAYS:
+            raise serializers.ValidationError({'end': f"A report can cover at most {MAX_REPORT_DAYS} days."})
+        return data
+
+    def filter_queryset(self, queryset):
+        """
+        Restricts a DailyMenuItemSales queryset to the period and restaurant of the query.
+        """
+        queryset = queryset.filter(day__range=(self.validated_data['start'], self.validated_data['end']))
+        if 'restaurant' in self.validated_data:
+            queryset = queryset.filter(restaurant_id=self.validated_data['restaurant'])
+        return queryset
+
+class TopMenuItemsQuerySerializer(SalesReportQuerySerializer):
+    """
+    Serializer validating the query parameters of the top menu items report.
+    `by` selects whether the items are ranked by quantity sold or by revenue.
+    """
+    by = serializers.ChoiceField(choices=['quantity', 'revenue'], required=False, default='revenue')
+    limit = serializers.IntegerField(required=False, default=10, min_value=1, max_value=100)
+
+class DailyRestaurantSalesSerializer(serializers.Serializer):
+    """
+    Serializer for the quantity sold and the revenue of a restaurant on one day.
+    """
+    restaurant = serializers.IntegerField(source='restaurant_id')
+    day = serializers.DateField()
+    quantity = serializers.IntegerField(source='total_quantity')
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2, source='total_revenue')
+
+class TopMenuItemSerializer(serializers.Serializer):
+    """
+    Serializer for the quantity sold and the revenue of a menu item over the period of a report.
+    """
+    menu_item = serializers.IntegerField(source='menu_item_id')
+    name = serializers.CharField(source='menu_item__name')
+    restaurant = serializers.IntegerField(source='restaurant_id')
+    quantity = serializers.IntegerField(source='total_quantity')
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2, source='total_revenue')
+
 class RestaurantDetailSerializer(serializers.ModelSerializer):
     """
     Serializer for displaying detailed information about a Restaurant, including its menu.
     """
-    menu = MenuItemSerializer(many=True, read_only=True)
+    menu = serializers.SerializerMethodField()
 
     class Meta:
         model = Restaurant
         fields = ['id', 'name', 'address', 'menu']
 
+    @extend_schema_field(MenuItemSerializer(many=True))
     def get_menu(self, instance):
         """
         Custom method to retrieve and serialize the menu items for a restaurant.
+        The serialized menu is served from the versioned menu cache.
         """
-        menu_items = MenuItem.objects.filter(restaurant=instance)
-        return MenuItemSerializer(menu_items, many=True).data
+        return get_menu_payload(instance.pk, lambda: instance.menu.all())
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -64,7 +191,236 @@ class OrderSerializer(serializers.ModelSerializer):
     created_at = serializers.DateTimeField(read_only=True)
     class Meta:
         model = Order
-        fields = ['id', 'customer', 'restaurant', 'created_at', 'status', 'items']
+        fields = ['id', 'customer', 'restaurant', 'created_at', 'status', 'version', 'total_amount', 'item_count', 'items']
+        read_only_fields = ['version', 'total_amount', 'item_count']
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Applies the query plan used by every view that serializes orders through this serializer.
+        The customer and restaurant are joined in the main query, the items and their menu items are
+        fetched with a single prefetch query, and only the columns that are actually serialized are loaded.
+        This keeps the number of queries constant regardless of the number of orders or items.
+        Archived order querysets get the same plan over the archived items.
+        """
+        item_model = queryset.model._meta.get_field('items').related_model
+        items = item_model.objects.select_related('menu_item').only(
+            'id', 'order', 'quantity', 'special_instructions',
+            'menu_item', 'menu_item__id', 'menu_item__name', 'menu_item__description', 'menu_item__price',
+        ).order_by('id')
+        return queryset.select_related('customer', 'restaurant').only(
+            'id', 'created_at', 'status', 'version', 'total_amount', 'item_count',
+            'customer', 'customer__id', 'customer__username', 'customer__email',
+            'restaurant', 'restaurant__id', 'restaurant__name', 'restaurant__address',
+        ).prefetch_related(Prefetch('items', queryset=items))
+
+class OrderFilterSerializer(serializers.Serializer):
+    """
+    Serializer validating the query parameters used to filter order listings.
+    `status` accepts a comma-separated list of statuses; `created_after` is inclusive and `created_before` exclusive.
+    """
+    restaurant = serializers.IntegerField(required=False, min_value=1)
+    status = serializers.CharField(required=False)
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+
+    def validate_status(self, value):
+        """
+        Splits the comma-separated statuses and ensures each of them is a valid order status.
+        """
+        statuses = [status.strip() for status in value.split(',') if status.strip()]
+        valid_statuses = {choice for choice, _ in Order.STATUS_CHOICES}
+        invalid_statuses = [status for status in statuses if status not in valid_statuses]
+        if not statuses or invalid_statuses:
+            raise serializers.ValidationError(f"Invalid status. Choose from: {', '.join(sorted(valid_statuses))}.")
+        return statuses
+
+    def filter_queryset(self, queryset):
+        """
+        Applies the validated filters to an order queryset.
+        """
+        filters = self.validated_data
+        if 'restaurant' in filters:
+            queryset = queryset.filter(restaurant_id=filters['restaurant'])
+        if 'status' in filters:
+            statuses = filters['status']
+            queryset = queryset.filter(status=statuses[0]) if len(statuses) == 1 else queryset.filter(status__in=statuses)
+        if 'created_after' in filters:
+            queryset = queryset.filter(created_at__gte=filters['created_after'])
+        if 'created_before' in filters:
+            queryset = queryset.filter(created_at__lt=filters['created_before'])
+        return queryset
+
+class OrderConflict(exceptions.APIException):
+    """
+    Raised when an order status change conflicts with the order's current state (HTTP 409 Conflict).
+    The detail carries the order's current status and version so the client can refresh and retry.
+    """
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The order was changed by another request.'
+    default_code = 'conflict'
+
+    def __init__(self, detail, order_status, version):
+        super().__init__(detail)
+        # Replaces the detail APIException built, which turns every value into a string: the status and version
+        # keep their types, and are null for a missing order
+        self.detail = {'detail': self.detail, 'status': order_status, 'version': version}
+
+class OrderConflictSerializer(serializers.Serializer):
+    """
+    Serializer describing the body of an OrderConflict response.
+    """
+    detail = serializers.CharField()
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES, allow_null=True)
+    version = serializers.IntegerField(allow_null=True)
+
+class OrderStatusUpdateSerializer(serializers.Serializer):
+    """
+    Serializer for changing the status of a single order with optimistic concurrency control.
+    The change is applied with one conditional UPDATE ... WHERE id = ? AND version = ?, without row locks:
+    if another request changed the order since it was read, nothing is updated and OrderConflict is raised.
+    `version` optionally states the version the client based the change on, like an If-Match header.
+    """
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+    version = serializers.IntegerField(required=False, min_value=0)
+
+    def update(self, instance, validated_data):
+        """
+        Moves the order to the requested status if it is an allowed transition from its current status and
+        the order was not changed concurrently. Setting the current status again is a no-op.
+        Raises OrderConflict otherwise. Returns the order with its new status and version.
+        """
+        target = validated_data['status']
+        version = validated_data.get('version', instance.version)
+        if version != instance.version:
+            raise OrderConflict(OrderConflict.default_detail, instance.status, instance.version)
+        if target == instance.status:
+            return instance
+        if target not in Order.STATUS_TRANSITIONS[instance.status]:
+            raise OrderConflict(
+                f"Cannot change the status from '{instance.status}' to '{target}'.", instance.status, instance.version,
+            )
+
+        updated = Order.objects.filter(pk=instance.pk, version=instance.version).update(status=target, version=F('version') + 1)
+        if not updated:
+            current = Order.objects.filter(pk=instance.pk).values('status', 'version').first() or {'status': None, 'version': None}
+            raise OrderConflict(OrderConflict.default_detail, current['status'], current['version'])
+        instance.status, instance.version = target, instance.version + 1
+        transaction.on_commit(lambda: publish_order_status(instance.pk, target))
+        return instance
+
+class OrderStatusChangeSerializer(serializers.Serializer):
+    """
+    Serializer for one entry of a bulk order status update.
+    """
+    id = serializers.IntegerField(min_value=1)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+class OrderStatusResultSerializer(serializers.Serializer):
+    """
+    Serializer describing the outcome of one entry of a bulk order status update.
+    `result` is 'updated', 'unchanged' (the order already had the status), 'invalid_transition' or 'not_found';
+    `status` is the order's status after the update, or null if the order does not exist.
+    """
+    id = serializers.IntegerField()
+    result = serializers.ChoiceField(choices=['updated', 'unchanged', 'invalid_transition', 'not_found'])
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES, allow_null=True)
+
+class BulkOrderStatusSerializer(serializers.Serializer):
+    """
+    Serializer for updating the status of many orders at once.
+    Transitions are checked against Order.STATUS_TRANSITIONS, and the valid ones are applied with a single
+    UPDATE ... WHERE id IN (...) per previous and target status, guarded by the previous status instead of row locks.
+    Orders that cannot be updated do not prevent the others from being updated.
+    """
+    orders = OrderStatusChangeSerializer(many=True, allow_empty=False, max_length=500)
+
+    def validate_orders(self, value):
+        """
+        Ensures every order appears at most once.
+        """
+        ids = [change['id'] for change in value]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError("Each order may only appear once.")
+        return value
+
+    def create(self, validated_data):
+        """
+        Applies the status changes and returns the per-order results in request order.
+        Orders are updated with one UPDATE ... WHERE status=<previous> per previous and target status, and only the
+        orders that UPDATE changed are reported as updated and published to their event streams once the transaction
+        commits. If the row count shows that some orders changed status since they were read, the UPDATE is rolled
+        back and those orders are updated one by one, so each row count decides the result of a single order.
+        """
+        changes = validated_data['orders']
+
+        with write_transaction():
+            current = dict(Order.objects.filter(
+                id__in=[change['id'] for change in changes],
+            ).values_list('id', 'status'))
+            results = {}
+            groups = {}
+            for change in changes:
+                order_id, target = change['id'], change['status']
+                if order_id not in current:
+                    results[order_id] = ('not_found', None)
+                elif current[order_id] == target:
+                    results[order_id] = ('unchanged', target)
+                elif target not in Order.STATUS_TRANSITIONS[current[order_id]]:
+                    results[order_id] = ('invalid_transition', current[order_id])
+                else:
+                    groups.setdefault((current[order_id], target), []).append(order_id)
+
+            conflicts = []
+            for (previous, target), ids in groups.items():
+                savepoint = transaction.savepoint()
+                updated = self.update_status(Order.objects.filter(id__in=ids, status=previous), target)
+                if updated == len(ids):
+                    transaction.savepoint_commit(savepoint)
+                    applied = ids
+                else:
+                    transaction.savepoint_rollback(savepoint)
+                    applied = [
+                        order_id for order_id in ids
+                        if self.update_status(Order.objects.filter(id=order_id, status=previous), target)
+                    ]
+                    conflicts.extend(order_id for order_id in ids if order_id not in applied)
+                for order_id in applied:
+                    results[order_id] = ('updated', target)
+
+            if conflicts:
+                # Report the status the orders were changed to since they were read
+                requested = {change['id']: change['status'] for change in changes}
+                changed = dict(Order.objects.filter(id__in=conflicts).values_list('id', 'status'))
+                for order_id in conflicts:
+                    if order_id not in changed:
+                        results[order_id] = ('not_found', None)
+                    elif changed[order_id] == requested[order_id]:
+                        results[order_id] = ('unchanged', changed[order_id])
+                    else:
+                        results[order_id] = ('invalid_transition', changed[order_id])
+
+            updated_orders = [(order_id, order_status) for order_id, (result, order_status) in results.items() if result == 'updated']
+
+            def publish():
+                for order_id, order_status in updated_orders:
+                    publish_order_status(order_id, order_status)
+            transaction.on_commit(publish)
+
+        return [
+            {'id': change['id'], 'result': results[change['id']][0], 'status': results[change['id']][1]}
+            for change in changes
+        ]
+
+    @staticmethod
+    def update_status(queryset, target):
+        """
+        Sets the status of the orders of the queryset and returns the number of updated rows.
+        """
+        return queryset.update(status=target, version=F('version') + 1)
+
+    def to_representation(self, instance):
+        return {'results': OrderStatusResultSerializer(instance, many=True).data}
 
 class OrderItemCreateSerializer(serializers.Serializer):
     """
@@ -83,41 +439,82 @@ class CreateOrderSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Order
-        fields = ['id', 'restaurantId', 'items', 'customer']
-        read_only_fields = ['id', 'customer']
+        fields = ['id', 'restaurantId', 'items', 'customer', 'total_amount', 'item_count']
+        read_only_fields = ['id', 'customer', 'total_amount', 'item_count']
 
-    def create(self, validated_data):
+    def validate(self, data):
         """
-        Overrides the create method to handle the creation of the Order and its associated OrderItems.
+        Resolves the restaurant and all referenced menu items before anything is written.
+        The menu items are fetched with a single IN query; an unknown restaurant or a menu item that does
+        not belong to the restaurant rejects the whole order.
         """
-        restaurant_id = validated_data.pop('restaurantId')
-        items_data = validated_data.pop('items')
-        customer = validated_data.pop('customer')
-
         try:
-            restaurant = Restaurant.objects.get(pk=restaurant_id)
+            restaurant = Restaurant.objects.get(pk=data['restaurantId'])
         except Restaurant.DoesNotExist:
             raise serializers.ValidationError({'restaurantId': 'Invalid restaurant ID.'})
 
-        order = Order.objects.create(customer=customer, restaurant=restaurant)
-
-        order_items = []
-        for item_data in items_data:
-            try:
-                menu_item = MenuItem.objects.get(pk=item_data['menuItemId'], restaurant=restaurant)
-            except MenuItem.DoesNotExist:
+        menu_items = MenuItem.objects.filter(restaurant=restaurant).in_bulk(
+            {item_data['menuItemId'] for item_data in data['items']}
+        )
+        for item_data in data['items']:
+            if item_data['menuItemId'] not in menu_items:
                 raise serializers.ValidationError({'items': f"Invalid menu item ID: {item_data['menuItemId']} for the given restaurant."})
-            order_item = OrderItem.objects.create(order=order, menu_item=menu_item, quantity=item_data['quantity'], special_instructions=item_data.get('special_instructions', ''))
-            order_items.append(order_item)
 
+        data['restaurant'] = restaurant
+        data['menu_items'] = menu_items
+        return data
+
+    def create(self, validated_data):
+        """
+        Overrides the create method to handle the creation of the Order and its associated OrderItems.
+        The order and all of its items are written in one transaction, the items with a single bulk insert.
+        Each item snapshots the current menu price, and the order total and item count are computed
+        from these snapshots before the order is inserted.
+        With API_SALES_ROLLUP_ON_CREATE the items are also added to the daily sales rollup in the same transaction.
+        """
+        restaurant = validated_data['restaurant']
+        menu_items = validated_data['menu_items']
+        customer = validated_data['customer']
+
+        order_items = [
+            OrderItem(
+                menu_item=menu_items[item_data['menuItemId']],
+                quantity=item_data['quantity'],
+                price=menu_items[item_data['menuItemId']].price,
+                special_instructions=item_data.get('special_instructions', ''),
+            )
+            for item_data in validated_data['items']
+        ]
+
+        with write_transaction():
+            # Locked before the items get their IDs, so no item can get an ID below the high-water mark later
+            rollup_state = lock_rollup_state() if getattr(settings, 'API_SALES_ROLLUP_ON_CREATE', False) else None
+            order = Order.objects.create(
+                customer=customer,
+                restaurant=restaurant,
+                total_amount=sum(order_item.price * order_item.quantity for order_item in order_items),
+                item_count=sum(order_item.quantity for order_item in order_items),
+            )
+            for order_item in order_items:
+                order_item.order = order
+            OrderItem.objects.bulk_create(order_items)
+            if rollup_state is not None:
+                roll_up_batch(rollup_state, ON_CREATE_ROLLUP_BATCH_SIZE)
+
+        # Keep the freshly created items so the response can be built without querying them again
+        order.created_items = order_items
         return order
 
     def to_representation(self, instance):
         """
         Overrides the to_representation method to customize the output format of the Order.
+        Uses the in-memory items, customer and restaurant of a freshly created order when available.
         """
         representation = super().to_representation(instance)
-        representation['items'] = OrderItemSerializer(instance.items.all(), many=True).data
+        items = getattr(instance, 'created_items', None)
+        if items is None:
+            items = instance.items.all()
+        representation['items'] = OrderItemSerializer(items, many=True).data
         representation['customer'] = {'id': instance.customer.id, 'username': instance.customer.username}
         representation['restaurant'] = {'id': instance.restaurant.id, 'name': instance.restaurant.name}
         return representation
@@ -138,26 +535,36 @@ class RegistrationSerializer(serializers.Serializer):
 
     def validate(self, data):
         """
-        Custom validation to ensure passwords match and the username/email are unique.
+        Custom validation to ensure passwords match.
+        The uniqueness of the username and email is enforced by the database when the user is created.
         """
         if data['password'] != data['password2']:
             raise serializers.ValidationError({"password": "Passwords do not match."})
-        if User.objects.filter(username=data['username']).exists():
-            raise serializers.ValidationError({"username": "This username is already taken."})
-        if User.objects.filter(email=data['email']).exists():
-            raise serializers.ValidationError({"email": "This email address is already registered."})
         return data
 
     def create(self, validated_data):
         """
-        Overrides the create method to create a new User.
+        Overrides the create method to create a new User with a single INSERT.
+        The password is hashed before the insert, and the authentication token is created by the post_save
+        signal within the same transaction. A duplicate username or email violates a unique constraint;
+        the taken value is then looked up and reported with the same messages as a validation error.
         """
-        user = User.objects.create(
+        user = User(
             username=validated_data['username'],
             email=validated_data['email'],
         )
         user.set_password(validated_data['password'])
-        user.save()
+        try:
+            with transaction.atomic():
+                user.save()
+        except IntegrityError:
+            # The error message names neither the violated index nor the column on every backend,
+            # so look up which value is taken (this only runs for failed registrations)
+            if User.objects.filter(email=user.email).exists():
+                raise serializers.ValidationError({"email": "This email address is already registered."})
+            if User.objects.filter(username=user.username).exists():
+                raise serializers.ValidationError({"username": "This username is already taken."})
+            raise
         return user
 
 class LoginSerializer(serializers.Serializer):
@@ -0,0 +1,42 @@
+"""
+High-concurrency profile of the SQLite backend for small single-server deployments.
+
+The pragmas of the SQLITE_PRAGMAS setting are run on every new SQLite connection by the init_command of the database
+OPTIONS: in WAL mode readers no longer block the writer (and the other way round), and the busy timeout makes a writer
+wait for the lock instead of failing. Order writes run in transactions that take the write lock when they begin (see
+write_transaction()), and persistent connections (CONN_MAX_AGE) avoid paying for the connection setup and the
+pragmas on every request.
+"""
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+
+
+@contextmanager
+def write_transaction(using=None):
+    """
+    Like transaction.atomic(), but on SQLite the transaction starts with BEGIN IMMEDIATE when the
+    SQLITE_IMMEDIATE_WRITES setting is enabled. A deferred transaction only asks for the write lock at its first
+    write; if it has read before and another connection committed in between, SQLite reports "database is locked"
+    at once instead of waiting for the busy timeout. Taking the lock up front makes concurrent writers queue instead.
+    Blocks nested in another transaction are plain savepoints.
+    The mode is switched for this block only rather than with the 'transaction_mode' database option, which would
+    apply to every transaction: read-only ones would then queue for the write lock as well.
+    """
+    connection = transaction.get_connection(using)
+    if connection.vendor != 'sqlite' or connection.in_atomic_block or not getattr(settings, 'SQLITE_IMMEDIATE_WRITES', False):
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    # The transaction mode is read from the settings when connecting, so connect before changing it
+    connection.ensure_connection()
+    transaction_mode = connection.transaction_mode
+    connection.transaction_mode = 'IMMEDIATE'
+    try:
+        with transaction.atomic(using=using):
+            connection.transaction_mode = transaction_mode
+            yield
+    finally:
+        connection.transaction_mode = transaction_mode
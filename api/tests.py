@@ -1,11 +1,50 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client
+from django.db import connection, connections
+from django.db.models import Count, Max
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
-from .models import Restaurant, MenuItem
+from .models import ArchivedOrder, ArchivedOrderItem, DailyMenuItemSales, Restaurant, MenuItem, SalesRollupState
 from .serializers import RestaurantSerializer, RestaurantDetailSerializer, OrderItem, Order
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
+from rest_framework.views import exception_handler
 from django.contrib.auth.models import User
 from rest_framework.authtoken.models import Token
+from django.test import RequestFactory, override_settings
+from django.core.management import call_command
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+import asyncio
+import base64
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+from unittest import mock
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import AsyncClient
+from .metrics import registry, render_prometheus
+from .middleware import ReplicaRoutingMiddleware
+from .routers import ReadReplicaRouter, read_database
+from .cache import VERSION_TIMEOUT, get_or_build, restaurant_scope
+from .sqlite import write_transaction
+from .archive import archive_batch
+from .rollups import roll_up_sales
+from .geo import distance_km, encode_geocell, geocell_ranges
+from django.db import transaction
+from .events import InProcessOrderEventBroker, get_order_event_broker, publish_order_status
+from .fast_serializers import FlatSerializer, get_flat_serializer
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from .serializers import BulkOrderStatusSerializer, MenuItemSerializer, OrderConflict, OrderSerializer, OrderStatusUpdateSerializer
+from .authentication import CachedTokenAuthentication, LRUCache, _shared_key, local_token_cache
 
 class ViewTests(TestCase):
     """
@@ -27,9 +66,9 @@ class ViewTests(TestCase):
         """
         response = self.client.get(reverse('restaurant-list'))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        restaurants = Restaurant.objects.all()
+        restaurants = Restaurant.objects.order_by('id')
         serializer = RestaurantSerializer(restaurants, many=True)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
 
     def test_restaurant_detail_view(self):
         """
@@ -94,6 +133,70 @@ class AuthEndToEndTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('token', response.data)
 
+    def test_registration_query_budget(self):
+        """
+        Tests that registration inserts the user and its token exactly once each, without any lookup queries,
+        and that the returned token is the one stored for the new user.
+        The remaining two queries are the savepoint pair of the transaction.
+        """
+        with self.assertNumQueries(4):
+            response = self.client.post(reverse('register'), self.registration_data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        user = User.objects.get(username='testuser')
+        self.assertTrue(user.check_password('testpassword'))
+        self.assertEqual(Token.objects.get(user=user).key, response.data['token'])
+
+    def test_registration_with_taken_username(self):
+        """
+        Tests that registering an existing username returns a 400 Bad Request with a username error
+        and does not create another user.
+        """
+        User.objects.create_user(username='testuser', password='otherpassword', email='other@example.com')
+        response = self.client.post(reverse('register'), self.registration_data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['username'], "This username is already taken.")
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_registration_with_taken_email(self):
+        """
+        Tests that registering an existing email address returns a 400 Bad Request with an email error.
+        """
+        User.objects.create_user(username='otheruser', password='otherpassword', email='test@example.com')
+        response = self.client.post(reverse('register'), self.registration_data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['email'], "This email address is already registered.")
+
+    def test_registration_with_taken_username_mentioning_email(self):
+        """
+        Tests that a taken username is reported as such even when the username contains the word "email".
+        """
+        User.objects.create_user(username='email', password='otherpassword', email='other@example.com')
+        data = dict(self.registration_data, username='email')
+        response = self.client.post(reverse('register'), data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['username'], "This username is already taken.")
+        self.assertNotIn('email', response.data)
+
+    def test_login_query_budget(self):
+        """
+        Tests that a successful login costs one query for the user and one for the existing token.
+        """
+        user = User.objects.create_user(username='testuser', password='testpassword', email='test@example.com')
+        with self.assertNumQueries(2):
+            response = self.client.post(reverse('login'), self.login_data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['token'], Token.objects.get(user=user).key)
+
+    def test_login_creates_missing_token(self):
+        """
+        Tests that logging in creates a token for a user that does not have one yet.
+        """
+        user = User.objects.create_user(username='testuser', password='testpassword', email='test@example.com')
+        Token.objects.filter(user=user).delete()
+        response = self.client.post(reverse('login'), self.login_data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['token'], Token.objects.get(user=user).key)
+
     def test_login_with_invalid_credentials(self):
         """
         Tests the login endpoint with incorrect credentials.
@@ -147,9 +250,9 @@ class RestaurantEndToEndTests(TestCase):
         """
         response = self.client.get(reverse('restaurant-list'))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
-        self.assertEqual(response.data[0]['name'], "Teszt Étterem 1")
-        self.assertEqual(response.data[1]['name'], "Teszt Étterem 2")
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['results'][0]['name'], "Teszt Étterem 1")
+        self.assertEqual(response.data['results'][1]['name'], "Teszt Étterem 2")
 
     def test_get_restaurant_detail(self):
         """
@@ -258,6 +361,54 @@ class OrderEndToEndTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('items', response.data)
 
+    def test_create_order_with_invalid_item_writes_nothing(self):
+        """
+        Tests that an order whose last item is invalid is rejected as a whole.
+        It checks that neither the order nor any of its items are written to the database.
+        """
+        invalid_data = self.order_data.copy()
+        invalid_data['items'] = self.order_data['items'] + [{'menuItemId': 999, 'quantity': 1}]
+        response = self.client.post(reverse('create-order'), invalid_data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_create_order_snapshots_menu_prices(self):
+        """
+        Tests that every created order item stores the menu price at the time of ordering.
+        """
+        response = self.client.post(reverse('create-order'), self.order_data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        prices = dict(OrderItem.objects.filter(order_id=response.data['id']).values_list('menu_item_id', 'price'))
+        self.assertEqual(prices, {self.item1.id: self.item1.price, self.item2.id: self.item2.price})
+
+    def test_create_order_records_totals(self):
+        """
+        Tests that a created order stores and returns its total amount and item count.
+        """
+        response = self.client.post(reverse('create-order'), self.order_data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['total_amount'], '50.00')
+        self.assertEqual(response.data['item_count'], 3)
+        order = Order.objects.get(pk=response.data['id'])
+        self.assertEqual((order.total_amount, order.item_count), (Decimal('50.00'), 3))
+
+    def test_create_order_query_budget(self):
+        """
+        Tests that the number of queries needed to create an order does not depend on the number of items.
+        Authentication, the restaurant lookup, the menu item lookup, the order insert and the bulk item insert
+        are issued once each, plus the savepoint pair of the transaction.
+        """
+        large_order = {
+            'restaurantId': self.restaurant.id,
+            'items': [{'menuItemId': self.item1.id if index % 2 else self.item2.id, 'quantity': 1} for index in range(20)],
+        }
+        with self.assertNumQueries(7):
+            response = self.client.post(reverse('create-order'), large_order, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['items']), 20)
+        self.assertTrue(all(item['id'] for item in response.data['items']))
+
 class CustomerOrderEndToEndTests(TestCase):
     """
     End-to-end tests for retrieving customer-specific order details.
@@ -318,4 +469,1950 @@ class CustomerOrderEndToEndTests(TestCase):
         """
         client = APIClient()
         response = client.get(reverse('customer-order-detail', args=[self.order1_customer1.id]))
-        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+class OrderQueryBudgetTests(TestCase):
+    """
+    Query-count budget tests for the endpoints that serialize orders through OrderSerializer.
+    The number of queries must not grow with the number of orders or order items.
+    """
+    def setUp(self):
+        """
+        Sets up the test environment with an authenticated API client, two restaurants with menu items,
+        and several orders with multiple items each.
+        """
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='kitchen', password='kitchenpassword', email='kitchen@example.com')
+        self.token, _ = Token.objects.get_or_create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.restaurants = [
+            Restaurant.objects.create(name="Budget Étterem 1", address="Budget Cím 1"),
+            Restaurant.objects.create(name="Budget Étterem 2", address="Budget Cím 2"),
+        ]
+        self.orders = []
+        for restaurant in self.restaurants:
+            menu_items = [
+                MenuItem.objects.create(restaurant=restaurant, name=f"Étel {index}", price=10 + index)
+                for index in range(3)
+            ]
+            for _ in range(4):
+                order = Order.objects.create(customer=self.user, restaurant=restaurant)
+                for menu_item in menu_items:
+                    OrderItem.objects.create(order=order, menu_item=menu_item, quantity=2, price=menu_item.price)
+                self.orders.append(order)
+
+    def test_order_list_query_budget(self):
+        """
+        Tests that listing all orders costs one query for authentication, one for the orders
+        (joined with customer and restaurant) and one for all order items with their menu items.
+        """
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('restaurant-order-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual(len(results), len(self.orders))
+        self.assertEqual(len(results[0]['items']), 3)
+        self.assertEqual(results[0]['items'][0]['menu_item']['name'], "Étel 0")
+        self.assertEqual(results[0]['customer']['email'], 'kitchen@example.com')
+        self.assertEqual(results[0]['restaurant']['address'], "Budget Cím 1")
+
+    def test_order_detail_query_budget(self):
+        """
+        Tests that retrieving a single order through the restaurant detail endpoint stays within three queries.
+        """
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('restaurant-order-detail', args=[self.orders[0].id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['items']), 3)
+
+    def test_customer_order_detail_query_budget(self):
+        """
+        Tests that retrieving a customer's own order stays within three queries.
+        """
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('customer-order-detail', args=[self.orders[-1].id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['restaurant']['name'], "Budget Étterem 2")
+
+    def test_update_order_status_query_budget(self):
+        """
+        Tests that updating an order status costs authentication, loading the order and its items,
+        and a single UPDATE statement, and that the response contains the full updated order.
+        """
+        with self.assertNumQueries(4):
+            response = self.client.patch(reverse('update-order-status', args=[self.orders[0].id]), {'status': 'preparing'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'preparing')
+        self.assertEqual(len(response.data['items']), 3)
+        self.orders[0].refresh_from_db()
+        self.assertEqual(self.orders[0].status, 'preparing')
+
+class CursorPaginationTests(TestCase):
+    """
+    Tests for the keyset (cursor) pagination of the restaurant and order list endpoints.
+    """
+    def setUp(self):
+        """
+        Sets up the test environment with an authenticated API client, several restaurants and several orders.
+        """
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='pager', password='pagerpassword')
+        self.token, _ = Token.objects.get_or_create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.restaurants = [Restaurant.objects.create(name=f"Lapozó {index}", address="Cím") for index in range(5)]
+        self.orders = [Order.objects.create(customer=self.user, restaurant=self.restaurants[0]) for _ in range(5)]
+
+    def collect_pages(self, url):
+        """
+        Follows the 'next' links starting at the given URL and returns the collected results
+        together with all SQL statements executed while fetching the pages.
+        """
+        results = []
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertNotIn('count', response.data)
+                results.extend(response.data['results'])
+                url = response.data['next']
+        return results, [query['sql'] for query in queries.captured_queries]
+
+    def test_restaurant_list_pages_in_id_order(self):
+        """
+        Tests that paging through the restaurant list returns every restaurant exactly once, in ID order,
+        without issuing any COUNT query.
+        """
+        results, queries = self.collect_pages(reverse('restaurant-list') + '?page_size=2')
+        self.assertEqual([item['id'] for item in results], [restaurant.id for restaurant in self.restaurants])
+        self.assertFalse(any('COUNT(' in sql.upper() for sql in queries))
+
+    def test_order_list_pages_in_creation_order(self):
+        """
+        Tests that paging through the order list returns every order exactly once, ordered by (created_at, id),
+        without issuing any COUNT query.
+        """
+        results, queries = self.collect_pages(reverse('restaurant-order-list') + '?page_size=2')
+        self.assertEqual([item['id'] for item in results], [order.id for order in self.orders])
+        self.assertFalse(any('COUNT(' in sql.upper() for sql in queries))
+
+    def test_order_cursor_keeps_ties_on_creation_time(self):
+        """
+        Tests that orders sharing their creation time are paged on their IDs, forwards and backwards,
+        without skipping rows with an OFFSET.
+        """
+        Order.objects.update(created_at=timezone.now())
+        results, queries = self.collect_pages(reverse('restaurant-order-list') + '?page_size=2')
+        self.assertEqual([item['id'] for item in results], [order.id for order in self.orders])
+        self.assertFalse(any('OFFSET' in sql.upper() for sql in queries))
+
+        last_page = self.client.get(reverse('restaurant-order-list') + '?page_size=2').data
+        while last_page['next']:
+            last_page = self.client.get(last_page['next']).data
+        previous_page = self.client.get(last_page['previous']).data
+        self.assertEqual([item['id'] for item in previous_page['results']], [order.id for order in self.orders[2:4]])
+
+class MenuCacheTests(TestCase):
+    """
+    Tests for the versioned cache of restaurant details and menus.
+    """
+    def setUp(self):
+        """
+        Sets up the test environment with an API client, a restaurant and two menu items.
+        """
+        self.client = APIClient()
+        self.restaurant = Restaurant.objects.create(name="Gyorsítótár Étterem", address="Gyorsítótár Cím")
+        self.item1 = MenuItem.objects.create(restaurant=self.restaurant, name="Gulyás", price=9)
+        self.item2 = MenuItem.objects.create(restaurant=self.restaurant, name="Lángos", price=4)
+
+    def test_menu_is_served_from_cache(self):
+        """
+        Tests that a repeated menu request is answered without any database query.
+        """
+        first = self.client.get(reverse('restaurant-menu', args=[self.restaurant.id]))
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('restaurant-menu', args=[self.restaurant.id]))
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data, second.data)
+
+    def test_restaurant_detail_is_served_from_cache(self):
+        """
+        Tests that a repeated restaurant detail request is answered without any database query.
+        """
+        first = self.client.get(reverse('restaurant-detail', args=[self.restaurant.id]))
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('restaurant-detail', args=[self.restaurant.id]))
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(len(second.data['menu']), 2)
+
+    def test_menu_item_changes_invalidate_cache(self):
+        """
+        Tests that saving, creating and deleting menu items invalidates both the cached menu and the cached details.
+        """
+        self.client.get(reverse('restaurant-menu', args=[self.restaurant.id]))
+        self.client.get(reverse('restaurant-detail', args=[self.restaurant.id]))
+
+        self.item1.price = 11
+        self.item1.save()
+        MenuItem.objects.create(restaurant=self.restaurant, name="Palacsinta", price=3)
+        self.item2.delete()
+
+        menu = self.client.get(reverse('restaurant-menu', args=[self.restaurant.id])).data
+        detail = self.client.get(reverse('restaurant-detail', args=[self.restaurant.id])).data
+        self.assertEqual([item['name'] for item in menu], ["Gulyás", "Palacsinta"])
+        self.assertEqual(menu[0]['price'], '11.00')
+        self.assertEqual(detail['menu'], menu)
+
+    def test_menu_item_moved_to_other_restaurant_invalidates_both(self):
+        """
+        Tests that moving a menu item to another restaurant invalidates the menus of both restaurants.
+        """
+        other = Restaurant.objects.create(name="Másik Étterem", address="Másik Cím")
+        self.client.get(reverse('restaurant-menu', args=[self.restaurant.id]))
+        self.client.get(reverse('restaurant-menu', args=[other.id]))
+
+        self.item2.restaurant = other
+        self.item2.save()
+
+        self.assertEqual(len(self.client.get(reverse('restaurant-menu', args=[self.restaurant.id])).data), 1)
+        self.assertEqual(len(self.client.get(reverse('restaurant-menu', args=[other.id])).data), 1)
+
+    def test_restaurant_changes_invalidate_cache(self):
+        """
+        Tests that renaming and deleting a restaurant invalidates its cached details and menu.
+        """
+        self.client.get(reverse('restaurant-detail', args=[self.restaurant.id]))
+        self.restaurant.name = "Új Név"
+        self.restaurant.save()
+        response = self.client.get(reverse('restaurant-detail', args=[self.restaurant.id]))
+        self.assertEqual(response.data['name'], "Új Név")
+
+        restaurant_id = self.restaurant.id
+        self.client.get(reverse('restaurant-menu', args=[restaurant_id]))
+        self.restaurant.delete()
+        self.assertEqual(self.client.get(reverse('restaurant-detail', args=[restaurant_id])).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(reverse('restaurant-menu', args=[restaurant_id])).status_code, status.HTTP_404_NOT_FOUND)
+
+class ConditionalGetTests(TestCase):
+    """
+    Tests for ETag / If-None-Match and Last-Modified / If-Modified-Since support on the restaurant endpoints.
+    """
+    def setUp(self):
+        """
+        Sets up the test environment with an empty cache, an API client, two restaurants and a menu item.
+        """
+        # Restaurant IDs are reused between tests, unlike the versions other tests left in the cache
+        cache.clear()
+        self.client = APIClient()
+        self.restaurant = Restaurant.objects.create(name="Feltételes Étterem", address="Feltételes Cím")
+        self.other = Restaurant.objects.create(name="Másik Étterem", address="Másik Cím")
+        self.item = MenuItem.objects.create(restaurant=self.restaurant, name="Pörkölt", price=12)
+
+    def assertRevalidates(self, url):
+        """
+        Fetches the URL, then revalidates it with the returned ETag and checks that the answer is a bodiless 304
+        produced without any database query. Returns the ETag.
+        """
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response.headers['ETag']
+        self.assertIn('Last-Modified', response.headers)
+        with self.assertNumQueries(0):
+            revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(revalidated.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(revalidated.content, b'')
+        self.assertEqual(revalidated.headers['ETag'], etag)
+        return etag
+
+    def test_menu_revalidation(self):
+        """
+        Tests that an unchanged menu is answered with 304 and that changing a menu item changes the ETag.
+        """
+        url = reverse('restaurant-menu', args=[self.restaurant.id])
+        etag = self.assertRevalidates(url)
+        self.item.price = 13
+        self.item.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(response.data[0]['price'], '13.00')
+
+    def test_restaurant_detail_revalidation(self):
+        """
+        Tests that unchanged restaurant details are answered with 304 and that the menu and detail ETags differ.
+        """
+        detail_etag = self.assertRevalidates(reverse('restaurant-detail', args=[self.restaurant.id]))
+        menu_etag = self.assertRevalidates(reverse('restaurant-menu', args=[self.restaurant.id]))
+        self.assertNotEqual(detail_etag, menu_etag)
+
+    def test_restaurant_list_revalidation(self):
+        """
+        Tests that the restaurant list is answered with 304 until a restaurant changes,
+        and that different pages have different ETags.
+        """
+        url = reverse('restaurant-list')
+        etag = self.assertRevalidates(url)
+        self.assertNotEqual(self.assertRevalidates(url + '?page_size=1'), etag)
+        self.other.name = "Átnevezett Étterem"
+        self.other.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][1]['name'], "Átnevezett Étterem")
+
+    def test_if_modified_since(self):
+        """
+        Tests that a request with an If-Modified-Since header equal to the returned Last-Modified gets a 304.
+        """
+        url = reverse('restaurant-menu', args=[self.restaurant.id])
+        last_modified = self.client.get(url).headers['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_missing_restaurant_is_not_found(self):
+        """
+        Tests that conditional GET support does not hide a 404 for a missing restaurant.
+        """
+        for name in ('restaurant-menu', 'restaurant-detail'):
+            response = self.client.get(reverse(name, args=[999]))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+            self.assertNotIn('ETag', response.headers)
+        # Requests for missing restaurants leave no versions behind in the cache
+        self.assertIsNone(cache.get(f'api:version:{restaurant_scope(999)}'))
+
+    def test_change_in_the_same_second_is_not_modified_since(self):
+        """
+        Tests that a change made within the second of the previous response still answers an
+        If-Modified-Since-only request with 200, because every change gets a later Last-Modified.
+        """
+        url = reverse('restaurant-menu', args=[self.restaurant.id])
+        with mock.patch('api.cache.time.time', return_value=1_800_000_000.2):
+            self.item.save()
+            last_modified = self.client.get(url).headers['Last-Modified']
+            self.item.price = 14
+            self.item.save()
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['price'], '14.00')
+
+    def test_changes_without_signals_show_up_once_the_versions_expire(self):
+        """
+        Tests that changes which do not bump the cache versions, like those of another process or of raw queries,
+        are served once the versions expire: with new validators for a changed restaurant and 404 for a deleted one.
+        """
+        url = reverse('restaurant-detail', args=[self.restaurant.id])
+        etag = self.client.get(url).headers['ETag']
+        Restaurant.objects.filter(pk=self.restaurant.id).update(name="Átnevezett Étterem")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        later = time.time() + VERSION_TIMEOUT + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['name'], "Átnevezett Étterem")
+            etag = response.headers['ETag']
+            with connection.cursor() as cursor:
+                cursor.execute('DELETE FROM api_menuitem WHERE restaurant_id = %s', [self.restaurant.id])
+                cursor.execute('DELETE FROM api_restaurant WHERE id = %s', [self.restaurant.id])
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later + VERSION_TIMEOUT + 1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class CachedTokenAuthenticationTests(TestCase):
+    """
+    Tests for the caching token authentication backend.
+    """
+    def setUp(self):
+        """
+        Sets up the test environment with a user, their token and an API client authenticated with it.
+        """
+        local_token_cache.clear()
+        self.user = User.objects.create_user(username='cached', password='cachedpassword')
+        self.token, _ = Token.objects.get_or_create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def test_repeated_requests_do_not_query_tokens(self):
+        """
+        Tests that only the first request with a token queries the database.
+        """
+        with self.assertNumQueries(1):
+            self.client.get(reverse('who-am-i'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('who-am-i'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['username'], 'cached')
+
+    @override_settings(TOKEN_AUTH_CACHE={'CACHE_ALIAS': 'default'})
+    def test_shared_cache_tier(self):
+        """
+        Tests that a token cached in the shared tier is resolved without the database
+        after the in-process tier was lost (e.g. in another worker).
+        """
+        self.client.get(reverse('who-am-i'))
+        local_token_cache.clear()
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('who-am-i'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(TOKEN_AUTH_CACHE={'CACHE_ALIAS': 'default'})
+    def test_shared_cache_tier_leaves_out_the_password(self):
+        """
+        Tests that the shared tier does not hold the password hash and that a user resolved from it
+        can still be saved without losing their password.
+        """
+        self.client.get(reverse('who-am-i'))
+        entry = cache.get(_shared_key(self.token.key))
+        self.assertNotIn('password', entry['user'])
+        self.assertNotIn(self.user.password, repr(entry))
+
+        local_token_cache.clear()
+        user, token = CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertEqual((user.pk, token.key), (self.user.pk, self.token.key))
+        user.first_name = 'Cached'
+        user.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Cached')
+        self.assertTrue(self.user.check_password('cachedpassword'))
+
+    @override_settings(TOKEN_AUTH_CACHE={'CACHE_ALIAS': 'default'})
+    def test_deleted_token_is_rejected(self):
+        """
+        Tests that deleting a token invalidates it in both cache tiers.
+        """
+        self.client.get(reverse('who-am-i'))
+        self.token.delete()
+        response = self.client.get(reverse('who-am-i'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_is_rejected(self):
+        """
+        Tests that deactivating a user invalidates their cached tokens.
+        """
+        self.client.get(reverse('who-am-i'))
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(reverse('who-am-i'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_user_is_rejected(self):
+        """
+        Tests that deleting a user invalidates their cached tokens.
+        """
+        self.client.get(reverse('who-am-i'))
+        self.user.delete()
+        response = self.client.get(reverse('who-am-i'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_lru_is_bounded_and_expires(self):
+        """
+        Tests that the LRU evicts the least recently used entries beyond its size and drops expired entries.
+        """
+        cache = LRUCache()
+        cache.set('a', 1, ttl=60, max_size=2)
+        cache.set('b', 2, ttl=60, max_size=2)
+        cache.get('a')
+        cache.set('c', 3, ttl=60, max_size=2)
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+        cache.set('d', 4, ttl=-1, max_size=2)
+        self.assertIsNone(cache.get('d'))
+
+class OrderTotalsTests(TestCase):
+    """
+    Tests for the denormalized order totals and the backfill_order_totals management command.
+    """
+    def setUp(self):
+        """
+        Sets up the test environment with a restaurant, menu items and an order without recorded totals.
+        """
+        self.user = User.objects.create_user(username='totals', password='totalspassword')
+        self.restaurant = Restaurant.objects.create(name="Összesítő Étterem", address="Összesítő Cím")
+        self.item1 = MenuItem.objects.create(restaurant=self.restaurant, name="Leves", price=Decimal('4.50'))
+        self.item2 = MenuItem.objects.create(restaurant=self.restaurant, name="Főétel", price=Decimal('12.00'))
+        self.order = Order.objects.create(customer=self.user, restaurant=self.restaurant)
+        OrderItem.objects.create(order=self.order, menu_item=self.item1, quantity=2, price=Decimal('4.00'))
+        OrderItem.objects.create(order=self.order, menu_item=self.item2, quantity=1)
+        self.empty_order = Order.objects.create(customer=self.user, restaurant=self.restaurant, total_amount=5, item_count=1)
+
+    def test_backfill_uses_item_prices(self):
+        """
+        Tests that the backfill computes totals from the stored item prices and resets orders without items.
+        """
+        call_command('backfill_order_totals', batch_size=1, stdout=StringIO())
+        self.order.refresh_from_db()
+        self.empty_order.refresh_from_db()
+        self.assertEqual((self.order.total_amount, self.order.item_count), (Decimal('8.00'), 3))
+        self.assertEqual((self.empty_order.total_amount, self.empty_order.item_count), (Decimal('0.00'), 0))
+
+    def test_backfill_can_snapshot_missing_prices(self):
+        """
+        Tests that items without a recorded price take the current menu price when requested.
+        """
+        call_command('backfill_order_totals', snapshot_missing_prices=True, stdout=StringIO())
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal('20.00'))
+
+    def test_order_serializer_exposes_totals(self):
+        """
+        Tests that the order endpoints return the stored totals.
+        """
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(reverse('restaurant-order-detail', args=[self.empty_order.id]))
+        self.assertEqual(response.data['total_amount'], '5.00')
+        self.assertEqual(response.data['item_count'], 1)
+
+class PopulateDbTests(TestCase):
+    """
+    Tests for the synthetic data generator of the populate_db management command.
+    """
+    def generate(self, **options):
+        """
+        Runs populate_db with a small synthetic dataset and the given options.
+        """
+        options = {'restaurants': 6, 'items_per_restaurant': 5, 'users': 20, 'orders': 300, 'seed': 42, 'batch_size': 70, **options}
+        call_command('populate_db', stdout=StringIO(), **options)
+
+    def test_generated_data_is_consistent_and_skewed(self):
+        """
+        Tests that the requested number of rows is created, that the order totals match the items,
+        that the hottest restaurant gets more orders than the coldest, and that new orders get new IDs afterwards.
+        """
+        self.generate()
+        self.assertEqual((Restaurant.objects.count(), MenuItem.objects.count(), User.objects.count(), Order.objects.count()), (6, 30, 20, 300))
+        for order in Order.objects.prefetch_related('items'):
+            self.assertEqual(order.total_amount, sum(item.price * item.quantity for item in order.items.all()))
+            self.assertEqual(order.item_count, sum(item.quantity for item in order.items.all()))
+            self.assertTrue(all(item.menu_item.restaurant_id == order.restaurant_id for item in order.items.select_related('menu_item')))
+        orders_per_restaurant = sorted(Restaurant.objects.annotate(orders=Count('order')).values_list('orders', flat=True))
+        self.assertGreater(orders_per_restaurant[-1], 2 * orders_per_restaurant[0])
+        self.assertGreater(len(set(Order.objects.values_list('created_at__date', flat=True))), 1)
+        order = Order.objects.create(customer=User.objects.first(), restaurant=Restaurant.objects.first())
+        self.assertGreater(order.id, Order.objects.exclude(pk=order.pk).aggregate(last=Max('id'))['last'])
+
+    def test_seed_makes_the_data_reproducible(self):
+        """
+        Tests that two runs with the same seed generate the same orders.
+        """
+        def signature():
+            return list(Order.objects.order_by('id').values_list('total_amount', 'item_count'))
+        self.generate()
+        first = signature()
+        Order.objects.all().delete()
+        self.generate()
+        self.assertEqual(signature(), first)
+
+class ClearDbTests(TestCase):
+    """
+    Tests for the fast mode of the clear_db management command.
+    """
+    def setUp(self):
+        """
+        Sets up the test environment with restaurants, menus, orders, customers with tokens and a staff user.
+        """
+        self.staff = User.objects.create_user(username='admin', password='adminpassword', is_staff=True)
+        self.customers = [User.objects.create_user(username=f'vevo{index}', password='vevopassword') for index in range(3)]
+        for index in range(3):
+            restaurant = Restaurant.objects.create(name=f"Törlő Étterem {index}", address=f"Törlő Cím {index}")
+            menu_item = MenuItem.objects.create(restaurant=restaurant, name="Leves", price=Decimal('4.50'))
+            for customer in self.customers:
+                order = Order.objects.create(customer=customer, restaurant=restaurant)
+                OrderItem.objects.create(order=order, menu_item=menu_item, price=menu_item.price)
+        self.restaurant = restaurant
+
+    def test_fast_mode_empties_tables_and_invalidates_caches(self):
+        """
+        Tests that the fast mode empties the restaurant and order tables, deletes the customers and their tokens
+        but keeps staff users, and that cached restaurant details and tokens are no longer served.
+        """
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.customers[0].auth_token.key)
+        self.assertEqual(client.get(reverse('restaurant-detail', args=[self.restaurant.id])).status_code, status.HTTP_200_OK)
+
+        call_command('clear_db', fast=True, stdout=StringIO())
+        self.assertEqual([model.objects.count() for model in (OrderItem, Order, MenuItem, Restaurant)], [0, 0, 0, 0])
+        self.assertEqual(list(User.objects.values_list('username', flat=True)), ['admin'])
+        self.assertEqual(list(Token.objects.values_list('user__username', flat=True)), ['admin'])
+        self.assertEqual(client.get(reverse('restaurant-detail', args=[self.restaurant.id])).status_code, status.HTTP_401_UNAUTHORIZED)
+        client.force_authenticate(self.staff)
+        self.assertEqual(client.get(reverse('restaurant-detail', args=[self.restaurant.id])).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_batched_mode_keeps_users(self):
+        """
+        Tests that the batched deletes empty the tables in several transactions, report their progress and keep the users.
+        """
+        output = StringIO()
+        call_command('clear_db', fast=True, batch_size=2, keep_users=True, stdout=output)
+        self.assertEqual([model.objects.count() for model in (OrderItem, Order, MenuItem, Restaurant)], [0, 0, 0, 0])
+        self.assertEqual(User.objects.count(), 4)
+        self.assertIn('Deleted 8 rows from api_order...', output.getvalue())
+
+class OrderQueueFilterTests(TestCase):
+    """
+    Tests for filtering the restaurant order list by restaurant, status and creation time.
+    """
+    def setUp(self):
+        """
+        Sets up the test environment with an authenticated API client and orders in several states
+        at two restaurants, created at known times.
+        """
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='queue', password='queuepassword')
+        self.client.force_authenticate(self.user)
+        self.restaurant1 = Restaurant.objects.create(name="Sor Étterem 1", address="Cím 1")
+        self.restaurant2 = Restaurant.objects.create(name="Sor Étterem 2", address="Cím 2")
+        self.orders = {}
+        for index, (restaurant, order_status) in enumerate([
+            (self.restaurant1, 'received'), (self.restaurant1, 'preparing'), (self.restaurant1, 'delivered'),
+            (self.restaurant2, 'received'),
+        ]):
+            order = Order.objects.create(customer=self.user, restaurant=restaurant, status=order_status)
+            Order.objects.filter(pk=order.pk).update(created_at=f'2025-05-0{index + 1}T12:00:00Z')
+            self.orders[(restaurant.id, order_status)] = order
+
+    def get_ids(self, query):
+        """
+        Requests the order list with the given query string and returns the IDs of the returned orders.
+        """
+        response = self.client.get(reverse('restaurant-order-list') + query)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [order['id'] for order in response.data['results']]
+
+    def test_filter_active_orders_of_restaurant(self):
+        """
+        Tests filtering by restaurant and a comma-separated list of statuses.
+        """
+        ids = self.get_ids(f'?restaurant={self.restaurant1.id}&status=received,preparing')
+        self.assertEqual(ids, [self.orders[(self.restaurant1.id, 'received')].id, self.orders[(self.restaurant1.id, 'preparing')].id])
+
+    def test_filter_by_single_status(self):
+        """
+        Tests filtering by a single status across restaurants.
+        """
+        ids = self.get_ids('?status=received')
+        self.assertEqual(ids, [self.orders[(self.restaurant1.id, 'received')].id, self.orders[(self.restaurant2.id, 'received')].id])
+
+    def test_filter_by_creation_range(self):
+        """
+        Tests that created_after is inclusive and created_before is exclusive.
+        """
+        ids = self.get_ids('?created_after=2025-05-02T12:00:00Z&created_before=2025-05-04T12:00:00Z')
+        self.assertEqual(ids, [self.orders[(self.restaurant1.id, 'preparing')].id, self.orders[(self.restaurant1.id, 'delivered')].id])
+
+    def test_invalid_filters_are_rejected(self):
+        """
+        Tests that an unknown status or a malformed date returns a 400 Bad Request.
+        """
+        response = self.client.get(reverse('restaurant-order-list') + '?status=cooking')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('status', response.data)
+        response = self.client.get(reverse('restaurant-order-list') + '?created_after=yesterday')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_queue_query_uses_composite_index(self):
+        """
+        Tests that the database answers the active-orders query of a restaurant with the composite index.
+        """
+        if connection.vendor != 'sqlite':
+            self.skipTest('The query plan format is backend specific.')
+        queryset = Order.objects.filter(restaurant_id=self.restaurant1.id, status='received', created_at__gte=timezone.make_aware(datetime(2025, 5, 1))).order_by('created_at', 'id')
+        self.assertIn('order_rest_status_created_idx', queryset.explain())
+
+class RecordingOrderEventBroker:
+    """
+    Local stand-in for the order event broker that records published events instead of delivering them.
+    """
+    def __init__(self):
+        self.events = []
+
+    def publish(self, order_id, event):
+        self.events.append((order_id, event))
+
+class OrderStatusEventTests(TestCase):
+    """
+    Tests for the server-sent events stream of order status changes and the in-process event broker.
+    """
+    def setUp(self):
+        """
+        Sets up the test environment with two customers, a restaurant and an order of the first customer.
+        """
+        self.customer = User.objects.create_user(username='watcher', password='watcherpassword')
+        self.other = User.objects.create_user(username='stranger', password='strangerpassword')
+        self.restaurant = Restaurant.objects.create(name="Esemény Étterem", address="Esemény Cím")
+        self.order = Order.objects.create(customer=self.customer, restaurant=self.restaurant)
+        self.token = Token.objects.get(user=self.customer)
+        self.other_token = Token.objects.get(user=self.other)
+
+    async def test_stream_pushes_status_changes(self):
+        """
+        Tests that the stream starts with the current status, pushes published changes and ends after delivery.
+        """
+        response = await AsyncClient().get(
+            reverse('order-status-events', args=[self.order.id]), headers={'Authorization': 'Token ' + self.token.key},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.headers['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        first = (await anext(stream)).decode()
+        self.assertIn('event: status', first)
+        self.assertIn('"status": "received"', first)
+
+        await asyncio.to_thread(publish_order_status, self.order.id, 'ready')
+        self.assertIn('"status": "ready"', (await anext(stream)).decode())
+        publish_order_status(self.order.id, 'delivered')
+        self.assertIn('"status": "delivered"', (await anext(stream)).decode())
+        with self.assertRaises(StopAsyncIteration):
+            await anext(stream)
+
+    async def test_idle_stream_rereads_the_order(self):
+        """
+        Tests that an idle stream catches up on a status change whose event was not delivered to it,
+        and ends once the order is no longer a live order.
+        """
+        with mock.patch('api.views.ORDER_EVENTS_KEEPALIVE', 0.01):
+            response = await AsyncClient().get(
+                reverse('order-status-events', args=[self.order.id]), headers={'Authorization': 'Token ' + self.token.key},
+            )
+            stream = aiter(response.streaming_content)
+            self.assertIn('"status": "received"', (await anext(stream)).decode())
+            self.assertEqual((await anext(stream)).decode(), ': keep-alive\n\n')
+
+            await Order.objects.filter(pk=self.order.id).aupdate(status='ready')
+            self.assertIn('"status": "ready"', (await anext(stream)).decode())
+            await Order.objects.filter(pk=self.order.id).adelete()
+            with self.assertRaises(StopAsyncIteration):
+                await anext(stream)
+
+    async def test_stream_requires_own_order(self):
+        """
+        Tests that the stream is refused without credentials and hidden from other customers.
+        """
+        response = await AsyncClient().get(reverse('order-status-events', args=[self.order.id]))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = await AsyncClient().get(
+            reverse('order-status-events', args=[self.order.id]), headers={'Authorization': 'Token ' + self.other_token.key},
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_broker_delivers_events_published_from_other_threads(self):
+        """
+        Tests that the in-process broker delivers an event published from a worker thread to an
+        asyncio subscriber, and that unsubscribed queues no longer receive events.
+        """
+        broker = InProcessOrderEventBroker()
+
+        async def listen():
+            queue = broker.subscribe(1)
+            thread = threading.Thread(target=broker.publish, args=(1, {'id': 1, 'status': 'ready'}))
+            thread.start()
+            event = await asyncio.wait_for(queue.get(), timeout=5)
+            thread.join()
+            broker.unsubscribe(1, queue)
+            broker.publish(1, {'id': 1, 'status': 'delivered'})
+            return event, queue.qsize()
+
+        self.assertEqual(asyncio.run(listen()), ({'id': 1, 'status': 'ready'}, 0))
+
+    @override_settings(ORDER_EVENT_BROKER='api.tests.RecordingOrderEventBroker')
+    def test_status_update_publishes_after_commit(self):
+        """
+        Tests that updating an order status publishes the new status once the transaction commits.
+        """
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.patch(reverse('update-order-status', args=[self.order.id]), {'status': 'preparing'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(get_order_event_broker().events, [(self.order.id, {'id': self.order.id, 'status': 'preparing'})])
+
+class AsyncReadViewTests(TestCase):
+    """
+    Tests that the asynchronous read views return the same data as their synchronous counterparts.
+    """
+    def setUp(self):
+        """
+        Sets up the test environment with restaurants, menu items and an order of an authenticated customer.
+        """
+        self.client = APIClient()
+        self.customer = User.objects.create_user(username='async', password='asyncpassword')
+        self.token = Token.objects.get(user=self.customer)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.restaurants = [Restaurant.objects.create(name=f"Aszinkron {index}", address="Cím") for index in range(3)]
+        self.item = MenuItem.objects.create(restaurant=self.restaurants[0], name="Túrós csusza", description="Tepertővel", price=Decimal('7.25'))
+        self.order = Order.objects.create(customer=self.customer, restaurant=self.restaurants[0], total_amount=Decimal('14.50'), item_count=2)
+        OrderItem.objects.create(order=self.order, menu_item=self.item, quantity=2, price=self.item.price)
+
+    async def get_json(self, name, *args, query=''):
+        """
+        Requests an asynchronous endpoint with the customer's token and returns the status code and decoded JSON body.
+        """
+        response = await AsyncClient().get(reverse(name, args=args) + query, headers={'Authorization': 'Token ' + self.token.key})
+        return response.status_code, response.json()
+
+    async def test_restaurant_list_matches_sync_view(self):
+        """
+        Tests that the asynchronous restaurant list pages like the synchronous one, with interchangeable cursors.
+        """
+        status_code, first_page = await self.get_json('async-restaurant-list', query='?page_size=2')
+        self.assertEqual(status_code, status.HTTP_200_OK)
+        sync_page = (await sync_to_async(self.client.get)(reverse('restaurant-list') + '?page_size=2')).json()
+        self.assertEqual(first_page['results'], sync_page['results'])
+        self.assertIsNone(first_page['previous'])
+
+        second_page = (await AsyncClient().get(first_page['next'])).json()
+        self.assertEqual([item['id'] for item in second_page['results']], [self.restaurants[2].id])
+        self.assertIsNone(second_page['next'])
+        back = (await AsyncClient().get(second_page['previous'])).json()
+        self.assertEqual(back['results'], first_page['results'])
+
+    async def test_restaurant_detail_and_menu_match_sync_views(self):
+        """
+        Tests that the asynchronous detail and menu endpoints return the same data as the synchronous ones.
+        """
+        for async_name, sync_name in [('async-restaurant-detail', 'restaurant-detail'), ('async-restaurant-menu', 'restaurant-menu')]:
+            status_code, data = await self.get_json(async_name, self.restaurants[0].id)
+            self.assertEqual(status_code, status.HTTP_200_OK)
+            expected = (await sync_to_async(self.client.get)(reverse(sync_name, args=[self.restaurants[0].id]))).json()
+            self.assertEqual(data, expected)
+            status_code, data = await self.get_json(async_name, 999)
+            self.assertEqual(status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_responses_are_encoded_like_the_sync_views(self):
+        """
+        Tests that the asynchronous views send the same bytes as the synchronous ones, with non-ASCII text unescaped.
+        """
+        url = reverse('async-restaurant-menu', args=[self.restaurants[0].id])
+        response = await AsyncClient().get(url)
+        expected = await sync_to_async(self.client.get)(reverse('restaurant-menu', args=[self.restaurants[0].id]))
+        self.assertIn('Túrós csusza'.encode(), response.content)
+        self.assertEqual(response.content, expected.content)
+
+    async def test_customer_order_detail_matches_sync_view(self):
+        """
+        Tests that the asynchronous order detail returns the customer's order like the synchronous view,
+        and requires authentication.
+        """
+        status_code, data = await self.get_json('async-customer-order-detail', self.order.id)
+        self.assertEqual(status_code, status.HTTP_200_OK)
+        expected = (await sync_to_async(self.client.get)(reverse('customer-order-detail', args=[self.order.id]))).json()
+        self.assertEqual(data, expected)
+        response = await AsyncClient().get(reverse('async-customer-order-detail', args=[self.order.id]))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_async_views_use_the_drf_authentication_classes(self):
+        """
+        Tests that the asynchronous views accept the credentials of every DEFAULT_AUTHENTICATION_CLASSES entry,
+        not only tokens, and reject invalid ones.
+        """
+        url = reverse('async-customer-order-detail', args=[self.order.id])
+        basic = 'Basic ' + base64.b64encode(b'async:asyncpassword').decode()
+        response = await AsyncClient().get(url, headers={'Authorization': basic})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['id'], self.order.id)
+
+        client = AsyncClient()
+        await client.aforce_login(self.customer)
+        response = await client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        wrong = 'Basic ' + base64.b64encode(b'async:wrongpassword').decode()
+        response = await AsyncClient().get(url, headers={'Authorization': wrong})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+class FastSerializationTests(TestCase):
+    """
+    Parity tests between the fast flat serializers and the reference ModelSerializers.
+    """
+    def setUp(self):
+        """
+        Sets up the test environment with restaurants, menu items with and without descriptions,
+        and orders with several, one or no items.
+        """
+        self.user = User.objects.create_user(username='gyors', password='gyorspassword', email='gyors@example.com')
+        self.restaurants = [Restaurant.objects.create(name=f"Gyors Étterem {index}", address=f"Gyors Cím {index}") for index in range(2)]
+        self.items = [
+            MenuItem.objects.create(restaurant=self.restaurants[0], name="Sült hal", description="Citrommal", price=Decimal('9.5')),
+            MenuItem.objects.create(restaurant=self.restaurants[0], name="Saláta", price=Decimal('6.75')),
+            MenuItem.objects.create(restaurant=self.restaurants[1], name="Sushi Válogatás", description="", price=Decimal('19.99')),
+        ]
+        order = Order.objects.create(customer=self.user, restaurant=self.restaurants[0], total_amount=Decimal('25.75'), item_count=3)
+        OrderItem.objects.create(order=order, menu_item=self.items[0], quantity=2, price=Decimal('9.50'), special_instructions="Csípősen")
+        OrderItem.objects.create(order=order, menu_item=self.items[1], quantity=1, price=Decimal('6.75'))
+        other = Order.objects.create(customer=self.user, restaurant=self.restaurants[1], status='ready')
+        OrderItem.objects.create(order=other, menu_item=self.items[2], quantity=1, price=Decimal('19.99'))
+        Order.objects.create(customer=self.user, restaurant=self.restaurants[1])
+
+    def assertParity(self, serializer_class, queryset):
+        """
+        Checks that the flat serializer produces exactly the representation of the reference serializer.
+        """
+        expected = serializer_class(queryset, many=True).data
+        self.assertEqual(get_flat_serializer(serializer_class).serialize_queryset(queryset), expected)
+
+    def test_restaurant_parity(self):
+        """
+        Tests that the flat serializer reproduces the serialized restaurants.
+        """
+        self.assertParity(RestaurantSerializer, Restaurant.objects.order_by('id'))
+
+    def test_menu_item_parity(self):
+        """
+        Tests that the flat serializer reproduces the serialized menu items, including missing descriptions and prices needing quantization.
+        """
+        self.assertParity(MenuItemSerializer, MenuItem.objects.order_by('id'))
+
+    def test_order_parity(self):
+        """
+        Tests that the flat serializer reproduces the serialized nested orders with several, one or no items.
+        """
+        self.assertParity(OrderSerializer, OrderSerializer.setup_eager_loading(Order.objects.order_by('id')))
+
+    def test_unsupported_serializer_is_rejected(self):
+        """
+        Tests that serializers with computed fields cannot be compiled.
+        """
+        with self.assertRaises(ValueError):
+            FlatSerializer(RestaurantDetailSerializer)
+
+    def test_list_endpoints_are_identical_in_fast_mode(self):
+        """
+        Tests that the list and menu endpoints return the same body with and without fast serialization.
+        """
+        client = APIClient()
+        client.force_authenticate(self.user)
+        urls = [
+            reverse('restaurant-list'),
+            reverse('restaurant-order-list') + '?page_size=2',
+            reverse('restaurant-order-list') + f'?restaurant={self.restaurants[1].id}',
+            reverse('restaurant-menu', args=[self.restaurants[0].id]),
+        ]
+        for url in urls:
+            reference = client.get(url).content
+            # Invalidate the cached menus so the fast path really renders them
+            Restaurant.objects.get(pk=self.restaurants[0].id).save()
+            with override_settings(API_FAST_SERIALIZATION=True):
+                self.assertEqual(client.get(url).content, reference)
+
+class StreamingListTests(TestCase):
+    """
+    Tests for the streaming mode of the restaurant and order list endpoints.
+    """
+    def setUp(self):
+        """
+        Sets up the test environment with restaurants and more orders than fit into one streamed chunk.
+        """
+        self.user = User.objects.create_user(username='export', password='exportpassword', email='export@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.restaurants = [Restaurant.objects.create(name=f"Export Étterem {index}", address=f"Export Cím {index}") for index in range(3)]
+        menu_item = MenuItem.objects.create(restaurant=self.restaurants[0], name="Rántott sajt", price=Decimal('7.20'))
+        for index in range(7):
+            order = Order.objects.create(customer=self.user, restaurant=self.restaurants[index % 2], status='ready' if index % 3 else 'received',
+                                         total_amount=Decimal('7.20'), item_count=1)
+            OrderItem.objects.create(order=order, menu_item=menu_item, quantity=1, price=Decimal('7.20'))
+
+    def stream(self, url):
+        """
+        Requests a streamed list with a chunk size of 3 and returns the response and its decoded body.
+        """
+        with mock.patch('api.views.API_STREAM_CHUNK_SIZE', 3):
+            response = self.client.get(url)
+            body = b''.join(response.streaming_content).decode() if response.streaming else ''
+        return response, body
+
+    def test_json_stream_matches_serializer(self):
+        """
+        Tests that the JSON array stream contains every order in pagination order, with and without fast serialization,
+        and that the items are loaded once per chunk instead of once per order.
+        """
+        expected = json.loads(json.dumps(OrderSerializer(
+            OrderSerializer.setup_eager_loading(Order.objects.order_by('created_at', 'id')), many=True,
+        ).data))
+        for fast in (False, True):
+            with override_settings(API_FAST_SERIALIZATION=fast), CaptureQueriesContext(connection) as queries:
+                response, body = self.stream(reverse('restaurant-order-list') + '?stream=json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            self.assertEqual(json.loads(body), expected)
+            self.assertLessEqual(len(queries), 1 + 3 * 2)
+
+    def test_ndjson_stream_applies_filters(self):
+        """
+        Tests that the NDJSON stream honours the order filters and emits one order per line.
+        """
+        response, body = self.stream(reverse('restaurant-order-list') + f'?stream=ndjson&status=ready&restaurant={self.restaurants[1].id}')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        expected_ids = list(Order.objects.filter(status='ready', restaurant=self.restaurants[1]).order_by('created_at', 'id').values_list('id', flat=True))
+        self.assertEqual([json.loads(line)['id'] for line in body.splitlines()], expected_ids)
+
+    def test_restaurant_stream_and_empty_result(self):
+        """
+        Tests that all restaurants are streamed unpaginated and that an empty result is a valid empty array.
+        """
+        response, body = self.stream(reverse('restaurant-list') + '?stream=json')
+        self.assertEqual(json.loads(body), RestaurantSerializer(Restaurant.objects.order_by('id'), many=True).data)
+        response, body = self.stream(reverse('restaurant-order-list') + '?stream=json&status=delivered')
+        self.assertEqual(json.loads(body), [])
+
+    def test_unknown_stream_format_is_rejected(self):
+        """
+        Tests that an unsupported stream format is answered with 400 Bad Request.
+        """
+        response = self.client.get(reverse('restaurant-order-list') + '?stream=csv')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('stream', response.data)
+
+class BulkOrderStatusTests(TestCase):
+    """
+    Tests for the bulk order status update endpoint.
+    """
+    def setUp(self):
+        """
+        Sets up the test environment with an authenticated kitchen user and orders in every status.
+        """
+        self.user = User.objects.create_user(username='kitchen', password='kitchenpassword', email='kitchen@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.restaurant = Restaurant.objects.create(name="Konyha Étterem", address="Konyha Cím")
+        self.orders = {
+            name: Order.objects.create(customer=self.user, restaurant=self.restaurant, status=order_status)
+            for name, order_status in [
+                ('received', 'received'), ('preparing', 'preparing'), ('also_preparing', 'preparing'),
+                ('ready', 'ready'), ('delivered', 'delivered'),
+            ]
+        }
+        self.url = reverse('bulk-update-order-status')
+
+    @override_settings(ORDER_EVENT_BROKER='api.tests.RecordingOrderEventBroker')
+    def test_mixed_batch(self):
+        """
+        Tests that valid transitions are applied with one UPDATE per previous and target status, that the other entries
+        are reported per order in request order, and that only the updated orders are published after commit.
+        """
+        orders = self.orders
+        changes = [
+            {'id': orders['preparing'].id, 'status': 'ready'},
+            {'id': orders['received'].id, 'status': 'ready'},
+            {'id': orders['ready'].id, 'status': 'delivered'},
+            {'id': orders['also_preparing'].id, 'status': 'preparing'},
+            {'id': orders['delivered'].id, 'status': 'received'},
+            {'id': 999999, 'status': 'ready'},
+        ]
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(self.url, {'orders': changes}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [
+            {'id': orders['preparing'].id, 'result': 'updated', 'status': 'ready'},
+            {'id': orders['received'].id, 'result': 'updated', 'status': 'ready'},
+            {'id': orders['ready'].id, 'result': 'updated', 'status': 'delivered'},
+            {'id': orders['also_preparing'].id, 'result': 'unchanged', 'status': 'preparing'},
+            {'id': orders['delivered'].id, 'result': 'invalid_transition', 'status': 'delivered'},
+            {'id': 999999, 'result': 'not_found', 'status': None},
+        ])
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE')]), 3)
+        self.assertEqual(
+            dict(Order.objects.values_list('id', 'status')),
+            {orders['received'].id: 'ready', orders['preparing'].id: 'ready', orders['also_preparing'].id: 'preparing',
+             orders['ready'].id: 'delivered', orders['delivered'].id: 'delivered'},
+        )
+        self.assertCountEqual(get_order_event_broker().events, [
+            (orders['preparing'].id, {'id': orders['preparing'].id, 'status': 'ready'}),
+            (orders['received'].id, {'id': orders['received'].id, 'status': 'ready'}),
+            (orders['ready'].id, {'id': orders['ready'].id, 'status': 'delivered'}),
+        ])
+
+    @override_settings(ORDER_EVENT_BROKER='api.tests.RecordingOrderEventBroker')
+    def test_orders_changed_since_they_were_read(self):
+        """
+        Tests that when an order changes status between the read and the UPDATE, only the orders the UPDATE
+        changed are reported as updated and published, and the changed order reports its new status.
+        """
+        first = self.orders['received']
+        second = Order.objects.create(customer=self.user, restaurant=self.restaurant, status='received')
+        update_status = BulkOrderStatusSerializer.update_status
+
+        def update_after_concurrent_change(queryset, target):
+            # Stands in for another request committing its change after the orders were read
+            Order.objects.filter(pk=second.pk, status='received').update(status='preparing')
+            return update_status(queryset, target)
+
+        changes = [{'id': first.id, 'status': 'ready'}, {'id': second.id, 'status': 'ready'}]
+        with mock.patch.object(BulkOrderStatusSerializer, 'update_status', staticmethod(update_after_concurrent_change)):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch(self.url, {'orders': changes}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [
+            {'id': first.id, 'result': 'updated', 'status': 'ready'},
+            {'id': second.id, 'result': 'invalid_transition', 'status': 'preparing'},
+        ])
+        self.assertEqual(Order.objects.get(pk=first.id).version, first.version + 1)
+        self.assertEqual(Order.objects.get(pk=second.id).status, 'preparing')
+        self.assertEqual(get_order_event_broker().events, [(first.id, {'id': first.id, 'status': 'ready'})])
+
+    def test_invalid_payloads_are_rejected(self):
+        """
+        Tests that empty lists, duplicate orders and unknown statuses are rejected without updating anything,
+        and that authentication is required.
+        """
+        order_id = self.orders['received'].id
+        for payload in [
+            {'orders': []},
+            {'orders': [{'id': order_id, 'status': 'preparing'}, {'id': order_id, 'status': 'ready'}]},
+            {'orders': [{'id': order_id, 'status': 'cancelled'}]},
+            {},
+        ]:
+            response = self.client.patch(self.url, payload, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Order.objects.get(pk=order_id).status, 'received')
+        response = APIClient().patch(self.url, {'orders': [{'id': order_id, 'status': 'preparing'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+class OrderStatusConcurrencyTests(TransactionTestCase):
+    """
+    Tests that concurrent status changes of a single order are serialized by the order's version, without row locks.
+    Runs in real transactions, so every thread works on its own database connection.
+    """
+    def setUp(self):
+        """
+        Sets up the test environment with a kitchen user and a single received order.
+        """
+        self.user = User.objects.create_user(username='tablet', password='tabletpassword', email='tablet@example.com')
+        restaurant = Restaurant.objects.create(name="Verseny Étterem", address="Verseny Cím")
+        self.order = Order.objects.create(customer=self.user, restaurant=restaurant)
+
+    def run_threads(self, target, count):
+        """
+        Runs the target in the given number of threads and returns their return values.
+        """
+        results = [None] * count
+
+        def run(index):
+            try:
+                results[index] = target(index)
+            finally:
+                connection.close()
+        threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_only_one_of_simultaneous_changes_wins(self):
+        """
+        Tests that when many requests read the same version and then change the status at the same moment,
+        exactly one of them succeeds and all others get a conflict.
+        """
+        barrier = threading.Barrier(12)
+
+        def change(index):
+            order = Order.objects.get(pk=self.order.pk)
+            serializer = OrderStatusUpdateSerializer(order, data={'status': 'preparing' if index % 2 else 'ready'})
+            serializer.is_valid(raise_exception=True)
+            barrier.wait()
+            try:
+                serializer.save()
+            except OrderConflict:
+                return 'conflict'
+            return 'updated'
+
+        results = self.run_threads(change, 12)
+        self.assertEqual(results.count('updated'), 1)
+        self.assertEqual(results.count('conflict'), 11)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.version, 1)
+
+    def test_conflict_body_keeps_the_types_of_status_and_version(self):
+        """
+        Tests that a 409 Conflict carries the current version as a number, and null status and version
+        for an order deleted in the meantime.
+        """
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.patch(reverse('update-order-status', args=[self.order.pk]), {'status': 'preparing', 'version': 5}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(json.loads(response.content), {
+            'detail': 'The order was changed by another request.', 'status': 'received', 'version': 0,
+        })
+
+        serializer = OrderStatusUpdateSerializer(Order.objects.get(pk=self.order.pk), data={'status': 'preparing'})
+        serializer.is_valid(raise_exception=True)
+        Order.objects.filter(pk=self.order.pk).delete()
+        with self.assertRaises(OrderConflict) as raised:
+            serializer.save()
+        response = exception_handler(raised.exception, {})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(json.loads(JSONRenderer().render(response.data)), {
+            'detail': 'The order was changed by another request.', 'status': None, 'version': None,
+        })
+
+    def test_status_never_moves_backward_under_load(self):
+        """
+        Tests that hammering one order through the API from many threads with random target statuses
+        only ever applies allowed transitions, each at a distinct version.
+        """
+        statuses = [choice for choice, _ in Order.STATUS_CHOICES]
+        url = reverse('update-order-status', args=[self.order.pk])
+
+        def hammer(index):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            applied = []
+            for attempt in range(15):
+                response = client.patch(url, {'status': statuses[(index + attempt) % len(statuses)]}, format='json')
+                self.assertIn(response.status_code, (status.HTTP_200_OK, status.HTTP_409_CONFLICT))
+                if response.status_code == status.HTTP_200_OK:
+                    applied.append((response.data['version'], response.data['status']))
+            return applied
+
+        applied = dict(version_status for thread_applied in self.run_threads(hammer, 8) for version_status in thread_applied)
+        self.order.refresh_from_db()
+        history = [applied[version] for version in range(1, self.order.version + 1)]
+        self.assertEqual(history[-1], self.order.status)
+        for previous, current in zip(['received'] + history, history):
+            self.assertIn(current, Order.STATUS_TRANSITIONS[previous])
+
+class ReplayRequestsTests(TransactionTestCase):
+    """
+    Tests for recording API requests and replaying them with the replay_requests management command.
+    Runs in real transactions, because the requests are replayed from worker threads with their own connections.
+    """
+    def setUp(self):
+        """
+        Sets up the test environment with a customer, a restaurant with a menu and an order, and a scratch directory.
+        """
+        self.user = User.objects.create_user(username='replay', password='replaypassword', email='replay@example.com')
+        self.restaurant = Restaurant.objects.create(name="Visszajátszó Étterem", address="Visszajátszó Cím")
+        self.menu_item = MenuItem.objects.create(restaurant=self.restaurant, name="Pörkölt", price=Decimal('11.00'))
+        self.order = Order.objects.create(customer=self.user, restaurant=self.restaurant)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_recorded_requests_are_replayed(self):
+        """
+        Tests that API requests are recorded with their authenticated user, that requests carrying a password
+        are not, and that the recording replays with per-endpoint results.
+        """
+        mix = os.path.join(self.directory, 'recorded.jsonl')
+        with override_settings(API_REQUEST_RECORD_FILE=mix):
+            client = Client()
+            client.post(reverse('login'), {'username': 'replay', 'password': 'replaypassword'}, content_type='application/json')
+            headers = {'Authorization': 'Token ' + self.user.auth_token.key}
+            client.get(reverse('restaurant-menu', args=[self.restaurant.id]), headers=headers)
+            client.post(reverse('create-order'), {'restaurantId': self.restaurant.id, 'items': [{'menuItemId': self.menu_item.id, 'quantity': 2}]},
+                        content_type='application/json', headers=headers)
+        with open(mix, encoding='utf-8') as recorded:
+            entries = [json.loads(line) for line in recorded]
+        self.assertEqual([(entry['method'], entry['user']) for entry in entries], [('GET', 'replay'), ('POST', 'replay')])
+        self.assertEqual(entries[1]['body']['items'], [{'menuItemId': self.menu_item.id, 'quantity': 2}])
+
+        results = os.path.join(self.directory, 'results.json')
+        call_command('replay_requests', mix, concurrency=2, repeat=3, json_output=results, stdout=StringIO())
+        with open(results, encoding='utf-8') as output:
+            summary = json.load(output)
+        self.assertEqual(summary['requests'], 6)
+        self.assertEqual(set(summary['endpoints']), {'GET restaurant-menu', 'POST create-order'})
+        self.assertEqual(summary['endpoints']['POST create-order']['errors'], 0)
+        self.assertGreater(summary['endpoints']['POST create-order']['queries'], 0)
+        self.assertEqual(Order.objects.count(), 5)
+
+    async def test_async_requests_are_recorded(self):
+        """
+        Tests that requests handled by the asynchronous views are recorded with their authenticated user.
+        """
+        mix = os.path.join(self.directory, 'recorded.jsonl')
+        with override_settings(API_REQUEST_RECORD_FILE=mix):
+            response = await AsyncClient().get(
+                reverse('async-customer-order-detail', args=[self.order.id]),
+                headers={'Authorization': 'Token ' + await sync_to_async(lambda: self.user.auth_token.key)()},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with open(mix, encoding='utf-8') as recorded:
+            entries = [json.loads(line) for line in recorded]
+        self.assertEqual(entries, [{
+            'method': 'GET', 'path': reverse('async-customer-order-detail', args=[self.order.id]), 'body': None, 'user': 'replay',
+        }])
+
+    def test_generated_mix_replays(self):
+        """
+        Tests that a generated mix only contains requests the API can serve.
+        """
+        mix = os.path.join(self.directory, 'generated.jsonl')
+        call_command('replay_requests', mix, generate=50, seed=3, stdout=StringIO())
+        output = StringIO()
+        call_command('replay_requests', mix, concurrency=3, stdout=output)
+        self.assertIn('50 requests in', output.getvalue())
+        for line in output.getvalue().splitlines():
+            if line.startswith('GET '):
+                self.assertEqual(line.split()[3], '0')
+
+class MetricsTests(TestCase):
+    """
+    Tests for the per-endpoint request metrics and the Prometheus /metrics endpoint.
+    """
+    def setUp(self):
+        """
+        Sets up the test environment with a restaurant and an empty metrics registry.
+        """
+        self.restaurant = Restaurant.objects.create(name="Mérő Étterem", address="Mérő Cím")
+        MenuItem.objects.create(restaurant=self.restaurant, name="Lecsó", price=Decimal('7.00'))
+        registry.reset()
+        self.addCleanup(registry.reset)
+
+    def test_requests_are_recorded_per_endpoint(self):
+        """
+        Tests that requests are counted per view, method and status, with their queries, durations and response sizes.
+        """
+        client = Client()
+        first = client.get(reverse('restaurant-menu', args=[self.restaurant.id]))
+        client.get(reverse('restaurant-menu', args=[self.restaurant.id]))
+        client.get(reverse('restaurant-menu', args=[Restaurant.objects.aggregate(Max('id'))['id__max'] + 1000]))
+        client.get('/api/does-not-exist/')
+
+        metrics = registry.collect()
+        stats = metrics[('restaurant-menu', 'GET')]
+        self.assertEqual(stats.statuses, {200: 2, 404: 1})
+        self.assertEqual(sum(stats.buckets), 3)
+        self.assertGreaterEqual(stats.queries, 3)
+        self.assertGreater(stats.query_duration, 0)
+        self.assertGreater(stats.duration_sum, stats.query_duration)
+        self.assertGreaterEqual(stats.response_bytes, 2 * len(first.content))
+        self.assertEqual(metrics[('unmatched', 'GET')].statuses, {404: 1})
+
+    def test_prometheus_exposition(self):
+        """
+        Tests that the /metrics endpoint renders cumulative histograms and counters in the Prometheus text format,
+        and that it can be disabled.
+        """
+        for duration in (0.001, 0.02, 0.3, 20):
+            registry.observe('restaurant-list', 'GET', 200, duration, queries=2, query_duration=0.001, response_bytes=100)
+
+        response = Client().get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        lines = response.content.decode().splitlines()
+        labels = 'view="restaurant-list",method="GET"'
+        self.assertIn(f'api_requests_total{{{labels},status="200"}} 4', lines)
+        self.assertIn(f'api_request_duration_seconds_bucket{{{labels},le="0.005"}} 1', lines)
+        self.assertIn(f'api_request_duration_seconds_bucket{{{labels},le="0.025"}} 2', lines)
+        self.assertIn(f'api_request_duration_seconds_bucket{{{labels},le="10.0"}} 3', lines)
+        self.assertIn(f'api_request_duration_seconds_bucket{{{labels},le="+Inf"}} 4', lines)
+        self.assertIn(f'api_request_duration_seconds_count{{{labels}}} 4', lines)
+        self.assertIn(f'api_db_queries_total{{{labels}}} 8', lines)
+        self.assertIn(f'api_response_size_bytes_total{{{labels}}} 400', lines)
+        self.assertEqual(render_prometheus({}).count('# TYPE'), 5)
+
+        with override_settings(API_METRICS=False):
+            self.assertEqual(Client().get('/metrics').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_metrics_are_only_served_to_allowed_addresses(self):
+        """
+        Tests that /metrics is hidden from clients whose address is not in API_METRICS_ALLOWED_IPS.
+        """
+        self.assertEqual(Client(REMOTE_ADDR='203.0.113.7').get('/metrics').status_code, status.HTTP_404_NOT_FOUND)
+        with override_settings(API_METRICS_ALLOWED_IPS=['203.0.113.7']):
+            self.assertEqual(Client(REMOTE_ADDR='203.0.113.7').get('/metrics').status_code, status.HTTP_200_OK)
+            self.assertEqual(Client().get('/metrics').status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_async_views_are_recorded_with_their_queries(self):
+        """
+        Tests that requests to the asynchronous views are recorded, including the queries their ORM calls
+        run on other threads.
+        """
+        response = await AsyncClient().get(reverse('async-restaurant-menu', args=[self.restaurant.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        stats = registry.collect()[('async-restaurant-menu', 'GET')]
+        self.assertEqual(stats.statuses, {200: 1})
+        self.assertEqual(stats.queries, 2)
+        self.assertGreater(stats.query_duration, 0)
+        self.assertEqual(stats.response_bytes, len(response.content))
+
+    def test_threads_record_without_losing_requests(self):
+        """
+        Tests that requests recorded from many threads at once are all merged into the collected metrics.
+        """
+        def work():
+            for _ in range(1000):
+                registry.observe('restaurant-detail', 'GET', 200, 0.01)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(registry.collect()[('restaurant-detail', 'GET')].statuses, {200: 8000})
+
+    def test_finished_threads_do_not_accumulate_shards(self):
+        """
+        Tests that the shards of finished threads are folded into the retired counters, as with a server
+        starting a thread per connection, without losing their requests.
+        """
+        def work():
+            for _ in range(10):
+                registry.observe('restaurant-menu', 'GET', 200, 0.01, queries=2)
+
+        for _ in range(50):
+            thread = threading.Thread(target=work)
+            thread.start()
+            thread.join()
+        self.assertLessEqual(registry.shard_count(), 1)
+        stats = registry.collect()[('restaurant-menu', 'GET')]
+        self.assertEqual((stats.statuses, stats.queries), ({200: 500}, 1000))
+
+@override_settings(API_READ_REPLICAS=['replica'])
+class ReplicaRoutingTests(TestCase):
+    """
+    Tests for routing the reads of safe-method requests to read replicas with read-your-writes stickiness.
+    The requests are handled by a stub view recording where the router sends an order query.
+    """
+    def setUp(self):
+        """
+        Sets up the test environment with a customer and a routing middleware around the recording stub view.
+        """
+        self.user = User.objects.create_user(username='routed', password='routedpassword')
+        self.token = self.user.auth_token
+        self.factory = RequestFactory()
+        self.routed_to = []
+        self.response_status = status.HTTP_200_OK
+
+        def view(request):
+            self.routed_to.append(ReadReplicaRouter().db_for_read(Order))
+            if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+                # Like DRF after authenticating the token
+                request.user = self.user
+            return HttpResponse(status=self.response_status)
+
+        self.middleware = ReplicaRoutingMiddleware(view)
+        self.addCleanup(cache.clear)
+
+    def request(self, method, authenticated=True):
+        headers = {'Authorization': 'Token ' + self.token.key} if authenticated else {}
+        request = self.factory.generic(method, '/api/orders/', headers=headers)
+        request.user = AnonymousUser()
+        self.middleware(request)
+        return self.routed_to[-1]
+
+    def test_reads_go_to_replicas_until_the_user_writes(self):
+        """
+        Tests that safe requests read from a replica, writes from the primary, and that a successful write
+        pins the reads of its user, and only theirs, to the primary until the stickiness expires.
+        """
+        self.assertEqual(self.request('GET'), 'replica')
+        self.assertIsNone(self.request('POST'))
+        self.assertIsNone(self.request('GET'))
+        self.assertEqual(self.request('GET', authenticated=False), 'replica')
+
+        with override_settings(API_REPLICA_STICKY_SECONDS=0):
+            self.request('PATCH')
+        self.assertEqual(self.request('GET'), 'replica')
+        self.assertIsNone(read_database.get())
+
+    def test_failed_writes_do_not_pin(self):
+        """
+        Tests that rejected writes do not route the user's later reads to the primary.
+        """
+        self.response_status = status.HTTP_409_CONFLICT
+        self.request('PATCH')
+        self.assertEqual(self.request('GET'), 'replica')
+
+    def test_primary_only_reads(self):
+        """
+        Tests that authentication data, related objects of primary rows and cached payloads are read from the primary.
+        """
+        router = ReadReplicaRouter()
+        token = read_database.set('replica')
+        try:
+            self.assertEqual(router.db_for_read(Token), 'default')
+            self.assertEqual(router.db_for_read(User), 'default')
+            self.assertEqual(router.db_for_read(Order, instance=self.user), 'default')
+            self.assertEqual(router.db_for_read(Order), 'replica')
+            self.assertIsNone(get_or_build('replica-test', 'payload', read_database.get))
+        finally:
+            read_database.reset(token)
+        self.assertEqual(router.db_for_write(Order), 'default')
+
+@override_settings(API_READ_REPLICAS=['replica'])
+class ReplicaDatabaseTests(TransactionTestCase):
+    """
+    Tests for serving the reads of real requests from the replica database alias, which mirrors the test database.
+    Runs in real transactions, so the rows written through the primary connection are visible to the replica's.
+    """
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        """
+        Sets up the test environment with a customer, a restaurant with a menu item and an order of the customer.
+        """
+        self.user = User.objects.create_user(username='replicated', password='replicatedpassword')
+        self.headers = {'Authorization': 'Token ' + self.user.auth_token.key}
+        self.restaurant = Restaurant.objects.create(name="Másolat Étterem", address="Másolat Cím")
+        self.menu_item = MenuItem.objects.create(restaurant=self.restaurant, name="Rakott krumpli", price=Decimal('8.00'))
+        self.order = Order.objects.create(customer=self.user, restaurant=self.restaurant)
+        local_token_cache.clear()
+        self.addCleanup(cache.clear)
+
+    def get(self, get, name):
+        """
+        Requests the order with the given client method and returns the status code and the tables read
+        through the replica and the primary connections.
+        """
+        with CaptureQueriesContext(connections['replica']) as replica, CaptureQueriesContext(connections['default']) as primary:
+            response = get(reverse(name, args=[self.order.id]), headers=self.headers)
+        tables = lambda queries: {table for query in queries for table in ('api_order', 'authtoken_token') if f'"{table}"' in query['sql']}
+        return response.status_code, tables(replica.captured_queries), tables(primary.captured_queries)
+
+    def test_reads_are_served_by_the_replica_until_the_user_writes(self):
+        """
+        Tests that the sync and async order detail views read the order from the replica and the token from the
+        primary, and that after the customer places an order their reads are served by the primary.
+        """
+        self.assertEqual(self.get(Client().get, 'customer-order-detail'), (200, {'api_order'}, {'authtoken_token'}))
+        local_token_cache.clear()
+        self.assertEqual(self.get(async_to_sync(AsyncClient().get), 'async-customer-order-detail'), (200, {'api_order'}, {'authtoken_token'}))
+
+        response = Client().post(
+            reverse('create-order'), {'restaurantId': self.restaurant.id, 'items': [{'menuItemId': self.menu_item.id, 'quantity': 1}]},
+            content_type='application/json', headers=self.headers,
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.get(Client().get, 'customer-order-detail'), (200, set(), {'api_order'}))
+        self.assertEqual(self.get(async_to_sync(AsyncClient().get), 'async-customer-order-detail'), (200, set(), {'api_order'}))
+
+class SQLiteProfileTests(TransactionTestCase):
+    """
+    Tests for the high-concurrency SQLite profile: connection pragmas and write transactions taking the lock up front.
+    Runs in real transactions, so the transactions under test are not nested in the test case's own.
+    """
+    def setUp(self):
+        """
+        Sets up the test environment with a customer and a restaurant.
+        """
+        self.user = User.objects.create_user(username='sqlite', password='sqlitepassword')
+        self.restaurant = Restaurant.objects.create(name="Zár Étterem", address="Zár Cím")
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        """
+        Tests that every new connection runs in WAL mode with the configured busy timeout.
+        """
+        connection.close()
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+    def test_write_transactions_begin_immediately(self):
+        """
+        Tests that write transactions start with BEGIN IMMEDIATE unless disabled, and that nested ones are savepoints.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            with write_transaction():
+                Order.objects.create(customer=self.user, restaurant=self.restaurant)
+            with transaction.atomic():
+                with write_transaction():
+                    Order.objects.create(customer=self.user, restaurant=self.restaurant)
+            with override_settings(SQLITE_IMMEDIATE_WRITES=False), write_transaction():
+                Order.objects.create(customer=self.user, restaurant=self.restaurant)
+        begins = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('BEGIN')]
+        self.assertEqual(begins, ['BEGIN IMMEDIATE', 'BEGIN', 'BEGIN'])
+        self.assertIsNone(connection.transaction_mode)
+
+    def test_concurrent_read_then_write_transactions_do_not_fail(self):
+        """
+        Tests that transactions which read before writing, started by many threads at once, wait for each other
+        instead of failing with "database is locked".
+        """
+        barrier = threading.Barrier(6)
+
+        def work():
+            try:
+                barrier.wait()
+                for _ in range(5):
+                    with write_transaction():
+                        Order.objects.filter(customer=self.user).count()
+                        Order.objects.create(customer=self.user, restaurant=self.restaurant)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        errors = []
+        threads = [threading.Thread(target=work) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(Order.objects.count(), 30)
+
+class MenuItemSearchTests(TestCase):
+    """
+    Tests for the menu item search endpoint, with the FTS5 index and with the LIKE fallback.
+    """
+    def setUp(self):
+        """
+        Sets up the test environment with two restaurants and menu items with accented names.
+        """
+        self.client = APIClient()
+        self.restaurant1 = Restaurant.objects.create(name="Kereső Étterem", address="Kereső Cím")
+        self.restaurant2 = Restaurant.objects.create(name="Tokió Bár", address="Tokió Cím")
+        self.salad = MenuItem.objects.create(restaurant=self.restaurant1, name="Saláta", description="Friss zöldségek", price=Decimal('6.75'))
+        self.soup = MenuItem.objects.create(restaurant=self.restaurant1, name="Gulyásleves", description="Saláta nélkül", price=Decimal('8.50'))
+        self.sushi = MenuItem.objects.create(restaurant=self.restaurant2, name="Sushi Válogatás", price=Decimal('19.90'))
+        self.url = reverse('menu-item-search')
+
+    def search(self, query, **params):
+        response = self.client.get(self.url, {'q': query, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_search_ignores_accents_and_ranks_names_first(self):
+        """
+        Tests that accented names are found with or without accents and by word prefix, that name matches rank
+        above description matches, and that the restaurant is joined into the page query.
+        """
+        self.assertEqual([item['id'] for item in self.search('salata')['results']], [self.salad.id, self.soup.id])
+        self.assertEqual([item['id'] for item in self.search('SALÁTA')['results']], [self.salad.id, self.soup.id])
+        self.assertEqual([item['id'] for item in self.search('sushi valog')['results']], [self.sushi.id])
+        self.assertEqual(self.search('sushi gulyás')['results'], [])
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.search('zöldség', limit=1)
+        self.assertEqual(len(queries), 2)  # COUNT and the page with its restaurants
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['results'][0]['restaurant'], {'id': self.restaurant1.id, 'name': "Kereső Étterem", 'address': "Kereső Cím"})
+
+    def test_index_follows_changes(self):
+        """
+        Tests that renamed, deleted and bulk-created menu items are reflected in the search results.
+        """
+        self.salad.name = "Cézár"
+        self.salad.save()
+        self.assertEqual([item['id'] for item in self.search('cezar')['results']], [self.salad.id])
+        self.soup.delete()
+        self.assertEqual(self.search('salata')['results'], [])
+        MenuItem.objects.bulk_create([MenuItem(restaurant=self.restaurant2, name="Rántott Sajt", price=Decimal('9.00'))])
+        self.assertEqual(self.search('rantott')['count'], 1)
+
+    def test_like_fallback(self):
+        """
+        Tests the search without the full-text index: case-insensitive substring matches, name matches first.
+        """
+        with mock.patch('api.search.has_fts_table', return_value=False):
+            self.assertEqual([item['id'] for item in self.search('Saláta')['results']], [self.salad.id, self.soup.id])
+            self.assertEqual([item['id'] for item in self.search('sushi')['results']], [self.sushi.id])
+
+    def test_query_without_words_is_rejected(self):
+        """
+        Tests that a missing query or one without any words returns 400 Bad Request.
+        """
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {'q': '" * -'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('q', response.json())
+
+class NearbyRestaurantsTests(TestCase):
+    """
+    Tests for the geocell index and the nearby restaurants endpoint.
+    """
+    def setUp(self):
+        """
+        Sets up the test environment with restaurants around Budapest's centre, one in Debrecen and one without a location.
+        """
+        self.client = APIClient()
+        self.centre = (47.4979, 19.0402)
+        self.near = Restaurant.objects.create(name="Közeli Étterem", address="Közeli Cím", latitude=47.4990, longitude=19.0410)
+        self.farther = Restaurant.objects.create(name="Távolabbi Étterem", address="Távolabbi Cím", latitude=47.5100, longitude=19.0600)
+        self.debrecen = Restaurant.objects.create(name="Debreceni Étterem", address="Debreceni Cím", latitude=47.5316, longitude=21.6273)
+        self.unlocated = Restaurant.objects.create(name="Hely Nélküli Étterem", address="Ismeretlen Cím")
+        self.url = reverse('restaurant-nearby')
+
+    def test_geocell_ranges_cover_the_circle(self):
+        """
+        Tests that every point within the radius has a geocell inside the ranges scanned for the circle,
+        including circles crossing the antimeridian.
+        """
+        rng = random.Random(7)
+        for latitude, longitude, radius in [(47.4979, 19.0402, 2), (-33.86, 151.21, 0.3), (64.1, 179.99, 10), (0, 0, 50)]:
+            ranges = geocell_ranges(latitude, longitude, radius)
+            for _ in range(300):
+                point_latitude = latitude + rng.uniform(-1, 1) * radius / 111
+                point_longitude = (longitude + rng.uniform(-1, 1) * radius / 111 / math.cos(math.radians(latitude)) + 180) % 360 - 180
+                if distance_km(latitude, longitude, point_latitude, point_longitude) <= radius:
+                    geocell = encode_geocell(point_latitude, point_longitude)
+                    self.assertTrue(any(low <= geocell < high for low, high in ranges), (latitude, longitude, point_latitude, point_longitude))
+
+    def test_nearby_restaurants_are_sorted_by_distance(self):
+        """
+        Tests that the endpoint returns the restaurants within the radius nearest first with their distances,
+        widening the search until the limit is reached, and never returns restaurants without a location.
+        """
+        response = self.client.get(self.url, {'lat': self.centre[0], 'lng': self.centre[1], 'radius': 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual([restaurant['id'] for restaurant in data], [self.near.id, self.farther.id])
+        self.assertAlmostEqual(data[0]['distance_km'], distance_km(*self.centre, 47.4990, 19.0410), places=6)
+        self.assertEqual(data[0]['latitude'], 47.4990)
+
+        response = self.client.get(self.url, {'lat': self.centre[0], 'lng': self.centre[1], 'radius': 50, 'limit': 1})
+        self.assertEqual([restaurant['id'] for restaurant in response.json()], [self.near.id])
+        response = self.client.get(self.url, {'lat': 47.53, 'lng': 21.62, 'radius': 0.2})
+        self.assertEqual(response.json(), [])
+
+    def test_moved_restaurant_is_found_at_its_new_location(self):
+        """
+        Tests that saving new coordinates updates the geocell.
+        """
+        self.debrecen.latitude, self.debrecen.longitude = 47.4980, 19.0403
+        self.debrecen.save()
+        self.assertEqual(self.debrecen.geocell, encode_geocell(47.4980, 19.0403))
+        response = self.client.get(self.url, {'lat': self.centre[0], 'lng': self.centre[1], 'limit': 1})
+        self.assertEqual(response.json()[0]['id'], self.debrecen.id)
+
+    def test_invalid_coordinates_are_rejected(self):
+        """
+        Tests that missing or out-of-range coordinates and radii return 400 Bad Request.
+        """
+        for params in [{'lat': 47.5}, {'lat': 91, 'lng': 19}, {'lat': 47.5, 'lng': 19, 'radius': 500}]:
+            self.assertEqual(self.client.get(self.url, params).status_code, status.HTTP_400_BAD_REQUEST)
+
+class OrderArchiveTests(TestCase):
+    """
+    Tests for the archive_orders management command and the read path of archived orders.
+    """
+    def setUp(self):
+        """
+        Sets up the test environment with a customer's old delivered order, an old undelivered order
+        and a recent delivered order, each with items.
+        """
+        self.user = User.objects.create_user(username='archive', password='archivepassword')
+        self.restaurant = Restaurant.objects.create(name="Archív Étterem", address="Archív Cím")
+        menu_item = MenuItem.objects.create(restaurant=self.restaurant, name="Gulyás", price=Decimal('6.50'))
+        self.orders = {}
+        for name, order_status, age in [('old', 'delivered', 120), ('stuck', 'ready', 120), ('recent', 'delivered', 10)]:
+            order = Order.objects.create(customer=self.user, restaurant=self.restaurant, status=order_status, total_amount=Decimal('13.00'), item_count=2)
+            OrderItem.objects.create(order=order, menu_item=menu_item, quantity=2, price=menu_item.price, special_instructions="Csípősen")
+            Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=age))
+            self.orders[name] = order
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_command_moves_old_delivered_orders_with_their_items(self):
+        """
+        Tests that only delivered orders older than the given days are moved, keeping their IDs and columns,
+        and that the command reports the moved rows and their rate.
+        """
+        old = self.orders['old']
+        detail_url = reverse('customer-order-detail', args=[old.id])
+        before = self.client.get(detail_url).json()
+        output = StringIO()
+        call_command('archive_orders', days=90, batch_size=1, stdout=output)
+
+        self.assertEqual(set(Order.objects.values_list('id', flat=True)), {self.orders['stuck'].id, self.orders['recent'].id})
+        self.assertFalse(OrderItem.objects.filter(order_id=old.id).exists())
+        archived = ArchivedOrder.objects.get()
+        self.assertEqual((archived.id, archived.status, archived.total_amount, archived.item_count), (old.id, 'delivered', Decimal('13.00'), 2))
+        self.assertEqual(list(ArchivedOrderItem.objects.values_list('order_id', 'quantity', 'price')), [(old.id, 2, Decimal('6.50'))])
+        self.assertIn('Archived 1 orders and 1 order items in', output.getvalue())
+        self.assertIn('rows/s', output.getvalue())
+        # Archived orders are served transparently, with the same representation
+        self.assertEqual(self.client.get(detail_url).json(), before)
+
+    def test_archived_orders_are_only_served_to_their_customer(self):
+        """
+        Tests that the synchronous and asynchronous detail endpoints find archived orders of the user only.
+        """
+        call_command('archive_orders', days=90, stdout=StringIO())
+        old_id = self.orders['old'].id
+        self.assertEqual(self.client.get(reverse('customer-order-detail', args=[old_id])).json()['status'], 'delivered')
+        response = async_to_sync(AsyncClient().get)(
+            reverse('async-customer-order-detail', args=[old_id]), headers={'Authorization': 'Token ' + self.user.auth_token.key},
+        )
+        self.assertEqual(response.json()['id'], old_id)
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username='idegen', password='idegenpassword'))
+        self.assertEqual(other.get(reverse('customer-order-detail', args=[old_id])).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_archive_has_every_order_column(self):
+        """
+        Tests that the archive tables have every column of the live tables, which the archiving copies by name.
+        """
+        for live, archive in [(Order, ArchivedOrder), (OrderItem, ArchivedOrderItem)]:
+            live_columns = {field.column for field in live._meta.concrete_fields}
+            self.assertLessEqual(live_columns, {field.column for field in archive._meta.concrete_fields})
+
+class SalesRollupTests(TestCase):
+    """
+    Tests for the incremental daily sales rollup and the sales report endpoints.
+    """
+    def setUp(self):
+        """
+        Sets up the test environment with two restaurants and orders on two days, one of them archived.
+        """
+        self.user = User.objects.create_user(username='rollup', password='rolluppassword')
+        self.staff = User.objects.create_user(username='riport', password='riportpassword', is_staff=True)
+        self.restaurant = Restaurant.objects.create(name="Összesítő Étterem", address="Összesítő Cím")
+        self.other_restaurant = Restaurant.objects.create(name="Másik Étterem", address="Másik Cím")
+        self.soup = MenuItem.objects.create(restaurant=self.restaurant, name="Leves", price=Decimal('4.50'))
+        self.main = MenuItem.objects.create(restaurant=self.restaurant, name="Főétel", price=Decimal('12.00'))
+        self.pizza = MenuItem.objects.create(restaurant=self.other_restaurant, name="Pizza", price=Decimal('9.00'))
+        self.day = timezone.now().replace(hour=12) - timedelta(days=100)
+        self.create_order(self.restaurant, [(self.soup, 2, '4.00'), (self.main, 1, '12.00')], self.day, status='delivered')
+        self.create_order(self.restaurant, [(self.soup, 1, '4.50')], self.day)
+        self.create_order(self.other_restaurant, [(self.pizza, 3, '9.00')], self.day + timedelta(days=1))
+        call_command('archive_orders', days=90, stdout=StringIO())
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def create_order(self, restaurant, items, created_at, status='received'):
+        """
+        Creates an order with (menu item, quantity, price) items at the given time.
+        """
+        order = Order.objects.create(customer=self.user, restaurant=restaurant, status=status)
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, menu_item=menu_item, quantity=quantity, price=Decimal(price)) for menu_item, quantity, price in items
+        )
+        Order.objects.filter(pk=order.pk).update(created_at=created_at)
+        return order
+
+    def sales(self):
+        return sorted(DailyMenuItemSales.objects.values_list('restaurant_id', 'day', 'menu_item_id', 'quantity', 'revenue'))
+
+    def test_command_rolls_up_live_and_archived_items_once(self):
+        """
+        Tests that the command sums live and archived items per restaurant, day and menu item using the item
+        prices, advances the high-water mark, and only adds newer items on the next run.
+        """
+        day, next_day = self.day.date(), (self.day + timedelta(days=1)).date()
+        call_command('roll_up_sales', batch_size=2, settle_seconds=0, stdout=StringIO())
+        self.assertEqual(self.sales(), [
+            (self.restaurant.id, day, self.soup.id, 3, Decimal('12.50')),
+            (self.restaurant.id, day, self.main.id, 1, Decimal('12.00')),
+            (self.other_restaurant.id, next_day, self.pizza.id, 3, Decimal('27.00')),
+        ])
+        self.assertEqual(SalesRollupState.objects.get().last_order_item_id, OrderItem.objects.aggregate(last=Max('id'))['last'])
+
+        self.create_order(self.restaurant, [(self.soup, 1, '5.00')], self.day)
+        recent = self.create_order(self.restaurant, [(self.main, 1, '12.00')], timezone.now())
+        output = StringIO()
+        call_command('roll_up_sales', stdout=output)
+        self.assertIn('Rolled up 1 order items in', output.getvalue())
+        self.assertEqual(DailyMenuItemSales.objects.get(menu_item=self.soup).quantity, 4)
+        # The order created within the settle time is left to the next run
+        self.assertFalse(DailyMenuItemSales.objects.filter(day=recent.created_at.date()).exists())
+
+    def test_order_creation_can_update_the_rollup(self):
+        """
+        Tests that with API_SALES_ROLLUP_ON_CREATE a new order is rolled up at once, together with the backlog,
+        and that the command does not count it again.
+        """
+        customer = APIClient()
+        customer.force_authenticate(self.user)
+        with override_settings(API_SALES_ROLLUP_ON_CREATE=True):
+            response = customer.post(reverse('create-order'), {
+                'restaurantId': self.restaurant.id, 'items': [{'menuItemId': self.main.id, 'quantity': 2}],
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        today = timezone.now().date()
+        self.assertEqual(DailyMenuItemSales.objects.get(day=today).revenue, Decimal('24.00'))
+        self.assertEqual(DailyMenuItemSales.objects.count(), 4)
+        call_command('roll_up_sales', settle_seconds=0, stdout=StringIO())
+        self.assertEqual(DailyMenuItemSales.objects.get(day=today).quantity, 2)
+
+    def test_reports_are_answered_from_the_rollup(self):
+        """
+        Tests the daily sales and top menu items reports, that they read no order tables,
+        and that they require a staff user and a valid period.
+        """
+        call_command('roll_up_sales', settle_seconds=0, stdout=StringIO())
+        period = {'start': self.day.date().isoformat(), 'end': (self.day + timedelta(days=6)).date().isoformat()}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('daily-sales-report'), period)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any('api_order' in query['sql'] or 'api_archived' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(response.json(), [
+            {'restaurant': self.restaurant.id, 'day': period['start'], 'quantity': 4, 'revenue': '24.50'},
+            {'restaurant': self.other_restaurant.id, 'day': (self.day + timedelta(days=1)).date().isoformat(), 'quantity': 3, 'revenue': '27.00'},
+        ])
+        response = self.client.get(reverse('daily-sales-report'), {**period, 'restaurant': self.other_restaurant.id})
+        self.assertEqual([row['restaurant'] for row in response.json()], [self.other_restaurant.id])
+
+        response = self.client.get(reverse('top-menu-items-report'), {**period, 'by': 'quantity', 'limit': 2})
+        self.assertEqual([(row['name'], row['quantity']) for row in response.json()], [("Leves", 3), ("Pizza", 3)])
+        response = self.client.get(reverse('top-menu-items-report'), period)
+        self.assertEqual([row['name'] for row in response.json()], ["Pizza", "Leves", "Főétel"])
+
+        invalid_periods = [{'start': period['end'], 'end': period['start']}, {'start': '2020-01-01', 'end': '2021-06-01'}, {'start': period['start']}]
+        for params in invalid_periods:
+            self.assertEqual(self.client.get(reverse('daily-sales-report'), params).status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(reverse('daily-sales-report'), period).status_code, status.HTTP_403_FORBIDDEN)
+
+class SalesRollupArchiveTests(TransactionTestCase):
+    """
+    Tests that archiving and rolling up sales do not interleave.
+    Runs in real transactions, so the rollup and the archiving run in threads with their own connections.
+    """
+    def setUp(self):
+        """
+        Sets up the test environment with delivered orders old enough to be archived.
+        """
+        user = User.objects.create_user(username='archiver', password='archiverpassword')
+        restaurant = Restaurant.objects.create(name="Raktár Étterem", address="Raktár Cím")
+        self.menu_item = MenuItem.objects.create(restaurant=restaurant, name="Gulyás", price=Decimal('6.00'))
+        for quantity in range(1, 6):
+            order = Order.objects.create(customer=user, restaurant=restaurant, status='delivered')
+            OrderItem.objects.create(order=order, menu_item=self.menu_item, quantity=quantity, price=Decimal('6.00'))
+        Order.objects.update(created_at=timezone.now() - timedelta(days=100))
+        self.cutoff = timezone.now() - timedelta(days=90)
+
+    def test_archiving_between_the_reads_of_a_rollup_batch(self):
+        """
+        Tests that an archive batch started while a rollup batch is between its reads of the live and the archive
+        items waits for the rollup, so every item is counted exactly once.
+        """
+        between_reads = threading.Event()
+
+        class PausingItemModels(tuple):
+            # Pauses between the reads of the live and the archive items, giving the archiver time to run
+            def __iter__(self):
+                live, archived = tuple.__iter__(self)
+                yield live
+                between_reads.set()
+                time.sleep(0.3)
+                yield archived
+
+        def roll_up():
+            try:
+                with mock.patch('api.rollups.ITEM_MODELS', PausingItemModels((OrderItem, ArchivedOrderItem))):
+                    roll_up_sales()
+            finally:
+                connection.close()
+
+        def archive():
+            try:
+                between_reads.wait(timeout=5)
+                archive_batch(self.cutoff)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=roll_up), threading.Thread(target=archive)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(ArchivedOrder.objects.count(), 5)
+        self.assertFalse(Order.objects.exists())
+        sales = DailyMenuItemSales.objects.get(menu_item=self.menu_item)
+        self.assertEqual((sales.quantity, sales.revenue), (15, Decimal('90.00')))
+
+    def test_archive_batch_locks_the_rollup_state(self):
+        """
+        Tests that an archive batch locks the rollup state before it selects and moves the orders.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            archive_batch(self.cutoff)
+        statements = [query['sql'] for query in queries.captured_queries]
+        lock = next(index for index, sql in enumerate(statements) if 'api_salesrollupstate' in sql)
+        first_insert = next(index for index, sql in enumerate(statements) if sql.startswith('INSERT INTO "api_archivedorder"'))
+        self.assertLess(lock, first_insert)
@@ -9,15 +9,29 @@ urlpatterns = [
 
     # Restaurant endpoints
     path('restaurants/', views.RestaurantListView.as_view(), name='restaurant-list'),
+    path('restaurants/nearby/', views.NearbyRestaurantsView.as_view(), name='restaurant-nearby'),
     path('restaurants/<int:pk>/', views.RestaurantDetailView.as_view(), name='restaurant-detail'),
     path('restaurants/<int:id>/menu/', views.RestaurantMenuView.as_view(), name='restaurant-menu'),
+    path('menu-items/search/', views.MenuItemSearchView.as_view(), name='menu-item-search'),
 
     # Order endpoints (customer)
     path('orders/', views.CreateOrderView.as_view(), name='create-order'),
     path('orders/<int:pk>/', views.CustomerOrderDetailView.as_view(), name='customer-order-detail'),
+    path('orders/<int:pk>/events/', views.order_status_events, name='order-status-events'),
 
     # Order endpoints (restaurant - assuming users are associated with restaurants)
     path('restaurants/orders/', views.OrderListView.as_view(), name='restaurant-order-list'),
+    path('restaurants/orders/status/', views.BulkUpdateOrderStatusView.as_view(), name='bulk-update-order-status'),
     path('restaurants/orders/<int:pk>/', views.OrderDetailView.as_view(), name='restaurant-order-detail'),
     path('restaurants/orders/<int:pk>/update/', views.UpdateOrderStatusView.as_view(), name='update-order-status'),
+
+    # Sales reports (staff), answered from the daily sales rollup
+    path('reports/sales/daily/', views.DailySalesReportView.as_view(), name='daily-sales-report'),
+    path('reports/sales/top-menu-items/', views.TopMenuItemsReportView.as_view(), name='top-menu-items-report'),
+
+    # Asynchronous read endpoints, meant to be served by the ASGI application
+    path('async/restaurants/', views.async_restaurant_list, name='async-restaurant-list'),
+    path('async/restaurants/<int:pk>/', views.async_restaurant_detail, name='async-restaurant-detail'),
+    path('async/restaurants/<int:id>/menu/', views.async_restaurant_menu, name='async-restaurant-menu'),
+    path('async/orders/<int:pk>/', views.async_customer_order_detail, name='async-customer-order-detail'),
 ]
\ No newline at end of file
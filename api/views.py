@@ -1,18 +1,46 @@
+import asyncio
+import functools
+import itertools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404
-from rest_framework import generics, permissions, status, serializers
+from django.db.models import Max, Sum
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import exceptions, generics, permissions, status, serializers
+from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
 from django.contrib.auth import authenticate
 
 from .serializers import (
     RegistrationSerializer, LoginSerializer, UserSerializer,
     RestaurantSerializer, RestaurantDetailSerializer, MenuItemSerializer,
-    OrderSerializer, OrderItemSerializer, CreateOrderSerializer
+    OrderSerializer, OrderItemSerializer, CreateOrderSerializer, OrderFilterSerializer, BulkOrderStatusSerializer,
+    OrderStatusResultSerializer, OrderStatusUpdateSerializer, OrderConflictSerializer, get_menu_payload,
+    MenuItemSearchQuerySerializer, MenuItemSearchResultSerializer, NearbyRestaurantSerializer, NearbyRestaurantsQuerySerializer,
+    SalesReportQuerySerializer, TopMenuItemsQuerySerializer, DailyRestaurantSalesSerializer, TopMenuItemSerializer,
 )
+from .cache import RESTAURANT_LIST_SCOPE, get_or_build, restaurant_scope
+from .conditional import ConditionalGetMixin
+from .fast_serializers import get_flat_serializer
+from .events import format_event, get_order_event_broker
+from .metrics import render_prometheus
+from .geo import nearby_restaurants
 
 from rest_framework.decorators import api_view
+from drf_spectacular.utils import extend_schema, inline_serializer
+
+from .models import ArchivedOrder, DailyMenuItemSales, Order, OrderItem, Restaurant, MenuItem
+from .pagination import MenuSearchPagination, OrderCursorPagination, RestaurantCursorPagination
 
-from .models import Order, OrderItem, Restaurant, MenuItem
+# Seconds between keep-alive comments on idle order event streams
+ORDER_EVENTS_KEEPALIVE = getattr(settings, 'ORDER_EVENTS_KEEPALIVE', 15)
+# Rows fetched from the database cursor and serialized at a time by streaming list responses
+API_STREAM_CHUNK_SIZE = getattr(settings, 'API_STREAM_CHUNK_SIZE', 2000)
 
 class RegistrationView(generics.GenericAPIView):
     """
@@ -26,14 +54,13 @@ class RegistrationView(generics.GenericAPIView):
         """
         Handles the POST request for user registration.
         Validates the registration data and creates a new user.
-        Upon successful registration, it generates and returns an authentication token.
-        Returns a 400 Bad Request if the registration data is invalid.
+        Upon successful registration, it returns the authentication token created together with the user.
+        Returns a 400 Bad Request if the registration data is invalid or the username or email is already taken.
         """
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            token, _ = Token.objects.get_or_create(user=user)
-            return Response({'token': token.key}, status=status.HTTP_201_CREATED)
+            return Response({'token': user.auth_token.key}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class LoginView(generics.GenericAPIView):
@@ -48,7 +75,8 @@ class LoginView(generics.GenericAPIView):
         """
         Handles the POST request for user login.
         Authenticates the user based on the provided username and password.
-        Upon successful authentication, it generates or retrieves the user's authentication token.
+        Upon successful authentication, it retrieves the user's authentication token with a single query,
+        creating it only for users that predate automatic token creation.
         Returns a 200 OK with the token, a 401 Unauthorized for invalid credentials,
         or a 400 Bad Request for invalid input data.
         """
@@ -56,7 +84,10 @@ class LoginView(generics.GenericAPIView):
         if serializer.is_valid():
             user = authenticate(username=serializer.validated_data['username'], password=serializer.validated_data['password'])
             if user:
-                token, _ = Token.objects.get_or_create(user=user)
+                try:
+                    token = user.auth_token
+                except Token.DoesNotExist:
+                    token = Token.objects.create(user=user)
                 return Response({'token': token.key}, status=status.HTTP_200_OK)
             return Response({'error': 'Invalid credentials.'}, status=status.HTTP_401_UNAUTHORIZED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -75,46 +106,199 @@ class WhoAmIView(generics.RetrieveAPIView):
         """
         return self.request.user
 
-class RestaurantListView(generics.ListAPIView):
+class FastSerializationMixin:
+    """
+    Serves list responses through the FlatSerializer compiled from the view's serializer class
+    when the API_FAST_SERIALIZATION setting is enabled, instead of instantiating model objects and
+    running the ModelSerializer. Produces the same JSON, paginated the same way.
+    """
+    def list(self, request, *args, **kwargs):
+        if not getattr(settings, 'API_FAST_SERIALIZATION', False):
+            return super().list(request, *args, **kwargs)
+        flat_serializer = get_flat_serializer(self.get_serializer_class())
+        rows = flat_serializer.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(flat_serializer.serialize(page))
+        return Response(flat_serializer.serialize(rows))
+
+class StreamingListMixin:
+    """
+    Adds a streaming mode to a list view for exports of the whole (filtered) result set.
+    With `?stream=json` the response is a JSON array and with `?stream=ndjson` it is newline-delimited JSON,
+    in the pagination ordering and without pagination. Rows are read from a server-side cursor with
+    QuerySet.iterator() and serialized and sent chunk by chunk, so memory use is bounded by the chunk size
+    instead of the size of the result set.
+    """
+    stream_content_types = {'json': 'application/json', 'ndjson': 'application/x-ndjson'}
+
+    def list(self, request, *args, **kwargs):
+        stream_format = request.query_params.get('stream')
+        if stream_format is None:
+            return super().list(request, *args, **kwargs)
+        if stream_format not in self.stream_content_types:
+            raise serializers.ValidationError({'stream': f'Must be one of: {", ".join(self.stream_content_types)}.'})
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = getattr(self.pagination_class, 'ordering', None)
+        if ordering:
+            queryset = queryset.order_by(*([ordering] if isinstance(ordering, str) else ordering))
+        chunks = self.iter_serialized_chunks(queryset)
+        content = self.iter_ndjson(chunks) if stream_format == 'ndjson' else self.iter_json_array(chunks)
+        return StreamingHttpResponse(content, content_type=self.stream_content_types[stream_format])
+
+    def iter_serialized_chunks(self, queryset):
+        """
+        Yields the representation of the queryset as lists of at most API_STREAM_CHUNK_SIZE items.
+        Uses the flat serializer when API_FAST_SERIALIZATION is enabled, otherwise the view's serializer;
+        prefetched relations are loaded once per chunk.
+        """
+        if getattr(settings, 'API_FAST_SERIALIZATION', False):
+            flat_serializer = get_flat_serializer(self.get_serializer_class())
+            rows = flat_serializer.values(queryset).iterator(chunk_size=API_STREAM_CHUNK_SIZE)
+            serialize = flat_serializer.serialize
+        else:
+            rows = queryset.iterator(chunk_size=API_STREAM_CHUNK_SIZE)
+            serialize = lambda chunk: self.get_serializer(chunk, many=True).data
+        while chunk := list(itertools.islice(rows, API_STREAM_CHUNK_SIZE)):
+            yield serialize(chunk)
+
+    def get_stream_encoder(self):
+        """
+        Returns a JSON encoder producing the same output as the JSONRenderer with the default API settings.
+        """
+        return JSONEncoder(ensure_ascii=not api_settings.UNICODE_JSON, separators=(',', ':') if api_settings.COMPACT_JSON else None)
+
+    def iter_json_array(self, chunks):
+        encoder = self.get_stream_encoder()
+        yield '['
+        separator = ''
+        for chunk in chunks:
+            yield separator + ','.join(encoder.encode(item) for item in chunk)
+            separator = ','
+        yield ']'
+
+    def iter_ndjson(self, chunks):
+        encoder = self.get_stream_encoder()
+        for chunk in chunks:
+            yield ''.join(encoder.encode(item) + '\n' for item in chunk)
+
+class RestaurantConditionalGetMixin(ConditionalGetMixin):
+    """
+    Conditional GET support for the views of a single restaurant and its menu.
+    The validators change whenever the restaurant or any of its menu items is saved or deleted.
+    """
+    restaurant_url_kwarg = 'pk'
+
+    def get_cache_scope(self):
+        return restaurant_scope(self.kwargs[self.restaurant_url_kwarg])
+
+    def resource_exists(self):
+        return Restaurant.objects.filter(pk=self.kwargs[self.restaurant_url_kwarg]).exists()
+
+    def get_last_modified(self):
+        """
+        Returns the latest modification time of the restaurant and its menu items, or None if it does not exist.
+        """
+        row = Restaurant.objects.filter(pk=self.kwargs[self.restaurant_url_kwarg]).annotate(
+            menu_updated_at=Max('menu__updated_at'),
+        ).values_list('updated_at', 'menu_updated_at').first()
+        if row is None:
+            return None
+        return max(value for value in row if value is not None)
+
+class RestaurantListView(ConditionalGetMixin, StreamingListMixin, FastSerializationMixin, generics.ListAPIView):
     """
     API endpoint to list all restaurants.
     Allows any authenticated user to view the list of restaurants.
+    Results are cursor-paginated on the restaurant ID, or streamed in full with `?stream=json|ndjson`.
+    Supports conditional GET requests; the validators change whenever any restaurant is saved or deleted.
     """
     queryset = Restaurant.objects.all()
     serializer_class = RestaurantSerializer
+    pagination_class = RestaurantCursorPagination
+
+    def get_cache_scope(self):
+        return RESTAURANT_LIST_SCOPE
+
+    def get_last_modified(self):
+        """
+        Returns the latest modification time of any restaurant.
+        """
+        return Restaurant.objects.aggregate(latest=Max('updated_at'))['latest']
 
-class RestaurantDetailView(generics.RetrieveAPIView):
+@extend_schema(parameters=[NearbyRestaurantsQuerySerializer])
+class NearbyRestaurantsView(generics.ListAPIView):
+    """
+    API endpoint to list the restaurants within a radius of a point, nearest first, with their distances.
+    Candidates are selected with range scans of the geocell index and then filtered by their exact distance;
+    restaurants without coordinates are never returned. Returns a 400 Bad Request for invalid coordinates.
+    """
+    serializer_class = NearbyRestaurantSerializer
+    pagination_class = None
+
+    def get_queryset(self):
+        """
+        Overrides get_queryset to return the nearest restaurants as a list.
+        """
+        query = NearbyRestaurantsQuerySerializer(data=self.request.query_params)
+        query.is_valid(raise_exception=True)
+        point = query.validated_data
+        return nearby_restaurants(point['lat'], point['lng'], point['radius'], point['limit'])
+
+class RestaurantDetailView(RestaurantConditionalGetMixin, generics.RetrieveAPIView):
     """
     API endpoint to retrieve details of a specific restaurant.
     Allows any authenticated user to view the details of a restaurant.
+    Supports conditional GET requests.
     """
     queryset = Restaurant.objects.all()
     serializer_class = RestaurantDetailSerializer
 
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Serves the restaurant details from the versioned restaurant cache.
+        The database is only queried when the details changed since they were last rendered.
+        """
+        data = get_or_build(
+            restaurant_scope(self.kwargs['pk']), 'detail',
+            lambda: dict(self.get_serializer(self.get_object()).data),
+        )
+        return Response(data)
+
 @api_view(['GET'])
 def restaurant_menu(request, id):
     """
     API endpoint to retrieve the menu of a specific restaurant.
     Allows any authenticated user to view the menu.
     Uses a function-based view with the @api_view decorator.
+    The menu is served from the versioned menu cache.
     """
     try:
-        restaurant = Restaurant.objects.get(pk=id)
+        data = get_menu_payload(id, lambda: Restaurant.objects.get(pk=id).menu.all())
     except Restaurant.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
+    return Response(data)
 
-    menu_items = restaurant.menu.all()
-    serializer = MenuItemSerializer(menu_items, many=True)
-    return Response(serializer.data)
-
-class OrderListView(generics.ListAPIView):
+class OrderListView(StreamingListMixin, FastSerializationMixin, generics.ListAPIView):
     """
     API endpoint to list all orders.
     Requires user authentication to view the list of orders.
+    Results are cursor-paginated on (created_at, id) and can be filtered by restaurant, status and creation time.
+    The filtered orders can also be exported in full with `?stream=json|ndjson`.
     """
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = OrderSerializer
-    queryset = Order.objects.all() # Reverted to fetching all orders
+    queryset = OrderSerializer.setup_eager_loading(Order.objects.all())
+    pagination_class = OrderCursorPagination
+
+    def get_queryset(self):
+        """
+        Overrides get_queryset to apply the filters given in the query string.
+        Returns a 400 Bad Request if a filter value is invalid.
+        """
+        filters = OrderFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        return filters.filter_queryset(super().get_queryset())
 
 class OrderDetailView(generics.RetrieveAPIView):
     """
@@ -123,7 +307,7 @@ class OrderDetailView(generics.RetrieveAPIView):
     """
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = OrderSerializer
-    queryset = Order.objects.all() # Reverted to fetching all orders
+    queryset = OrderSerializer.setup_eager_loading(Order.objects.all())
 
 class CreateOrderView(generics.CreateAPIView):
     """
@@ -145,28 +329,54 @@ class UpdateOrderStatusView(generics.UpdateAPIView):
     API endpoint to update the status of a specific order.
     Requires user authentication to update the order status.
     Allows only PATCH requests.
+    Only the allowed status transitions are accepted, and concurrent changes of the same order are detected
+    with the order's version instead of row locks: the losing request gets a 409 Conflict.
+    Subscribers of the order's event stream are notified once the change is committed.
     """
     permission_classes = [permissions.IsAuthenticated] # Authentication is required
-    queryset = Order.objects.all()
-    serializer_class = OrderSerializer
+    queryset = OrderSerializer.setup_eager_loading(Order.objects.all())
+    serializer_class = OrderStatusUpdateSerializer
     http_method_names = ['patch']
 
+    @extend_schema(responses={200: OrderSerializer, 409: OrderConflictSerializer})
     def patch(self, request, *args, **kwargs):
         """
         Handles the PATCH request to update the order status.
-        Retrieves the order instance, serializes the update data, validates it,
-        and saves the new status to the order.
+        Retrieves the order instance, validates the new status and applies it with a single conditional UPDATE.
+        Returns the updated order, a 400 Bad Request for an unknown status, or a 409 Conflict with the current
+        status and version if the transition is not allowed or the order was changed by another request.
         """
-        partial = True
         instance = self.get_object()
-        serializer = self.get_serializer(instance, data=request.data, partial=partial)
+        serializer = self.get_serializer(instance, data=request.data)
+        serializer.is_valid(raise_exception=True)
+        order = serializer.save()
+        return Response(OrderSerializer(order).data)
+
+class BulkUpdateOrderStatusView(generics.GenericAPIView):
+    """
+    API endpoint to update the status of many orders at once, e.g. when the kitchen marks a batch of orders ready.
+    Requires user authentication.
+    Each change must follow the allowed status transitions; the valid changes are applied with one UPDATE query
+    per previous and target status and a compact result is returned for every order instead of the full order bodies.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = BulkOrderStatusSerializer
+
+    @extend_schema(responses=inline_serializer('BulkOrderStatusResults', {'results': OrderStatusResultSerializer(many=True)}))
+    def patch(self, request):
+        """
+        Handles the PATCH request with the list of status changes.
+        Returns a 200 OK with the per-order results, or a 400 Bad Request if the list itself is invalid.
+        """
+        serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save(status=request.data.get('status'))
-        return Response(serializer.data)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
 class CustomerOrderDetailView(generics.RetrieveAPIView):
     """
     API endpoint for an authenticated customer to retrieve details of their own specific order.
+    Orders moved to the archive tables by the archive_orders command are served the same way.
     """
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = OrderSerializer
@@ -175,14 +385,96 @@ class CustomerOrderDetailView(generics.RetrieveAPIView):
         """
         Overrides get_queryset to only return orders associated with the currently authenticated user.
         """
-        return Order.objects.filter(customer=self.request.user)
+        return OrderSerializer.setup_eager_loading(Order.objects.filter(customer=self.request.user))
 
-class RestaurantMenuView(generics.ListAPIView):
+    def get_object(self):
+        """
+        Overrides get_object to look the order up in the archived orders of the user when it is not a live order.
+        An order is moved in a single transaction, so it is always found in one of the two tables.
+        """
+        try:
+            return super().get_object()
+        except Http404:
+            archived_orders = OrderSerializer.setup_eager_loading(ArchivedOrder.objects.filter(customer=self.request.user))
+            return get_object_or_404(archived_orders, pk=self.kwargs['pk'])
+
+@extend_schema(parameters=[MenuItemSearchQuerySerializer])
+class MenuItemSearchView(generics.ListAPIView):
+    """
+    API endpoint to search the menu items of all restaurants by name and description.
+    Accents and case are ignored on SQLite, where the search uses the full-text index; `q=salata` finds "Saláta".
+    Results are ranked by relevance and paginated with `limit` and `offset`; each result includes its restaurant,
+    which is joined in the same query. Returns a 400 Bad Request if `q` contains no words.
+    """
+    serializer_class = MenuItemSearchResultSerializer
+    pagination_class = MenuSearchPagination
+
+    def get_queryset(self):
+        """
+        Overrides get_queryset to return the ranked matches of the query.
+        """
+        query = MenuItemSearchQuerySerializer(data=self.request.query_params)
+        query.is_valid(raise_exception=True)
+        return query.filter_queryset(MenuItem.objects.select_related('restaurant'))
+
+@extend_schema(parameters=[SalesReportQuerySerializer])
+class DailySalesReportView(generics.ListAPIView):
+    """
+    API endpoint reporting the quantity sold and the revenue of each restaurant per day, earliest day first.
+    Answered from the daily sales rollup, so the cost depends on the length of the period and the size of the menus,
+    not on the number of orders; orders are included once `manage.py roll_up_sales` has processed them.
+    Requires a staff user. Returns a 400 Bad Request for an invalid period.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    serializer_class = DailyRestaurantSalesSerializer
+    pagination_class = None
+
+    def get_queryset(self):
+        """
+        Overrides get_queryset to sum the daily menu item sales per restaurant and day.
+        """
+        query = SalesReportQuerySerializer(data=self.request.query_params)
+        query.is_valid(raise_exception=True)
+        return query.filter_queryset(DailyMenuItemSales.objects.all()).values('restaurant_id', 'day').annotate(
+            total_quantity=Sum('quantity'), total_revenue=Sum('revenue'),
+        ).order_by('day', 'restaurant_id')
+
+@extend_schema(parameters=[TopMenuItemsQuerySerializer])
+class TopMenuItemsReportView(generics.ListAPIView):
+    """
+    API endpoint reporting the best-selling menu items of a period, by revenue or by quantity sold (`by`).
+    Answered from the daily sales rollup like the daily sales report. Requires a staff user.
+    Returns a 400 Bad Request for an invalid period.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    serializer_class = TopMenuItemSerializer
+    pagination_class = None
+
+    def get_queryset(self):
+        """
+        Overrides get_queryset to sum the daily sales per menu item and return the top `limit` items.
+        """
+        query = TopMenuItemsQuerySerializer(data=self.request.query_params)
+        query.is_valid(raise_exception=True)
+        rows = query.filter_queryset(DailyMenuItemSales.objects.all()).values('menu_item_id', 'menu_item__name', 'restaurant_id').annotate(
+            total_quantity=Sum('quantity'), total_revenue=Sum('revenue'),
+        )
+        return rows.order_by(f"-total_{query.validated_data['by']}", 'menu_item_id')[:query.validated_data['limit']]
+
+class RestaurantMenuView(RestaurantConditionalGetMixin, generics.ListAPIView):
     """
     API endpoint to retrieve the menu items for a specific restaurant.
     Allows any authenticated user to view the menu.
+    The menu is served from the versioned menu cache and supports conditional GET requests.
     """
     serializer_class = MenuItemSerializer
+    restaurant_url_kwarg = 'id'
+
+    def list(self, request, *args, **kwargs):
+        """
+        Returns the cached menu payload, rendering it from the database only on a cache miss.
+        """
+        return Response(get_menu_payload(self.kwargs.get('id'), self.get_queryset))
 
     def get_queryset(self):
         """
@@ -191,4 +483,166 @@ class RestaurantMenuView(generics.ListAPIView):
         """
         restaurant_id = self.kwargs.get('id')
         restaurant = get_object_or_404(Restaurant, pk=restaurant_id)
-        return restaurant.menu.all()
\ No newline at end of file
+        return restaurant.menu.all()
+
+def api_json_response(data, **kwargs):
+    """
+    Returns a JsonResponse encoded like the JSONRenderer with the default API settings,
+    so non-ASCII text is sent as UTF-8 instead of \\u escapes.
+    """
+    kwargs['json_dumps_params'] = {
+        'ensure_ascii': not api_settings.UNICODE_JSON,
+        'separators': (',', ':') if api_settings.COMPACT_JSON else None,
+    }
+    return JsonResponse(data, **kwargs)
+
+def async_api_view(view):
+    """
+    Decorator for the plain Django async views of the API.
+    Restricts the view to GET requests and renders API exceptions and Http404 as JSON error responses,
+    like the DRF views do.
+    """
+    @require_GET
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return api_json_response({'detail': str(exc.detail)}, status=exc.status_code)
+        except Http404 as exc:
+            return api_json_response({'detail': str(exc)}, status=status.HTTP_404_NOT_FOUND)
+    return wrapper
+
+async def aauthenticate_request(request):
+    """
+    Authenticates the request of a plain Django async view with the DEFAULT_AUTHENTICATION_CLASSES of the DRF views,
+    tried in order. Authenticators with an aauthenticate() method (like CachedTokenAuthentication) are awaited,
+    the others run in a worker thread on a DRF request wrapping the Django request.
+    Raises AuthenticationFailed for invalid credentials and NotAuthenticated when none were provided.
+    """
+    for authenticator_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        authenticator = authenticator_class()
+        if hasattr(authenticator, 'aauthenticate'):
+            credentials = await authenticator.aauthenticate(request)
+        else:
+            credentials = await sync_to_async(authenticator.authenticate)(Request(request))
+        if credentials is not None:
+            # Like DRF, expose the authenticated user to the middleware (e.g. RequestRecordingMiddleware)
+            request.user = credentials[0]
+            return credentials[0]
+    raise exceptions.NotAuthenticated()
+
+@async_api_view
+async def async_restaurant_list(request):
+    """
+    Asynchronous variant of RestaurantListView using the async ORM interface.
+    Returns the same cursor-paginated list of restaurants, and accepts the same cursors.
+    """
+    paginator = RestaurantCursorPagination()
+    restaurants = await paginator.apaginate_queryset(Restaurant.objects.all(), request)
+    return api_json_response(paginator.get_async_paginated_data(RestaurantSerializer(restaurants, many=True).data))
+
+@async_api_view
+async def async_restaurant_detail(request, pk):
+    """
+    Asynchronous variant of RestaurantDetailView using the async ORM interface.
+    Returns the details of a restaurant including its menu, or 404 Not Found.
+    """
+    restaurant = await Restaurant.objects.filter(pk=pk).afirst()
+    if restaurant is None:
+        raise Http404('No Restaurant matches the given query.')
+    menu_items = [menu_item async for menu_item in restaurant.menu.all()]
+    data = RestaurantSerializer(restaurant).data
+    data['menu'] = MenuItemSerializer(menu_items, many=True).data
+    return api_json_response(data)
+
+@async_api_view
+async def async_restaurant_menu(request, id):
+    """
+    Asynchronous variant of RestaurantMenuView using the async ORM interface.
+    Returns the menu items of a restaurant, or 404 Not Found.
+    """
+    if not await Restaurant.objects.filter(pk=id).aexists():
+        raise Http404('No Restaurant matches the given query.')
+    menu_items = [menu_item async for menu_item in MenuItem.objects.filter(restaurant_id=id)]
+    return api_json_response(MenuItemSerializer(menu_items, many=True).data, safe=False)
+
+@async_api_view
+async def async_customer_order_detail(request, pk):
+    """
+    Asynchronous variant of CustomerOrderDetailView using the async ORM interface.
+    Returns an order of the authenticated customer, live or archived, with the same eager-loading plan as the synchronous view.
+    Returns 401 Unauthorized without valid credentials and 404 Not Found if the order does not belong to the user.
+    """
+    user = await aauthenticate_request(request)
+    order = await OrderSerializer.setup_eager_loading(Order.objects.filter(pk=pk, customer=user)).afirst()
+    if order is None:
+        order = await OrderSerializer.setup_eager_loading(ArchivedOrder.objects.filter(pk=pk, customer=user)).afirst()
+    if order is None:
+        raise Http404('No Order matches the given query.')
+    return api_json_response(OrderSerializer(order).data)
+
+@async_api_view
+async def order_status_events(request, pk):
+    """
+    Server-sent events stream of the status changes of an authenticated customer's own order.
+    Meant to be served by the ASGI application, where the open connection does not tie up a worker thread.
+    The first event carries the current status; further events are pushed when the status changes and the stream
+    ends once the order is delivered. Comment lines are sent periodically to keep idle connections open; before each
+    one the order is read again, so the stream also ends once the order no longer exists as a live order.
+    Authenticates with the Authorization token header or the session.
+    Returns 401 Unauthorized without valid credentials and 404 Not Found if the order does not belong to the user.
+    """
+    user = await aauthenticate_request(request)
+
+    # Subscribe before reading the current status, so a change committed in between is not missed
+    broker = get_order_event_broker()
+    queue = broker.subscribe(pk)
+    order = await Order.objects.filter(pk=pk, customer=user).values('id', 'status').afirst()
+    if order is None:
+        broker.unsubscribe(pk, queue)
+        raise Http404('No Order matches the given query.')
+
+    async def stream():
+        try:
+            event_id = 1
+            yield format_event(order, event_id)
+            current_status = order['status']
+            while current_status != 'delivered':
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=ORDER_EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    # Close the stream once the order is gone from the live table (deleted or archived), and catch up
+                    # on a change whose event did not reach this process
+                    event = await Order.objects.filter(pk=pk).values('id', 'status').afirst()
+                    if event is None:
+                        break
+                    if event['status'] == current_status:
+                        yield ': keep-alive\n\n'
+                        continue
+                if event['status'] == current_status:
+                    continue
+                event_id += 1
+                current_status = event['status']
+                yield format_event(event, event_id)
+        finally:
+            broker.unsubscribe(pk, queue)
+
+    return StreamingHttpResponse(stream(), content_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # Disables response buffering in nginx-style reverse proxies
+        'X-Accel-Buffering': 'no',
+    })
+
+@require_GET
+def metrics(request):
+    """
+    Serves the request metrics of this worker process in the Prometheus text exposition format.
+    Only clients whose address is listed in the API_METRICS_ALLOWED_IPS setting are served, as the metrics reveal
+    the traffic of every endpoint. Returns 404 Not Found to other clients and when the API_METRICS setting is False.
+    """
+    if not getattr(settings, 'API_METRICS', True):
+        raise Http404('Metrics are disabled.')
+    if request.META.get('REMOTE_ADDR') not in getattr(settings, 'API_METRICS_ALLOWED_IPS', []):
+        raise Http404('Metrics are not served to this address.')
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
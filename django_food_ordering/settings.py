@@ -41,16 +41,24 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'api',
     'drf_spectacular',
+    # Project app config; its ready() hook connects the receivers in signals.py
+    'django_food_ordering',
 ]
 
 MIDDLEWARE = [
+    # First, so the recorded duration covers the whole middleware stack
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Inactive unless API_READ_REPLICAS names a replica
+    'api.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Inactive unless API_REQUEST_RECORD_FILE is set
+    'api.middleware.RequestRecordingMiddleware',
 ]
 
 ROOT_URLCONF = 'django_food_ordering.urls'
@@ -76,13 +84,106 @@ WSGI_APPLICATION = 'django_food_ordering.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# High-concurrency profile of SQLite, applied to every new SQLite connection (an empty dict keeps SQLite's defaults):
+# in WAL mode readers and the writer do not block each other, and writers wait up to busy_timeout ms for the lock
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    # Safe in WAL mode: a power loss may only lose the last transactions, never corrupt the database
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    # Negative values are KiB: a 64 MiB page cache per connection
+    'cache_size': -64 * 1024,
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Runs the SQLITE_PRAGMAS on every new connection
+            'init_command': '; '.join(f'PRAGMA {name} = {value}' for name, value in SQLITE_PRAGMAS.items()),
+        },
+        # Keep connections open between requests (checked before reuse), so the pragmas run once per connection.
+        # This only pays off under WSGI, where a worker thread reuses its connection. Under ASGI a request's
+        # connection is not reused by later requests, so open connections pile up until they expire; the Django
+        # documentation advises CONN_MAX_AGE = 0 when serving the ASGI application.
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        # The test database is a file rather than SQLite's shared-cache in-memory database, so tests running
+        # several threads wait for each other's write locks instead of failing with "database table is locked".
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    },
+    # A read replica: another alias holding a copy of the primary. Reads are only routed to it while it is listed
+    # in API_READ_REPLICAS; until then it names the primary's own file, point NAME at the copy (e.g.
+    # BASE_DIR / 'db_replica.sqlite3') when enabling it
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': '; '.join(f'PRAGMA {name} = {value}' for name, value in SQLITE_PRAGMAS.items()),
+        },
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        # Tests read the replica's rows from the test database of the primary
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = ['api.routers.ReadReplicaRouter']
+
+# Start the transactions writing orders with BEGIN IMMEDIATE on SQLite, see api.sqlite.write_transaction.
+# Not the 'transaction_mode' option, which would make every transaction (also read-only ones) take the write lock
+SQLITE_IMMEDIATE_WRITES = True
+
+# Aliases of the read replicas serving the reads of GET, HEAD and OPTIONS requests (empty: everything uses default)
+API_READ_REPLICAS = []
+
+# Seconds the reads of a user go to the primary after they wrote, so they see their own changes despite replication lag
+API_REPLICA_STICKY_SECONDS = 10
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# The local-memory cache is private to each process; use a shared backend
+# (e.g. Redis or Memcached) when running several workers in production.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'django-food-ordering',
     }
 }
 
+# Seconds a rendered restaurant or menu payload is kept in the cache
+API_CACHE_TIMEOUT = 60 * 60
+
+# Seconds the cache versions and modification times of restaurants are kept. They are bumped by the signals of the
+# process making a change, so with the per-process LocMemCache above, changes made by other processes (management
+# commands, other workers) are only noticed once they expire. Deployments with several processes should use a
+# shared cache backend (e.g. Redis), where this can be raised up to API_CACHE_TIMEOUT.
+API_CACHE_VERSION_TIMEOUT = 60
+
+# Build restaurant, menu and order list responses from values() rows with the precompiled
+# serializers of api.fast_serializers instead of the ModelSerializers (same JSON output)
+API_FAST_SERIALIZATION = False
+
+# Record per-endpoint request metrics and serve them at /metrics in the Prometheus text format
+API_METRICS = True
+
+# Client addresses /metrics is served to (REMOTE_ADDR, i.e. the reverse proxy when there is one, so do not route
+# /metrics through a public proxy); everyone else gets 404 Not Found
+API_METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+# Append every API request to this JSONL file, for replaying it with `manage.py replay_requests` (None disables recording)
+API_REQUEST_RECORD_FILE = None
+
+# Add the items of every new order to the daily sales rollup in the order's transaction, in addition to
+# `manage.py roll_up_sales`; serializes order creation on the rollup's high-water mark
+API_SALES_ROLLUP_ON_CREATE = False
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -127,7 +228,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
@@ -137,6 +238,14 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# Caching of resolved tokens by api.authentication.CachedTokenAuthentication.
+# Set CACHE_ALIAS to a shared cache (e.g. 'default' backed by Redis) to add a second tier across workers.
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,
+    'CACHE_ALIAS': None,
+}
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Food Ordering API',
     'DESCRIPTION': 'API for the food ordering system',
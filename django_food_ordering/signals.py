@@ -1,9 +1,79 @@
-from django.db.models.signals import post_save
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 from rest_framework.authtoken.models import Token
+from api.authentication import invalidate_token
+from api.cache import RESTAURANT_LIST_SCOPE, bump_version, restaurant_scope
+from api.models import Restaurant, MenuItem
+from api.geo import encode_geocell
+from api.metrics import install_query_counting
 
 @receiver(post_save, sender=User)
 def create_auth_token(sender, instance=None, created=False, **kwargs):
     if created:
         Token.objects.create(user=instance)
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """
+    Removes a deleted token (including tokens deleted together with their user) from the token cache.
+    """
+    invalidate_token(instance.key)
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    """
+    Removes the tokens of a changed user (e.g. a deactivated one) from the token cache,
+    so the cached user is reloaded on the next request.
+    Saves that only record the login time are ignored.
+    """
+    if created or raw or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    for key in Token.objects.filter(user_id=instance.pk).values_list('key', flat=True):
+        invalidate_token(key)
+
+@receiver([post_save, post_delete], sender=Restaurant)
+def invalidate_restaurant_cache(sender, instance, using=None, **kwargs):
+    """
+    Invalidates the cached details and menu of a restaurant, as well as the restaurant list,
+    whenever the restaurant is saved or deleted.
+    """
+    bump_version(restaurant_scope(instance.pk), using=using)
+    bump_version(RESTAURANT_LIST_SCOPE, using=using)
+
+@receiver(pre_save, sender=Restaurant)
+def set_restaurant_geocell(sender, instance, raw=False, **kwargs):
+    """
+    Derives the indexed geocell of a restaurant from its coordinates.
+    Saves with update_fields must list 'geocell' along with the coordinates, and bulk creation and
+    queryset updates bypass this receiver, so they have to set the geocell themselves.
+    """
+    if not raw:
+        instance.geocell = encode_geocell(instance.latitude, instance.longitude)
+
+@receiver(pre_save, sender=MenuItem)
+def invalidate_previous_restaurant_menu(sender, instance, raw=False, using=None, **kwargs):
+    """
+    Invalidates the menu of the restaurant a menu item is being moved away from.
+    """
+    if raw or instance.pk is None:
+        return
+    previous_restaurant_id = MenuItem.objects.using(using).filter(pk=instance.pk).values_list('restaurant_id', flat=True).first()
+    if previous_restaurant_id is not None and previous_restaurant_id != instance.restaurant_id:
+        bump_version(restaurant_scope(previous_restaurant_id), using=using)
+
+@receiver([post_save, post_delete], sender=MenuItem)
+def invalidate_menu_cache(sender, instance, using=None, **kwargs):
+    """
+    Invalidates the cached details and menu of the restaurant a menu item belongs to
+    whenever the menu item is saved or deleted.
+    """
+    bump_version(restaurant_scope(instance.restaurant_id), using=using)
+
+@receiver(connection_created)
+def count_connection_queries(sender, connection, **kwargs):
+    """
+    Lets MetricsMiddleware count the queries of every new database connection, whichever thread opened it.
+    """
+    install_query_counting(connection)